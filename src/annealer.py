@@ -0,0 +1,403 @@
+import json
+import math
+
+import numpy as np
+
+from density import DensityGrid
+from hpwl import HPWLEngine
+from net_model import NetModel
+from overlap import GridIndex, compute_bbox_area, compute_overlap, intersection_area
+from placement_db import PlacementDB
+from telemetry import Telemetry
+
+# Cost weights matching the objective of SAEngine.run
+DEFAULT_WEIGHTS = {"area": 1.0, "hpwl": 1.0, "energy": 1.0, "overlap": 100.0, "overflow": 100.0}
+DEFAULT_MOVE_PROBS = {"shift": 0.6, "swap": 0.2, "rotate": 0.1, "flip": 0.1}
+
+
+class TemperatureSchedule:
+    def __init__(self, t_start: float = None, t_end: float = None, num_temps: int = 100,
+                 moves_per_temp: int = 1000, cooling: str = "geometric", window: float = 0.5):
+        """
+        Temperature schedule of the move-based annealer.
+        :param t_start: Initial temperature, positive, estimated from random moves when None.
+        :param t_end: Final temperature, positive, defaults to t_start * 1e-7.
+        :param num_temps: Number of temperature steps.
+        :param moves_per_temp: Number of moves attempted at each temperature.
+        :param cooling: "geometric" or "linear" interpolation from t_start to t_end.
+        :param window: Fraction of the layout spanned by shift moves at t_start, shrinking with temperature.
+        """
+        if cooling not in ("geometric", "linear"):
+            raise ValueError(f"Invalid cooling '{cooling}'. Expected 'geometric' or 'linear'.")
+        # Moves are accepted with probability exp(-delta / T), so every temperature must be positive
+        for name, value in (("initial", t_start), ("final", t_end)):
+            if value is not None and not value > 0:
+                raise ValueError(f"Invalid {name} temperature {value}. Expected a positive temperature.")
+        self.t_start = t_start
+        self.t_end = t_end
+        self.num_temps = num_temps
+        self.moves_per_temp = moves_per_temp
+        self.cooling = cooling
+        self.window = window
+
+    def temperature(self, k: int) -> float:
+        """Get the temperature of step k."""
+        t_end = self.t_end if self.t_end is not None else self.t_start * 1e-7
+        frac = k / max(self.num_temps - 1, 1)
+        if self.cooling == "linear":
+            return self.t_start + (t_end - self.t_start) * frac
+        return self.t_start * (t_end / self.t_start) ** frac
+
+
+class MoveAnnealer:
+    def __init__(self, db: PlacementDB, x_range: tuple[float, float], y_range: tuple[float, float],
+                 weights: dict[str, float] = None, move_probs: dict[str, float] = None, seed: int = None,
+                 overlap_model: str = "pairwise", telemetry: Telemetry = None, movable: np.ndarray = None,
+                 net_model: NetModel = None):
+        """
+        Simulated annealing over single-macro moves with incremental cost evaluation.
+        Each move only recomputes the nets incident to the moved macros, their neighbors in
+        the overlap grid and their dataflow edges, so the cost of a move does not grow with
+        the design. The dataflow term is the total edge energy, which unlike the longest
+        path decomposes over edges.
+        :param db: Placement database, its positions are the starting point.
+        :param x_range: Horizontal extent of the layout.
+        :param y_range: Vertical extent of the layout.
+        :param weights: Cost term weights, see DEFAULT_WEIGHTS.
+        :param move_probs: Relative probabilities of the shift, swap, rotate and flip moves.
+        :param seed: Seed of the random number generator.
+        :param overlap_model: "pairwise" for the exact overlap area between macros, or "density" for
+                              the overflow of a bin density grid, see density.DensityGrid.
+        :param telemetry: Progress trace, recorded after every temperature step.
+        :param movable: Ids of the macros that are moved, defaults to every macro that is not fixed.
+        :param net_model: Dataflow edges and their weights, defaults to every (output pin, input pin)
+                          pair of a net on different macros.
+        """
+        if overlap_model not in ("pairwise", "density"):
+            raise ValueError(f"Invalid overlap model '{overlap_model}'. Expected 'pairwise' or 'density'.")
+        self.db = db
+        self.overlap_model = overlap_model
+        self.telemetry = telemetry
+        self.min_x, self.max_x = x_range
+        self.min_y, self.max_y = y_range
+        self.layout = np.array([self.min_x, self.min_y, self.max_x, self.max_y], dtype=float)
+
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        move_probs = dict(DEFAULT_MOVE_PROBS, **(move_probs or {}))
+        self.moves = list(move_probs.keys())
+        self.move_probs = np.array([move_probs[m] for m in self.moves], dtype=float)
+        self.move_probs /= self.move_probs.sum()
+        self.rng = np.random.default_rng(seed)
+
+        self.movable = np.flatnonzero(~db.fixed) if movable is None else np.asarray(movable, dtype=np.int64)
+        # Objects the area, overlap and overflow terms see, as in SAEngine: fixed macros are blockages,
+        # other nodes outside the movable set, such as standard cells, are ignored
+        self.is_object = db.fixed.copy()
+        self.is_object[self.movable] = True
+        self.objects = np.flatnonzero(self.is_object)
+
+        # Current state
+        self.pos = db.pos.astype(float, copy=True)
+        self.rotation = db.rotation.astype(float, copy=True)
+        self.flip = db.flip.astype(bool, copy=True)
+        self.rects = db.compute_rects(self.pos, self.rotation)
+
+        # Wirelength with cached net bounding boxes
+        self.hpwl_engine = HPWLEngine(db)
+
+        # Dataflow edges, a move recomputes the edges depending on the moved macros
+        self.net_model = NetModel(db) if net_model is None else net_model
+
+        # Overlap grid sized from the typical object, or the bin density of the object area
+        if overlap_model == "density":
+            self.density = DensityGrid(self.rects[self.objects], self.layout)
+        else:
+            size = np.max(db.dim[self.objects], axis=1) if len(self.objects) else np.ones(1)
+            cell_size = 2.0 * float(np.median(size[size > 0])) if np.any(size > 0) else 1.0
+            self.grid = GridIndex(self.rects, cell_size, self.objects)
+
+        # Next temperature step and the starting temperature, kept for resuming
+        self.step = 0
+        self.t_start = None
+
+        self.history: list[dict] = []
+        self.terms = self.compute_terms()
+        self.cost = self.total_cost(self.terms)
+        self._save_best()
+
+    def compute_terms(self) -> dict[str, float]:
+        """Compute every cost term of the current state from scratch."""
+        self.edge_energy = self._edge_energy(np.arange(self.net_model.num_edges))
+        rects = self.rects[self.objects]
+        self.macro_overflow = np.zeros(self.db.num_macros)
+        self.macro_overflow[self.objects] = self._overflow(rects)
+        self.bbox = np.array([rects[:, 0].min(), rects[:, 1].min(),
+                              rects[:, 2].max(), rects[:, 3].max()]) if len(rects) else np.zeros(4)
+        if self.overlap_model == "density":
+            overlap = self.density.compute_overflow()
+        else:
+            overlap = compute_overlap(rects)
+        return {
+            "area": compute_bbox_area(rects) if len(rects) else 0.0,
+            "hpwl": self.hpwl_engine.compute(self.pos, self.rotation, self.flip),
+            "energy": float(self.edge_energy.sum()),
+            "overlap": overlap,
+            "overflow": float(self.macro_overflow.sum()),
+        }
+
+    def total_cost(self, terms: dict[str, float]) -> float:
+        return sum(self.weights[name] * value for name, value in terms.items())
+
+    def _edge_energy(self, edges: np.ndarray) -> np.ndarray:
+        """Weighted energy (squared distance) of dataflow edges in the current state."""
+        return self.net_model.edge_energy(self.pos, self.rotation, self.flip, edges)
+
+    def _overflow(self, rects: np.ndarray) -> np.ndarray:
+        area = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+        return area - intersection_area(rects, self.layout)
+
+    def _rects(self, macros: np.ndarray, pos: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+        dim = self.db.dim[macros]
+        dim = np.where(((rotation % 180) != 0)[:, None], dim[:, ::-1], dim)
+        return np.stack([pos[:, 0], pos[:, 1] - dim[:, 1], pos[:, 0] + dim[:, 0], pos[:, 1]], axis=1)
+
+    def _overlap_with_others(self, macros: np.ndarray, rects: np.ndarray) -> float:
+        """Overlap of the given rectangles of the moved macros with every other object and each other."""
+        overlap = 0.0
+        moved = set(macros.tolist())
+        for k, rect in enumerate(rects):
+            neighbors = self.grid.query(rect)
+            neighbors = neighbors[[n not in moved for n in neighbors.tolist()]] if len(neighbors) else neighbors
+            if len(neighbors):
+                overlap += float(np.sum(intersection_area(rect, self.rects[neighbors])))
+            for other in rects[k + 1:]:
+                overlap += float(intersection_area(rect, other))
+        return overlap
+
+    def propose(self, macros: np.ndarray, pos: np.ndarray, rotation: np.ndarray, flip: np.ndarray) -> float:
+        """
+        Evaluate moving some macros without committing the move.
+        :param macros: Ids of the moved macros.
+        :param pos: (k, 2) new positions.
+        :param rotation: (k,) new rotations in degrees.
+        :param flip: (k,) new mirror flags.
+        :return: Change of the total cost.
+        """
+        old_rects = self.rects[macros]
+        new_rects = self._rects(macros, pos, rotation)
+
+        # Wirelength of the incident nets
+        d_hpwl = self.hpwl_engine.propose(macros, pos, rotation, flip)
+
+        # Energy of the dataflow edges depending on the moved macros
+        edges = self.net_model.dependent_edges(macros)
+        old_state = (self.pos[macros].copy(), self.rotation[macros].copy(), self.flip[macros].copy())
+        self.pos[macros], self.rotation[macros], self.flip[macros] = pos, rotation, flip
+        edge_energy = self._edge_energy(edges)
+        self.pos[macros], self.rotation[macros], self.flip[macros] = old_state
+        d_energy = float(edge_energy.sum() - self.edge_energy[edges].sum())
+
+        # Overlap with the neighbors in the grid, or the overflow change of the bins covered by the moved macros
+        if self.overlap_model == "density":
+            d_overlap = self.density.propose(old_rects, new_rects)
+        else:
+            d_overlap = self._overlap_with_others(macros, new_rects) - self._overlap_with_others(macros, old_rects)
+
+        # Overflow of the moved macros
+        overflow = self._overflow(new_rects)
+        d_overflow = float(overflow.sum() - self.macro_overflow[macros].sum())
+
+        # Bounding box area, rescanned only when a moved macro defined the old bounding box
+        on_boundary = ((old_rects[:, 0] <= self.bbox[0]) | (old_rects[:, 1] <= self.bbox[1]) |
+                       (old_rects[:, 2] >= self.bbox[2]) | (old_rects[:, 3] >= self.bbox[3]))
+        if on_boundary.any():
+            rects = self.rects.copy()
+            rects[macros] = new_rects
+            rects = rects[self.is_object]
+            bbox = np.array([rects[:, 0].min(), rects[:, 1].min(), rects[:, 2].max(), rects[:, 3].max()])
+        else:
+            bbox = np.concatenate([np.minimum(self.bbox[:2], new_rects[:, :2].min(axis=0)),
+                                   np.maximum(self.bbox[2:], new_rects[:, 2:].max(axis=0))])
+        area = float((bbox[2] - bbox[0]) * (bbox[3] - bbox[1]))
+
+        delta_terms = {
+            "area": area - self.terms["area"],
+            "hpwl": d_hpwl,
+            "energy": d_energy,
+            "overlap": d_overlap,
+            "overflow": d_overflow,
+        }
+        self._pending = (macros, pos, rotation, flip, old_rects, new_rects, edges, edge_energy, overflow, bbox,
+                         delta_terms)
+        return self.total_cost(delta_terms)
+
+    def accept(self):
+        """Commit the last proposed move."""
+        macros, pos, rotation, flip, old_rects, new_rects, edges, edge_energy, overflow, bbox, delta_terms = self._pending
+        self.hpwl_engine.accept()
+        if self.overlap_model == "density":
+            self.density.accept()
+        else:
+            for k, i in enumerate(macros.tolist()):
+                self.grid.move(i, old_rects[k], new_rects[k])
+        self.pos[macros], self.rotation[macros], self.flip[macros] = pos, rotation, flip
+        self.rects[macros] = new_rects
+        self.edge_energy[edges] = edge_energy
+        self.macro_overflow[macros] = overflow
+        self.bbox = bbox
+        for name, delta in delta_terms.items():
+            self.terms[name] += delta
+        self.cost = self.total_cost(self.terms)
+        self._pending = None
+
+    def random_move(self, window: float) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Draw a random shift, swap, rotate or flip move of movable macros.
+        :param window: Fraction of the layout a shift move spans.
+        :return: Tuple of the moved macros and their new positions, rotations and mirror flags.
+        """
+        move = self.moves[self.rng.choice(len(self.moves), p=self.move_probs)]
+        if move == "swap" and len(self.movable) >= 2:
+            macros = self.rng.choice(self.movable, size=2, replace=False)
+            pos = self.pos[macros[::-1]]
+            return macros, self._clip(macros, pos, self.rotation[macros]), self.rotation[macros], self.flip[macros]
+
+        macros = self.rng.choice(self.movable, size=1)
+        pos = self.pos[macros].copy()
+        rotation = self.rotation[macros].copy()
+        flip = self.flip[macros].copy()
+        if move == "rotate":
+            rotation = (rotation + 90.0 * self.rng.integers(1, 4)) % 360.0
+        elif move == "flip":
+            flip = ~flip
+        else:
+            sigma = window * np.array([self.max_x - self.min_x, self.max_y - self.min_y])
+            pos = pos + self.rng.normal(0.0, 1.0, size=2) * sigma
+        return macros, self._clip(macros, pos, rotation), rotation, flip
+
+    def _clip(self, macros: np.ndarray, pos: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+        """Clip positions so that the macros stay inside the layout where they fit."""
+        dim = self.db.dim[macros]
+        dim = np.where(((rotation % 180) != 0)[:, None], dim[:, ::-1], dim)
+        x = np.clip(pos[:, 0], self.min_x, np.maximum(self.min_x, self.max_x - dim[:, 0]))
+        y = np.clip(pos[:, 1], np.minimum(self.max_y, self.min_y + dim[:, 1]), self.max_y)
+        return np.stack([x, y], axis=1)
+
+    def estimate_t_start(self, num_samples: int = 200, accept_prob: float = 0.9, window: float = 0.5) -> float:
+        """Pick a starting temperature at which an average uphill move is accepted with accept_prob."""
+        uphill = []
+        for _ in range(num_samples):
+            delta = self.propose(*self.random_move(window))
+            if delta > 0:
+                uphill.append(delta)
+        self._pending = None
+        if not uphill:
+            return 1.0
+        return -float(np.mean(uphill)) / math.log(accept_prob)
+
+    def _save_best(self):
+        self.best_cost = self.cost
+        self.best_terms = dict(self.terms)
+        self.best_pos = self.pos.copy()
+        self.best_rotation = self.rotation.copy()
+        self.best_flip = self.flip.copy()
+
+    def state_dict(self) -> dict:
+        """
+        Capture the complete annealing state: placement, schedule progress, random generator and best solution.
+        :return: Dictionary of arrays and scalars, see load_state.
+        """
+        return {
+            "pos": self.pos.copy(),
+            "rotation": self.rotation.copy(),
+            "flip": self.flip.copy(),
+            "step": self.step,
+            "t_start": np.nan if self.t_start is None else self.t_start,
+            "rng_state": json.dumps(self.rng.bit_generator.state),
+            "history": json.dumps(self.history),
+            "best_cost": self.best_cost,
+            "best_terms": json.dumps(self.best_terms),
+            "best_pos": self.best_pos.copy(),
+            "best_rotation": self.best_rotation.copy(),
+            "best_flip": self.best_flip.copy(),
+        }
+
+    def load_state(self, state: dict):
+        """
+        Restore a state captured by state_dict, so that run continues with the next temperature step.
+        :param state: Annealing state of a design with the same macros.
+        """
+        if len(state["pos"]) != self.db.num_macros:
+            raise ValueError(f"Invalid state of {len(state['pos'])} macros. Expected {self.db.num_macros}.")
+        self.pos = np.array(state["pos"], dtype=float)
+        self.rotation = np.array(state["rotation"], dtype=float)
+        self.flip = np.array(state["flip"], dtype=bool)
+
+        # Rebuild the cached geometry and cost terms of the restored placement
+        self.rects = self.db.compute_rects(self.pos, self.rotation)
+        if self.overlap_model == "density":
+            self.density = DensityGrid(self.rects[self.objects], self.layout, self.density.num_bins)
+        else:
+            self.grid = GridIndex(self.rects, self.grid.cell_size, self.objects)
+        self.terms = self.compute_terms()
+        self.cost = self.total_cost(self.terms)
+
+        self.step = int(state["step"])
+        t_start = float(state["t_start"])
+        self.t_start = None if math.isnan(t_start) else t_start
+        self.rng.bit_generator.state = json.loads(str(state["rng_state"]))
+        self.history = json.loads(str(state["history"]))
+        self.best_cost = float(state["best_cost"])
+        self.best_terms = json.loads(str(state["best_terms"]))
+        self.best_pos = np.array(state["best_pos"], dtype=float)
+        self.best_rotation = np.array(state["best_rotation"], dtype=float)
+        self.best_flip = np.array(state["best_flip"], dtype=bool)
+
+    def run(self, schedule: TemperatureSchedule = None, callback=None) -> float:
+        """
+        Anneal from the current state, continuing a restored run from its next temperature step.
+        :param schedule: Temperature schedule, defaults to TemperatureSchedule().
+        :param callback: Called with the best cost after every temperature step, returning True stops early.
+        :return: Best cost found. The best state is kept in best_pos, best_rotation and best_flip.
+        """
+        if schedule is None:
+            schedule = TemperatureSchedule()
+        if len(self.movable) == 0:
+            return self.best_cost
+        if schedule.t_start is None:
+            schedule.t_start = self.t_start if self.t_start is not None else self.estimate_t_start(window=schedule.window)
+        self.t_start = schedule.t_start
+
+        for k in range(self.step, schedule.num_temps):
+            temperature = schedule.temperature(k)
+            window = min(max(temperature / schedule.t_start, 0.01), 1.0) * schedule.window
+            accepted = rejected = 0
+            for _ in range(schedule.moves_per_temp):
+                delta = self.propose(*self.random_move(window))
+                if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+                    self.accept()
+                    accepted += 1
+                else:
+                    rejected += 1
+
+            # Re-sum the cached per-net, per-edge and per-macro terms to limit drift
+            self.terms["hpwl"] = self.hpwl_engine.total = float(self.hpwl_engine.net_hpwl.sum())
+            self.terms["energy"] = float(self.edge_energy.sum())
+            self.terms["overflow"] = float(self.macro_overflow.sum())
+            if self.overlap_model == "density":
+                self.terms["overlap"] = self.density.overflow = self.density.compute_overflow()
+            self.cost = self.total_cost(self.terms)
+
+            # Snapshot the best state once per temperature to keep moves O(1)
+            if self.cost < self.best_cost:
+                self._save_best()
+            self.step = k + 1
+            self.history.append({"temperature": temperature, "cost": self.cost, "best_cost": self.best_cost,
+                                 "accepted": accepted, "rejected": rejected})
+            if self.telemetry is not None:
+                self.telemetry.record(self.cost, self.terms, evaluations=accepted + rejected, step=k,
+                                      temperature=temperature, accepted=accepted, rejected=rejected)
+            if callback is not None and callback(self.best_cost):
+                break
+
+        return self.best_cost
@@ -0,0 +1,207 @@
+import numpy as np
+
+from annealer import DEFAULT_WEIGHTS
+from dfg import DataFlowGraph
+from hpwl import expand_ranges
+from net_model import NetModel
+from overlap import intersection_area, overlap_pairs
+from placement_db import PlacementDB
+
+
+class BatchObjective:
+    def __init__(self, db: PlacementDB, x_range: tuple[float, float], y_range: tuple[float, float],
+                 weights: dict[str, float] = None, max_elements: int = 1 << 24, net_model: NetModel = None,
+                 movable: np.ndarray = None):
+        """
+        Placement objective of SAEngine evaluated for a whole population of candidates at once.
+        Candidates are pure arrays, the placement database is never modified.
+        :param db: Placement database.
+        :param x_range: Horizontal extent of the layout.
+        :param y_range: Vertical extent of the layout.
+        :param weights: Cost term weights, see annealer.DEFAULT_WEIGHTS.
+        :param max_elements: Bound on candidates times pins evaluated at once, larger populations
+                             are evaluated in chunks.
+        :param net_model: Dataflow edges of the nets and their weights, defaults to every
+                          (output pin, input pin) pair of a net on different macros.
+        :param movable: Ids of the searched macros, as in SAEngine, defaults to every macro. The other
+                        macros keep their stored positions, and only the fixed and the searched macros
+                        enter the area, overlap and overflow terms.
+        """
+        self.db = db
+        self.min_x, self.max_x = x_range
+        self.min_y, self.max_y = y_range
+        self.layout = np.array([self.min_x, self.min_y, self.max_x, self.max_y], dtype=float)
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.max_elements = max_elements
+        self.movable = np.arange(db.num_macros) if movable is None else np.asarray(movable, dtype=np.int64)
+        self.rect_macros = None if movable is None else np.concatenate([np.flatnonzero(db.fixed), self.movable])
+
+        self.dfg = DataFlowGraph(db, net_model)
+        self.nets = np.flatnonzero(db.net_degree > 0)
+        self.net_pins = np.arange(db.num_pins, dtype=np.int64)
+        degrees = db.net_degree[self.nets]
+        self.net_starts = np.cumsum(degrees) - degrees
+
+    def _port_r(self, rotation: np.ndarray, flip: np.ndarray, pins: np.ndarray) -> np.ndarray:
+        """Compute (P, k, 2) rotated pin offsets of every candidate."""
+        db = self.db
+        pin_macro = db.pin_macro[pins]
+
+        # Orientations are resolved per macro and then gathered per pin
+        quarter = rotation / 90.0
+        quarter_int = quarter.astype(np.int64)
+        if np.array_equal(quarter, quarter_int):
+            orient = (quarter_int & 3) + 4 * flip
+            index = 8 * pins + orient[:, pin_macro]
+            return np.take(db.pin_offset_table.reshape(-1, 2), index, axis=0)
+
+        r = db.pin_offset[pins]
+        angle_rad = np.radians(rotation)[:, pin_macro]
+        cos = np.cos(angle_rad)
+        sin = np.sin(angle_rad)
+        r_x = np.where(flip[:, pin_macro], -r[:, 0], r[:, 0])
+        return np.stack([cos * r_x - sin * r[:, 1], sin * r_x + cos * r[:, 1]], axis=-1)
+
+    def _terminal_loc(self, anchor: np.ndarray, rotation: np.ndarray, flip: np.ndarray,
+                      terminals: np.ndarray) -> np.ndarray:
+        """Compute (P, k, 2) locations of net model terminals, stars at the centroid of their members."""
+        db = self.db
+        model = self.dfg.net_model
+        loc = np.empty((len(anchor), len(terminals), 2), dtype=float)
+        is_pin = terminals < db.num_pins
+        pins = terminals[is_pin]
+        loc[:, is_pin] = anchor[:, db.pin_macro[pins]] + self._port_r(rotation, flip, pins)
+        if not is_pin.all():
+            stars, inverse = np.unique(terminals[~is_pin] - db.num_pins, return_inverse=True)
+            counts = model.star_ptr[stars + 1] - model.star_ptr[stars]
+            members = model.star_pins[expand_ranges(model.star_ptr[stars], counts)]
+            member_loc = anchor[:, db.pin_macro[members]] + self._port_r(rotation, flip, members)
+            centroids = np.add.reduceat(member_loc, np.cumsum(counts) - counts, axis=1) / counts[:, None]
+            loc[:, ~is_pin] = centroids[:, inverse]
+        return loc
+
+    def _positions(self, x: np.ndarray) -> np.ndarray:
+        """Expand (P, 2M) positions of the searched macros to (P, N, 2) positions of every macro."""
+        if self.rect_macros is None:
+            return x.reshape(len(x), self.db.num_macros, 2)
+        pos = np.repeat(self.db.pos[None], len(x), axis=0)
+        pos[:, self.movable] = x.reshape(len(x), -1, 2)
+        return pos
+
+    def compute_rects(self, pos: np.ndarray, rotation: np.ndarray, macros: np.ndarray = None) -> np.ndarray:
+        """Compute (P, k, 4) rectangles of every candidate of the given macros, defaults to all macros."""
+        db_dim = self.db.dim if macros is None else self.db.dim[macros]
+        dim = np.where(((rotation % 180) != 0)[..., None], db_dim[:, ::-1], db_dim)
+        return np.stack([pos[..., 0], pos[..., 1] - dim[..., 1], pos[..., 0] + dim[..., 0], pos[..., 1]], axis=-1)
+
+    def compute_area(self, rects: np.ndarray) -> np.ndarray:
+        return ((rects[..., 2].max(axis=1) - rects[..., 0].min(axis=1)) *
+                (rects[..., 3].max(axis=1) - rects[..., 1].min(axis=1)))
+
+    def compute_overflow(self, rects: np.ndarray) -> np.ndarray:
+        area = (rects[..., 2] - rects[..., 0]) * (rects[..., 3] - rects[..., 1])
+        return np.sum(area - intersection_area(rects, self.layout), axis=1)
+
+    def compute_overlap(self, rects: np.ndarray) -> np.ndarray:
+        """
+        Compute the pairwise overlap of every candidate with a single sweep.
+        Candidates are laid side by side along x with a gap, so the sweep only pairs
+        rectangles of the same candidate.
+        """
+        num, n = rects.shape[:2]
+        if n < 2:
+            return np.zeros(num)
+        x_low = rects[..., 0].min(axis=1)
+        width = rects[..., 2].max(axis=1) - x_low
+        shift = np.concatenate([[0.0], np.cumsum(width + 1.0)[:-1]]) - x_low
+        shifted = rects.copy()
+        shifted[..., 0] += shift[:, None]
+        shifted[..., 2] += shift[:, None]
+        shifted = shifted.reshape(-1, 4)
+
+        overlap = np.zeros(num)
+        for i, j in overlap_pairs(shifted):
+            overlap += np.bincount(i // n, weights=intersection_area(shifted[i], shifted[j]), minlength=num)
+        return overlap
+
+    def compute_hpwl(self, pos: np.ndarray, rotation: np.ndarray, flip: np.ndarray) -> np.ndarray:
+        """Compute the HPWL of every candidate with the pin locations of PlacementDB.compute_port_loc."""
+        db = self.db
+        if len(self.nets) == 0:
+            return np.zeros(len(pos))
+        pins = self.net_pins
+        loc = (pos - db.com)[:, db.pin_macro[pins]] + self._port_r(rotation, flip, pins)
+
+        # Empty nets have no pins, so the non-empty nets tile the pin axis
+        width = np.maximum.reduceat(loc[..., 0], self.net_starts, axis=1) - np.minimum.reduceat(loc[..., 0], self.net_starts, axis=1)
+        height = np.maximum.reduceat(loc[..., 1], self.net_starts, axis=1) - np.minimum.reduceat(loc[..., 1], self.net_starts, axis=1)
+        return np.sum(width + height, axis=1)
+
+    def compute_energy(self, pos: np.ndarray, rotation: np.ndarray, flip: np.ndarray) -> np.ndarray:
+        """Compute the longest dataflow path energy of every candidate."""
+        db = self.db
+        dfg = self.dfg
+        num = len(pos)
+        if len(dfg.dag_edges) == 0:
+            return np.zeros(num)
+
+        num_edges = len(dfg.dag_edges)
+        terminals = np.concatenate([dfg.src_pins[dfg.dag_edges], dfg.dst_pins[dfg.dag_edges]])
+        loc = self._terminal_loc(pos - db.com, rotation, flip, terminals)
+        weight = dfg.net_model.weight[dfg.model_edges[dfg.dag_edges]]
+        energy = weight * np.sum((loc[:, num_edges:] - loc[:, :num_edges]) ** 2, axis=-1)
+
+        # Level-synchronous longest path, with the components of every candidate flattened
+        dist = np.zeros((num, dfg.num_components), dtype=float)
+        flat = dist.reshape(-1)
+        offset = (np.arange(num) * dfg.num_components)[:, None]
+        for start, stop in zip(dfg.level_ptr[:-1], dfg.level_ptr[1:]):
+            if start == stop:
+                continue
+            src = dfg.comp_src[start:stop]
+            dst = dfg.comp_dst[start:stop]
+            np.maximum.at(flat, (offset + dst).reshape(-1), (dist[:, src] + energy[:, start:stop]).reshape(-1))
+        return dist.max(axis=1)
+
+    def _evaluate_chunk(self, pos: np.ndarray, rotation: np.ndarray, flip: np.ndarray) -> dict[str, np.ndarray]:
+        macros = self.rect_macros
+        if macros is None:
+            rects = self.compute_rects(pos, rotation)
+        else:
+            rects = self.compute_rects(pos[:, macros], rotation[:, macros], macros)
+        return {
+            "area": self.compute_area(rects),
+            "hpwl": self.compute_hpwl(pos, rotation, flip),
+            "energy": self.compute_energy(pos, rotation, flip),
+            "overlap": self.compute_overlap(rects),
+            "overflow": self.compute_overflow(rects),
+        }
+
+    def evaluate(self, x: np.ndarray, rotation: np.ndarray = None,
+                 flip: np.ndarray = None) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """
+        Evaluate a population of candidate placements.
+        :param x: (P, 2M) flattened x/y positions of the M searched macros of every candidate.
+        :param rotation: (P, N) or (N,) rotations in degrees, defaults to the stored rotations.
+        :param flip: (P, N) or (N,) mirror flags, defaults to the stored flags.
+        :return: Tuple of the (P,) weighted costs and the (P,) values of every cost term.
+        """
+        db = self.db
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        num = len(x)
+        if x.shape[1] != 2 * len(self.movable):
+            raise ValueError(f"Invalid population shape {x.shape}. Expected (P, {2 * len(self.movable)}).")
+        rotation = np.broadcast_to(db.rotation if rotation is None else np.asarray(rotation, dtype=float),
+                                   (num, db.num_macros))
+        flip = np.broadcast_to(db.flip if flip is None else np.asarray(flip, dtype=bool), (num, db.num_macros))
+
+        if num == 0:
+            return np.zeros(0), {name: np.zeros(0) for name in self.weights}
+
+        # Evaluate chunks of candidates to bound the (candidates, pins) temporaries
+        chunk = max(1, self.max_elements // max(db.num_pins, db.num_macros, 1))
+        parts = [self._evaluate_chunk(self._positions(x[i:i + chunk]), rotation[i:i + chunk], flip[i:i + chunk])
+                 for i in range(0, num, chunk)]
+        terms = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        costs = sum(self.weights[name] * value for name, value in terms.items())
+        return costs, terms
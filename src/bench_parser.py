@@ -0,0 +1,81 @@
+import os
+import time
+
+from fast_parser import NameIndex, load_design, read_nodes, read_pl, read_nets
+from parser import parse_nodes, parse_pl, parse_nets
+
+
+def is_lfs_pointer(file_path: str) -> bool:
+    """Check whether a file is a git-lfs pointer rather than the real content."""
+    with open(file_path, 'rb') as f:
+        return f.read(40).startswith(b"version https://git-lfs")
+
+
+def find_design_files(bench: str) -> tuple[str, str, str]:
+    node_file = pl_file = net_file = None
+    for file in os.listdir(bench):
+        if file.endswith(".nodes"):
+            node_file = os.path.join(bench, file)
+        elif file.endswith(".pl") and file != "final_placement.pl":
+            pl_file = os.path.join(bench, file)
+        elif file.endswith(".nets"):
+            net_file = os.path.join(bench, file)
+    return node_file, pl_file, net_file
+
+
+def benchmark_bench(bench: str, legacy: bool = False, processes: int = 1):
+    node_file, pl_file, net_file = find_design_files(bench)
+    if not node_file or not pl_file or not net_file:
+        print(f"{bench}: missing .nodes/.pl/.nets, skipped")
+        return
+    if any(is_lfs_pointer(f) for f in (node_file, pl_file, net_file)):
+        print(f"{bench}: git-lfs pointers, run 'git lfs pull' first, skipped")
+        return
+
+    size_mb = sum(os.path.getsize(f) for f in (node_file, pl_file, net_file)) / 2**20
+
+    start = time.perf_counter()
+    names, _, _ = read_nodes(node_file)
+    index = NameIndex(names)
+    read_pl(pl_file, index, len(names))
+    pin_macro, _, _, net_names, _ = read_nets(net_file, index)
+    elapsed = time.perf_counter() - start
+
+    print(f"{os.path.basename(bench)}: {size_mb:.1f} MB, {len(names)} nodes, {len(net_names)} nets, {len(pin_macro)} pins")
+    print(f"  fast:   {elapsed:.3f} s, {size_mb / elapsed:.1f} MB/s, {len(pin_macro) / elapsed:.0f} pins/s")
+
+    if processes > 1:
+        start = time.perf_counter()
+        load_design(node_file, pl_file, net_file, processes)
+        parallel_elapsed = time.perf_counter() - start
+        print(f"  {processes} processes: {parallel_elapsed:.3f} s, {size_mb / parallel_elapsed:.1f} MB/s "
+              f"({elapsed / parallel_elapsed:.1f}x faster)")
+
+    if legacy:
+        start = time.perf_counter()
+        macros = parse_nodes(node_file)
+        parse_pl(pl_file, macros)
+        parse_nets(net_file, macros)
+        legacy_elapsed = time.perf_counter() - start
+        print(f"  objects: {legacy_elapsed:.3f} s, {size_mb / legacy_elapsed:.1f} MB/s, "
+              f"{len(pin_macro) / legacy_elapsed:.0f} pins/s ({legacy_elapsed / elapsed:.1f}x slower)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Measure Bookshelf parsing throughput on each benchmark.")
+    arg_parser.add_argument("benches", nargs="*", help="Benchmark directories (default: every directory in bench/)")
+    arg_parser.add_argument("--legacy", action="store_true", help="Also time building the Macro and Net objects of parser.py")
+    arg_parser.add_argument("--processes", type=int, default=1,
+                            help="Also time parsing the .nets file with this many processes")
+    args = arg_parser.parse_args()
+
+    benches = args.benches
+    if not benches:
+        bench_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench")
+        benches = sorted(os.path.join(bench_root, d) for d in os.listdir(bench_root))
+
+    for bench in benches:
+        if os.path.isdir(bench):
+            benchmark_bench(bench, args.legacy, args.processes)
@@ -0,0 +1,69 @@
+import os
+import time
+
+import numpy as np
+
+from placement_db import PlacementDB
+from utils import output_placement
+
+
+class Checkpointer:
+    def __init__(self, path: str, interval: float = 300.0, placement_file: str = None):
+        """
+        Periodic snapshots of the optimizer state, so that a killed run can be resumed.
+        Every save also writes the best placement found so far, which makes the run anytime.
+        :param path: Checkpoint file (.npz).
+        :param interval: Seconds between checkpoints.
+        :param placement_file: .pl file the best placement is written to on every save, none when None.
+        """
+        if interval < 0:
+            raise ValueError(f"Invalid checkpoint interval {interval}. Expected a non-negative number of seconds.")
+        self.path = path
+        self.interval = interval
+        self.placement_file = placement_file
+        self.last_save = time.perf_counter()
+        self.num_saves = 0
+
+    def due(self) -> bool:
+        """Whether the interval has passed since the last save."""
+        return time.perf_counter() - self.last_save >= self.interval
+
+    def save(self, state: dict, db: PlacementDB = None):
+        """
+        Write a checkpoint. The file is replaced atomically, a run killed while saving keeps the previous one.
+        :param state: Arrays and scalars of the optimizer state, including best_pos, best_rotation and best_flip.
+        :param db: Placement database of the design, the best placement is written when given.
+        """
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **state)
+        os.replace(tmp_path, self.path)
+        if db is not None and self.placement_file is not None:
+            write_best_placement(db, state, self.placement_file)
+        self.last_save = time.perf_counter()
+        self.num_saves += 1
+
+
+def load_checkpoint(path: str, db: PlacementDB = None) -> dict:
+    """
+    Read a checkpoint written by Checkpointer.
+    :param path: Checkpoint file.
+    :param db: Placement database of the design, checked to match the checkpoint.
+    :return: Optimizer state, with 0-d arrays turned into scalars.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key][()] if data[key].ndim == 0 else data[key] for key in data.files}
+    if db is not None and len(state["best_pos"]) != db.num_macros:
+        raise ValueError(f"Invalid checkpoint {path} of {len(state['best_pos'])} macros. "
+                         f"Expected {db.num_macros}.")
+    return state
+
+
+def write_best_placement(db: PlacementDB, state: dict, file_path: str):
+    """Write the best placement of an optimizer state as a .pl file, leaving the database unchanged."""
+    pos, rotation, flip = db.pos, db.rotation, db.flip
+    db.pos, db.rotation, db.flip = state["best_pos"], state["best_rotation"], state["best_flip"]
+    try:
+        output_placement(db, file_path)
+    finally:
+        db.pos, db.rotation, db.flip = pos, rotation, flip
@@ -0,0 +1,156 @@
+import math
+
+import numpy as np
+
+from hpwl import expand_ranges
+
+
+def default_num_bins(num_macros: int) -> int:
+    """Pick a power of two number of bins per side, about one bin per macro."""
+    side = math.sqrt(max(num_macros, 1))
+    return int(min(max(2 ** math.ceil(math.log2(side)), 16), 1024))
+
+
+class DensityGrid:
+    def __init__(self, rects: np.ndarray, layout: tuple[float, float, float, float], num_bins: int = None,
+                 target_density: float = 1.0):
+        """
+        Bin density model of the macro area.
+        Macro rectangles are rasterized into a uniform bin grid over the layout, with the exact area each
+        macro covers in each bin. The overflow is the area above the bin capacity summed over bins, which
+        is zero when no macros overlap at a target density of 1. Moving macros only updates the bins they
+        cover, and the electrostatic potential of the density is solved with FFTs.
+        :param rects: (N, 4) array of [x_low, y_low, x_high, y_high].
+        :param layout: Layout as [x_low, y_low, x_high, y_high].
+        :param num_bins: Number of bins per side, defaults to default_num_bins().
+        :param target_density: Fraction of every bin that can be covered without overflow.
+        """
+        if num_bins is None:
+            num_bins = default_num_bins(len(rects))
+        self.layout = np.asarray(layout, dtype=float)
+        self.num_bins = num_bins
+        self.bin_w = (self.layout[2] - self.layout[0]) / num_bins
+        self.bin_h = (self.layout[3] - self.layout[1]) / num_bins
+        if self.bin_w <= 0 or self.bin_h <= 0:
+            raise ValueError(f"Invalid layout {tuple(layout)}. Expected a positive width and height.")
+        self.capacity = target_density * self.bin_w * self.bin_h
+
+        # Covered area of every bin, flattened as x bin * num_bins + y bin
+        self.density = np.zeros(num_bins * num_bins)
+        bins, area, _ = self.coverage(rects)
+        np.add.at(self.density, bins, area)
+        self.overflow = self.compute_overflow()
+        self._pending = None
+
+    def coverage(self, rects: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rasterize rectangles into the bins.
+        :param rects: (k, 4) array of [x_low, y_low, x_high, y_high].
+        :return: Tuple of the flat bin ids, the area covered in each of them and the rectangle covering
+                 it, one entry per rectangle and covered bin. Area outside the layout is not counted.
+        """
+        rects = np.atleast_2d(rects)
+        n = self.num_bins
+        origin = self.layout[:2]
+        bin_size = np.array([self.bin_w, self.bin_h])
+        low = np.clip(rects[:, :2], origin, self.layout[2:])
+        high = np.clip(rects[:, 2:], origin, self.layout[2:])
+
+        # Range of x and y bins touched by every rectangle
+        first = np.minimum(((low - origin) / bin_size).astype(np.int64), n - 1)
+        last = np.maximum(np.minimum(np.ceil((high - origin) / bin_size).astype(np.int64) - 1, n - 1), first)
+        count = last - first + 1
+
+        # One entry per rectangle and covered bin, with the covered area separable in x and y
+        counts = count[:, 0] * count[:, 1]
+        rect = np.repeat(np.arange(len(rects)), counts)
+        local = expand_ranges(np.zeros(len(rects), dtype=np.int64), counts)
+        count_y = count[rect, 1]
+        index = first[rect] + np.stack([local // count_y, local % count_y], axis=1)
+        bin_low = origin + index * bin_size
+        extent = np.minimum(high[rect], bin_low + bin_size) - np.maximum(low[rect], bin_low)
+        extent = np.maximum(extent, 0.0)
+        return index[:, 0] * n + index[:, 1], extent[:, 0] * extent[:, 1], rect
+
+    def compute_overflow(self) -> float:
+        """Compute the total overflow from scratch."""
+        return float(np.maximum(self.density - self.capacity, 0.0).sum())
+
+    def propose(self, old_rects: np.ndarray, new_rects: np.ndarray) -> float:
+        """
+        Evaluate moving some macros without committing the move.
+        :param old_rects: (k, 4) current rectangles of the moved macros.
+        :param new_rects: (k, 4) new rectangles of the moved macros.
+        :return: Change of the total overflow.
+        """
+        # Rasterize both sets at once, the old rectangles remove their area
+        covered, area, rect = self.coverage(np.concatenate([old_rects, new_rects]))
+        area = np.where(rect < len(old_rects), -area, area)
+        bins, inverse = np.unique(covered, return_inverse=True)
+        change = np.bincount(inverse, weights=area, minlength=len(bins))
+
+        density = self.density[bins]
+        delta = float(np.sum(np.maximum(density + change - self.capacity, 0.0) -
+                             np.maximum(density - self.capacity, 0.0)))
+        self._pending = (bins, change, delta)
+        return delta
+
+    def accept(self):
+        """Commit the last proposed move."""
+        bins, change, delta = self._pending
+        self.density[bins] += change
+        self.overflow += delta
+        self._pending = None
+
+    def potential(self) -> np.ndarray:
+        """
+        Solve the Poisson equation of the bin density with Neumann boundaries.
+        The density is mirrored into a periodic grid of twice the size, so its Fourier modes are
+        the cosine modes of the layout, and the equation is solved by dividing every mode by the
+        eigenvalue of the 5-point Laplacian. The mean density is dropped, as only the imbalance
+        exerts a force.
+        :return: (num_bins, num_bins) potential, indexed by x bin then y bin.
+        """
+        n = self.num_bins
+        rho = self.density.reshape(n, n) / (self.bin_w * self.bin_h)
+        mirrored = np.concatenate([rho, rho[::-1]], axis=0)
+        mirrored = np.concatenate([mirrored, mirrored[:, ::-1]], axis=1)
+
+        k_x = 2.0 * np.pi * np.fft.fftfreq(2 * n)
+        k_y = 2.0 * np.pi * np.fft.rfftfreq(2 * n)
+        k_sq = ((2.0 - 2.0 * np.cos(k_x))[:, None] / self.bin_w ** 2 +
+                (2.0 - 2.0 * np.cos(k_y))[None, :] / self.bin_h ** 2)
+        k_sq[0, 0] = 1.0
+
+        modes = np.fft.rfft2(mirrored) / k_sq
+        modes[0, 0] = 0.0
+        return np.fft.irfft2(modes, s=mirrored.shape)[:n, :n]
+
+    def energy(self) -> float:
+        """Compute the electrostatic energy of the density, which is smallest when the area is spread evenly."""
+        n = self.num_bins
+        return 0.5 * float(np.sum(self.density.reshape(n, n) * self.potential()))
+
+
+def compute_density_overflow(rects: np.ndarray, layout: tuple[float, float, float, float],
+                             num_bins: int = None) -> float:
+    """
+    Compute the bin overflow of a set of rectangles, see DensityGrid.
+    :param rects: (N, 4) array of [x_low, y_low, x_high, y_high].
+    :param layout: Layout as [x_low, y_low, x_high, y_high].
+    :param num_bins: Number of bins per side.
+    :return: Area above the bin capacity summed over bins.
+    """
+    return DensityGrid(rects, layout, num_bins).overflow
+
+
+def compute_density_energy(rects: np.ndarray, layout: tuple[float, float, float, float],
+                           num_bins: int = None) -> float:
+    """
+    Compute the electrostatic energy of the bin density of a set of rectangles, see DensityGrid.
+    :param rects: (N, 4) array of [x_low, y_low, x_high, y_high].
+    :param layout: Layout as [x_low, y_low, x_high, y_high].
+    :param num_bins: Number of bins per side.
+    :return: Electrostatic energy.
+    """
+    return DensityGrid(rects, layout, num_bins).energy()
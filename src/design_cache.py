@@ -0,0 +1,169 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from fast_parser import load_design
+from parser import parse_scl
+from placement_db import PlacementDB
+
+CACHE_DIR = ".dfmp_cache"
+CACHE_VERSION = 3
+# Least recently used caches of a directory are evicted beyond this total size
+CACHE_MAX_BYTES = 4 << 30
+
+# Arrays stored one .npy file each so that every one can be memory mapped
+_READ_ONLY_ARRAYS = ("names", "dim", "fixed", "pin_macro", "pin_offset", "pin_type", "net_names", "net_ptr")
+_WRITABLE_ARRAYS = ("pos", "rotation", "flip")
+
+
+def hash_files(file_paths: list[str], chunk_size: int = 1 << 20) -> str:
+    """
+    Compute a content hash over several files.
+    :param file_paths: Paths of the files, in a fixed order.
+    :param chunk_size: Number of bytes read at a time.
+    :return: Hex digest identifying the contents of all files.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{CACHE_VERSION}".encode())
+    for file_path in file_paths:
+        digest.update(os.path.basename(file_path).encode())
+        digest.update(os.path.getsize(file_path).to_bytes(8, "little"))
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_design(db: PlacementDB, layout: tuple[float, float], cache_path: str):
+    """
+    Write the placement database as a directory of .npy files.
+    :param db: Placement database to store.
+    :param layout: Width and height of the layout from the .scl file.
+    :param cache_path: Directory to create.
+    """
+    parent = os.path.dirname(cache_path)
+    os.makedirs(parent, exist_ok=True)
+
+    # Write into a temporary directory first so that readers never see a partial cache
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    arrays = {
+        "names": np.asarray(db.names, dtype=str),
+        "net_names": np.asarray(db.net_names, dtype=str),
+        "layout": np.array(layout, dtype=float),
+    }
+    for name in _READ_ONLY_ARRAYS + _WRITABLE_ARRAYS:
+        arrays.setdefault(name, getattr(db, name))
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(arr))
+
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # Another process built the same cache concurrently
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def load_cached_design(cache_path: str) -> tuple[PlacementDB, tuple[float, float]]:
+    """
+    Load a placement database written by save_design.
+    The netlist arrays are memory mapped read-only, positions and orientations are private copies.
+    :param cache_path: Cache directory.
+    :return: Tuple of the placement database and the layout width and height.
+    """
+    arrays = {}
+    for name in _READ_ONLY_ARRAYS:
+        arrays[name] = np.load(os.path.join(cache_path, f"{name}.npy"), mmap_mode="r")
+    for name in _WRITABLE_ARRAYS:
+        arrays[name] = np.load(os.path.join(cache_path, f"{name}.npy"))
+    layout = np.load(os.path.join(cache_path, "layout.npy"))
+
+    db = PlacementDB(
+        arrays["names"], arrays["dim"], arrays["fixed"], arrays["pos"],
+        arrays["pin_macro"], arrays["pin_offset"], arrays["pin_type"],
+        arrays["net_names"], arrays["net_ptr"], arrays["rotation"], arrays["flip"],
+    )
+    return db, (float(layout[0]), float(layout[1]))
+
+
+def _entry_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def evict_caches(cache_root: str, keep: str, max_bytes: int = CACHE_MAX_BYTES):
+    """
+    Delete the least recently used caches of a directory until the rest fit in max_bytes.
+    Caches of other .pl files of a design stay until they are the oldest, the kept cache is never
+    deleted, and neither are the temporary directories of caches another process is still writing.
+    :param cache_root: Cache directory of the design files.
+    :param keep: Cache directory that must stay.
+    :param max_bytes: Largest total size of the caches.
+    """
+    entries = []
+    for entry in os.scandir(cache_root):
+        if entry.name.startswith(".tmp") or not entry.is_dir() or entry.path == keep:
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, entry.path, _entry_size(entry.path)))
+        except OSError:
+            # Deleted concurrently
+            continue
+    total = sum(size for _, _, size in entries) + (_entry_size(keep) if os.path.isdir(keep) else 0)
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def design_cache_path(node_file: str, pl_file: str, net_file: str, scl_file: str) -> str:
+    """
+    Get the cache directory of a design.
+    :return: Directory next to the design files named by the content hash of the files.
+    """
+    key = hash_files([node_file, net_file, pl_file, scl_file])
+    return os.path.join(os.path.dirname(os.path.abspath(node_file)), CACHE_DIR, key)
+
+
+def load_design_cached(node_file: str, pl_file: str, net_file: str, scl_file: str,
+                       processes: int = 1) -> tuple[PlacementDB, tuple[float, float]]:
+    """
+    Load a design from the binary cache next to its files, parsing and caching it on a miss.
+    The cache is keyed by the content hash of the .nodes, .nets, .pl and .scl files, so it is
+    rebuilt whenever any of them changes.
+    :param node_file: Path to the .nodes file.
+    :param pl_file: Path to the .pl file.
+    :param net_file: Path to the .nets file.
+    :param scl_file: Path to the .scl file.
+    :param processes: Number of worker processes parsing the .nets file on a miss, see fast_parser.load_design.
+    :return: Tuple of the placement database and the layout width and height.
+    """
+    cache_path = design_cache_path(node_file, pl_file, net_file, scl_file)
+    cache_root = os.path.dirname(cache_path)
+
+    if os.path.isdir(cache_path):
+        try:
+            db, layout = load_cached_design(cache_path)
+        except (OSError, ValueError) as e:
+            print(f"Discarding unreadable design cache {cache_path}: {e}")
+            shutil.rmtree(cache_path, ignore_errors=True)
+        else:
+            # The modification time of a cache is its last use, for the eviction of other caches
+            with contextlib.suppress(OSError):
+                os.utime(cache_path)
+            return db, layout
+
+    db = load_design(node_file, pl_file, net_file, processes)
+    layout = parse_scl(scl_file)
+
+    try:
+        save_design(db, layout, cache_path)
+        # Drop the least recently used caches, such as those of older versions of the design files
+        evict_caches(cache_root, cache_path)
+    except OSError as e:
+        print(f"Could not write design cache {cache_path}: {e}")
+
+    return db, layout
@@ -1,9 +1,22 @@
-from parser import parse_nodes, parse_pl, parse_nets, parse_scl
+from checkpoint import Checkpointer, load_checkpoint
+from design_cache import load_design_cached
+from fast_parser import load_design, read_wts
+from legalizer import Rows, check_legality, legalize
+from parser import parse_scl
+from annealer import TemperatureSchedule
+from multilevel import multilevel_place
+from multistart import run_multistart
+from net_model import NetModel
 from sa_engine import SAEngine
-from utils import output_macros
+from telemetry import Telemetry
+from utils import output_placement
 
 
-def main(bench):
+def main(bench, use_cache=True, method=None, schedule=None, seed=None, orient_method="newton",
+         orient_flips=False, chains=1, workers=None, target_cost=None, multilevel=False,
+         init=None, overlap_model="pairwise", legal=False,
+         trace=None, trace_every=1, quiet=False, checkpoint_file=None, checkpoint_interval=300.0, resume=False,
+         macro_rows=None, clique_degree=64, prune_degree=None, parse_processes=1):
     # Find the .node file in the benchmark directory
 
     import os
@@ -11,55 +24,118 @@ def main(bench):
     pl_file = None
     net_file = None
     scl_file = None
+    wts_file = None
     for file in os.listdir(bench):
         if file.endswith(".nodes"):
             node_file = os.path.join(bench, file)
-        elif file.endswith(".pl"):
+        elif file.endswith(".pl") and file != "final_placement.pl":
             pl_file = os.path.join(bench, file)
         elif file.endswith(".nets"):
             net_file = os.path.join(bench, file)
         elif file.endswith(".scl"):
             scl_file = os.path.join(bench, file)
+        elif file.endswith(".wts"):
+            wts_file = os.path.join(bench, file)
 
     if not node_file:
         print(f"No .node file found in {bench}")
         return
     
-    # Parse the nodes from the .node file
-    macros = parse_nodes(node_file)
-    
     if not pl_file:
         print(f"No .pl file found in {bench}, skipping placement.")
         return
     
-    # Parse the placement from the .pl file
-    parse_pl(pl_file, macros)
-    
     if not net_file:
         print(f"No .nets file found: {net_file}.")
         return
     
-    # Parse the nets from the .nets file
-    nets = parse_nets(net_file, macros)
-    print(f"Parsed {len(nets)} nets from {net_file}")
-
     if not scl_file:
         print(f"No .scl file found: {scl_file}.")
         return
     
-    # Parse the scale from the .scl file
+    if method is None:
+        # Coarse levels are refined with the move-based annealer, so anneal the coarsest level with it too
+        method = "moves" if multilevel else "dual_annealing"
+
     x_min = y_min = 0.0
-    x_max, y_max = parse_scl(scl_file)
+    if use_cache:
+        # Load the parsed design from the binary cache, parsing it on a miss
+        db, (x_max, y_max) = load_design_cached(node_file, pl_file, net_file, scl_file, parse_processes)
+    else:
+        # Parse the design straight into the array-backed placement database
+        db = load_design(node_file, pl_file, net_file, parse_processes)
+        # Parse the scale from the .scl file
+        x_max, y_max = parse_scl(scl_file)
+    print(f"Loaded {db.num_macros} macros and {db.num_nets} nets from {bench}")
+
+    # Net weights of the .wts file, when the benchmark has one
+    net_weight = None
+    if wts_file:
+        net_weight = read_wts(wts_file, db.net_names)
+        print(f"Read {int((net_weight != 1.0).sum())} net weights from {wts_file}")
+
+    # Model large nets as stars through their centroid, and drop the largest ones
+    net_model = NetModel(db, clique_degree, prune_degree, net_weight)
+    print(f"Net model: {net_model.num_edges} dataflow edges, {net_model.num_stars} star nets")
 
-    # Run the simulated annealing engine
-    sa_engine = SAEngine(macros, nets, (x_min, x_max), (y_min, y_max))
-    sa_engine.run()
-    sa_engine.update_macro_positions()
+    movable = None
+    if macro_rows is not None:
+        # Only optimize the movable macros, fixed objects are anchors and standard cells keep their positions
+        movable = db.movable_macros(Rows.from_scl(scl_file).height[0], macro_rows)
+        print(f"Optimizing {len(movable)} movable macros, search dimension {2 * len(movable)} "
+              f"instead of {2 * int((~db.fixed).sum())}")
+
+    # Positions of the .pl file, which the fixed macros must keep
+    reference_pos = db.pos.copy()
+
+    if chains > 1:
+        # Run independent chains in a process pool, the workers attach to the loaded design
+        best, _ = run_multistart(db, (x_max, y_max), chains, workers,
+                                 seed if seed is not None else 0, target_cost, method, schedule,
+                                 orient_method, orient_flips, init, overlap_model, trace, trace_every, movable,
+                                 clique_degree, prune_degree, net_weight)
+        db.pos = best["pos"]
+        db.rotation[:] = best["rotation"]
+        db.flip[:] = best["flip"]
+    else:
+        with Telemetry(trace, trace_every, quiet=quiet) as telemetry:
+            if multilevel:
+                # Anneal a clustered version of the design and refine it level by level
+                multilevel_place(db, (x_min, x_max), (y_min, y_max), method=method, schedule=schedule, seed=seed,
+                                 init=init, overlap_model=overlap_model, telemetry=telemetry, net_model=net_model,
+                                 movable=movable)
+            else:
+                # Checkpoint the optimizer periodically when asked to, with the best placement so far in
+                # final_placement.pl
+                checkpoint = None
+                state = None
+                if checkpoint_file is None and resume:
+                    checkpoint_file = os.path.join(bench, "checkpoint.npz")
+                if checkpoint_file is not None:
+                    checkpoint = Checkpointer(checkpoint_file, checkpoint_interval,
+                                              os.path.join(bench, "final_placement.pl"))
+                if resume:
+                    if not os.path.exists(checkpoint_file):
+                        print(f"No checkpoint found at {checkpoint_file}, starting a new run.")
+                    else:
+                        state = load_checkpoint(checkpoint_file, db)
+                        print(f"Resuming from {checkpoint_file}")
+
+                # Run the simulated annealing engine
+                sa_engine = SAEngine(db, (x_min, x_max), (y_min, y_max), orient_method, orient_flips, overlap_model,
+                                     telemetry, movable, net_model)
+                sa_engine.run(method, schedule, seed, init=init, checkpoint=checkpoint, resume=state)
+                sa_engine.update_macro_positions()
+
+    if legal:
+        # Remove the remaining overlaps and snap the macros to the rows and sites of the .scl file
+        rows = Rows.from_scl(scl_file)
+        displacement = legalize(db, rows, movable=movable)
+        print(f"Legalized with displacement {displacement}: {check_legality(db, rows, reference_pos, movable)}")
 
     # Output the final macro positions
     output_file = os.path.join(bench, "final_placement.pl")
-    out_macros = [macro for macro in macros.values()]
-    output_macros(out_macros, output_file)
+    output_placement(db, output_file)
     print(f"Final placement written to {output_file}")
 
     return
@@ -69,10 +145,78 @@ def main(bench):
 
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 2:
-        print("Usage: python df-macroplacement.py <benchmark_directory>")
-        sys.exit(1)
+    import argparse
+    import os
+
+    arg_parser = argparse.ArgumentParser(description="Dataflow-driven macro placement.")
+    arg_parser.add_argument("benchmark_directory", help="Directory holding the .nodes/.nets/.pl/.scl files")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Always re-parse the Bookshelf files")
+    arg_parser.add_argument("--parse-processes", type=int, default=1,
+                            help="Number of processes parsing the .nets file, a single process by default")
+    arg_parser.add_argument("--method", choices=["dual_annealing", "moves"], default=None,
+                            help="Optimizer: scipy dual annealing or the move-based annealer, defaults to dual "
+                                 "annealing, or to the move-based annealer with --multilevel")
+    arg_parser.add_argument("--temps", type=int, default=100, help="Number of temperatures of the move-based annealer")
+    arg_parser.add_argument("--moves-per-temp", type=int, default=1000,
+                            help="Moves attempted per temperature of the move-based annealer")
+    arg_parser.add_argument("--seed", type=int, default=None, help="Random seed of the move-based annealer")
+    arg_parser.add_argument("--orient", choices=["newton", "broyden2", "discrete"], default="newton",
+                            help="Orientation solver: continuous torque balance or discrete orientation search")
+    arg_parser.add_argument("--orient-flips", action="store_true",
+                            help="Let the discrete orientation search also pick mirrored orientations")
+    arg_parser.add_argument("--chains", type=int, default=1,
+                            help="Number of independent annealing chains run in a process pool")
+    arg_parser.add_argument("--workers", type=int, default=None,
+                            help="Number of worker processes of the multi-start mode, defaults to the CPU count")
+    arg_parser.add_argument("--target-cost", type=float, default=None,
+                            help="Stop all chains once one of them reaches this cost")
+    arg_parser.add_argument("--multilevel", action="store_true",
+                            help="Coarsen the design into clusters, place the coarsest level and refine every level")
+    arg_parser.add_argument("--init", choices=["random", "quadratic", "current"], default=None,
+                            help="Initial placement, defaults to random for dual annealing and to the .pl "
+                                 "placement for the move-based annealer")
+    arg_parser.add_argument("--overlap-model", choices=["pairwise", "density", "potential"], default="pairwise",
+                            help="Overlap term: pairwise overlap area, bin density overflow, or electrostatic "
+                                 "energy of the bin density (dual annealing only)")
+    arg_parser.add_argument("--legalize", action="store_true",
+                            help="Legalize the final placement to the rows and sites of the .scl file")
+    arg_parser.add_argument("--trace", default=None,
+                            help="Write the cost terms of the optimizer to this JSONL file")
+    arg_parser.add_argument("--trace-every", type=int, default=1, help="Write every n-th record to the trace")
+    arg_parser.add_argument("--quiet", action="store_true", help="Do not print periodic progress summaries")
+    arg_parser.add_argument("--macros-only", type=float, nargs="?", const=1.0, default=None, metavar="ROWS",
+                            help="Only optimize the movable macros, telling them apart from standard cells as "
+                                 "nodes taller than ROWS placement rows (default 1)")
+    arg_parser.add_argument("--clique-degree", type=int, default=64,
+                            help="Largest net degree whose dataflow edges are every output-input pin pair, "
+                                 "larger nets are modeled as a star through the net centroid")
+    arg_parser.add_argument("--prune-degree", type=int, default=None,
+                            help="Ignore the dataflow of nets above this degree, such as clock and reset nets")
+    arg_parser.add_argument("--checkpoint", default=None,
+                            help="Periodically save the optimizer state to this file (single chain only), "
+                                 "no checkpoints are written by default")
+    arg_parser.add_argument("--checkpoint-interval", type=float, default=300.0,
+                            help="Seconds between checkpoints, each also writing the best placement so far")
+    arg_parser.add_argument("--resume", action="store_true",
+                            help="Continue from the checkpoint instead of starting a new run and keep checkpointing, "
+                                 "the checkpoint defaults to checkpoint.npz in the benchmark directory")
+    args = arg_parser.parse_args()
+    if args.multilevel and args.method == "dual_annealing":
+        arg_parser.error("--multilevel places rigid clusters, which dual annealing would rotate, use --method moves")
+    if args.chains > 1:
+        # The chains of the process pool run without multilevel placement, checkpoints or progress summaries
+        options = {"--multilevel": args.multilevel, "--checkpoint": args.checkpoint, "--resume": args.resume,
+                   "--quiet": args.quiet}
+        single_chain = [flag for flag, value in options.items() if value]
+        if single_chain:
+            arg_parser.error(f"{', '.join(single_chain)} cannot be combined with --chains > 1")
 
-    benchmark_directory = sys.argv[1]
-    main(benchmark_directory)
\ No newline at end of file
+    schedule = TemperatureSchedule(num_temps=args.temps, moves_per_temp=args.moves_per_temp)
+    main(args.benchmark_directory, use_cache=not args.no_cache, method=args.method, schedule=schedule, seed=args.seed,
+         orient_method=args.orient, orient_flips=args.orient_flips, chains=args.chains, workers=args.workers,
+         target_cost=args.target_cost, multilevel=args.multilevel, init=args.init,
+         overlap_model=args.overlap_model, legal=args.legalize,
+         trace=args.trace, trace_every=args.trace_every, quiet=args.quiet, checkpoint_file=args.checkpoint,
+         checkpoint_interval=args.checkpoint_interval, resume=args.resume, macro_rows=args.macros_only,
+         clique_degree=args.clique_degree, prune_degree=args.prune_degree,
+         parse_processes=args.parse_processes)
@@ -1,8 +1,133 @@
+import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
 
+from net_model import NetModel
+from placement_db import PlacementDB
 
 
 class DataFlowGraph:
-    def __init__(self):
-        pass
+    def __init__(self, db: PlacementDB, net_model: NetModel = None):
+        """
+        Dataflow graph between macros with a fixed topology.
+        Every edge of the net model is a directed edge between the macros of its pins, or between a
+        macro and the virtual node of a star net, and a repeated node pair keeps the energy of its
+        last edge. Cycles are collapsed into their strongly connected components, and the longest
+        path runs over the resulting DAG, so only edges between different components contribute.
+        :param db: Placement database.
+        :param net_model: Edges of the nets, defaults to every (output pin, input pin) pair of a net
+                          on different macros.
+        """
+        self.db = db
+        self.net_model = NetModel(db) if net_model is None else net_model
+        n = self.net_model.num_nodes
 
-    
\ No newline at end of file
+        src = self.net_model.terminal_node(self.net_model.src)
+        dst = self.net_model.terminal_node(self.net_model.dst)
+
+        # Keep the last edge of every node pair
+        key = src * n + dst
+        _, first_reversed = np.unique(key[::-1], return_index=True)
+        last = np.sort(len(key) - 1 - first_reversed)
+        self.model_edges = last
+        self.src_pins = self.net_model.src[last]
+        self.dst_pins = self.net_model.dst[last]
+        self.src = src[last]
+        self.dst = dst[last]
+
+        # Condense strongly connected components
+        graph = scipy.sparse.csr_matrix((np.ones(len(self.src)), (self.src, self.dst)), shape=(n, n))
+        self.num_components, self.component = connected_components(graph, directed=True, connection="strong")
+        comp_src = self.component[self.src]
+        comp_dst = self.component[self.dst]
+        self.dag_edges = np.flatnonzero(comp_src != comp_dst)
+        comp_src = comp_src[self.dag_edges]
+        comp_dst = comp_dst[self.dag_edges]
+
+        # Level of a component is its longest hop distance from a source
+        self.level = self._levels(comp_src, comp_dst)
+
+        # Group the DAG edges by the level of their source component
+        order = np.argsort(self.level[comp_src], kind="stable")
+        self.dag_edges = self.dag_edges[order]
+        self.comp_src = comp_src[order]
+        self.comp_dst = comp_dst[order]
+        num_levels = int(self.level.max()) + 1 if self.num_components else 0
+        self.level_ptr = np.zeros(num_levels + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.level[self.comp_src], minlength=num_levels), out=self.level_ptr[1:])
+
+    def _levels(self, comp_src: np.ndarray, comp_dst: np.ndarray) -> np.ndarray:
+        """Compute the level of every component by peeling sources level by level."""
+        num = self.num_components
+        in_degree = np.bincount(comp_dst, minlength=num)
+        order = np.argsort(comp_src, kind="stable")
+        out_ptr = np.zeros(num + 1, dtype=np.int64)
+        np.cumsum(np.bincount(comp_src, minlength=num), out=out_ptr[1:])
+        out_dst = comp_dst[order]
+
+        level = np.zeros(num, dtype=np.int64)
+        frontier = np.flatnonzero(in_degree == 0)
+        depth = 0
+        while len(frontier):
+            level[frontier] = depth
+            counts = out_ptr[frontier + 1] - out_ptr[frontier]
+            range_ptr = np.cumsum(counts) - counts
+            edges = np.repeat(out_ptr[frontier] - range_ptr, counts) + np.arange(int(counts.sum()))
+            targets = out_dst[edges]
+            np.subtract.at(in_degree, targets, 1)
+            frontier = np.unique(targets[in_degree[targets] == 0])
+            depth += 1
+        return level
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.src)
+
+    def incident_edges(self, macros: np.ndarray) -> np.ndarray:
+        """
+        Find the edges whose energy changes when some macros move, including every edge of the star
+        nets they are on.
+        :param macros: Macro ids.
+        :return: Sorted edge ids.
+        """
+        macro_mask = np.zeros(self.db.num_macros, dtype=bool)
+        macro_mask[macros] = True
+        node_mask = self.net_model.node_mask(macro_mask)
+        return np.flatnonzero(node_mask[self.src] | node_mask[self.dst])
+
+    def compute_energy(self, pos: np.ndarray = None, rotation: np.ndarray = None, flip: np.ndarray = None,
+                       edges: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the weighted energy (squared pin distance) of every edge.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :param edges: Edges to compute, defaults to all edges.
+        :return: (E,) edge energies, or one per edge in edges.
+        """
+        model_edges = self.model_edges if edges is None else self.model_edges[edges]
+        return self.net_model.edge_energy(pos, rotation, flip, model_edges)
+
+    def longest_path(self, pos: np.ndarray = None, rotation: np.ndarray = None, flip: np.ndarray = None,
+                     energy: np.ndarray = None) -> float:
+        """
+        Compute the energy of the longest path with dynamic programming over the levels.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :param energy: (E,) precomputed edge energies, computed from the placement when None.
+        :return: Sum of the edge energies along the longest path.
+        """
+        if len(self.dag_edges) == 0:
+            return 0.0
+        if energy is None:
+            energy = self.compute_energy(pos, rotation, flip)
+        energy = energy[self.dag_edges]
+
+        # Every edge leaving a level ends at a higher level, so dist of its source is final
+        dist = np.zeros(self.num_components, dtype=float)
+        for start, stop in zip(self.level_ptr[:-1], self.level_ptr[1:]):
+            if start == stop:
+                continue
+            np.maximum.at(dist, self.comp_dst[start:stop], dist[self.comp_src[start:stop]] + energy[start:stop])
+        return float(dist.max())
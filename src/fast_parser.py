@@ -0,0 +1,333 @@
+import gc
+import mmap
+import multiprocessing
+import os
+import re
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+from placement_db import PlacementDB, ORIENTATIONS, PIN_IN, PIN_OUT, PIN_EXTERNAL
+
+# Records are matched line by line over the whole buffer. Lines starting with '#'
+# and the "UCLA <kind> 1.0" / "Num... :" headers never match a record pattern.
+_NUMBER = rb"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_NAME = rb"[^\s#]\S*"
+
+_NODE_RE = re.compile(
+    rb"^[ \t]*(" + _NAME + rb")[ \t]+(" + _NUMBER + rb")[ \t]+(" + _NUMBER + rb")(?:[ \t]+(\S+))?",
+    re.MULTILINE,
+)
+_PL_RE = re.compile(
+    rb"^[ \t]*(" + _NAME + rb")[ \t]+(" + _NUMBER + rb")[ \t]+(" + _NUMBER + rb")"
+    rb"(?:[ \t]*:[ \t]*([^\s/]\S*))?(?:[ \t]+(/FIXED\S*))?",
+    re.MULTILINE,
+)
+_NET_DEGREE_RE = re.compile(rb"^[ \t]*NetDegree[ \t]*:[ \t]*(\d+)(?:[ \t]+(" + _NAME + rb"))?", re.MULTILINE)
+_PIN_RE = re.compile(
+    rb"^[ \t]*(" + _NAME + rb")[ \t]+([IOB])(?=\s)(?:[ \t]*:[ \t]*(" + _NUMBER + rb")[ \t]+(" + _NUMBER + rb"))?",
+    re.MULTILINE,
+)
+
+_WTS_RE = re.compile(rb"^[ \t]*(" + _NAME + rb")[ \t]+(" + _NUMBER + rb")[ \t]*$", re.MULTILINE)
+
+# Smallest .nets byte range worth handing to a worker process
+_MIN_CHUNK_BYTES = 1 << 22
+
+_PIN_TYPE_CODES = np.zeros(256, dtype=np.int8)
+_PIN_TYPE_CODES[ord("I")] = PIN_IN
+_PIN_TYPE_CODES[ord("O")] = PIN_OUT
+_PIN_TYPE_CODES[ord("B")] = PIN_EXTERNAL
+
+
+class _Buffer:
+    """Read-only view of a whole file, memory mapped when possible."""
+
+    def __init__(self, file_path: str):
+        self.file = open(file_path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be memory mapped
+            self.data = b""
+
+    def __enter__(self):
+        return self.data
+
+    def __exit__(self, *exc):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+@contextmanager
+def _no_gc():
+    """Pause the cyclic garbage collector while millions of token tuples are alive."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _columns(records: list[tuple], num_columns: int) -> list[list[bytes]]:
+    """Split regex records into one list per capture group."""
+    return [[record[i] for record in records] for i in range(num_columns)]
+
+
+def _to_float(tokens: list[bytes]) -> np.ndarray:
+    """Convert a list of numeric byte tokens to floats, treating empty tokens as 0."""
+    if not tokens:
+        return np.zeros(0, dtype=float)
+    arr = np.array(tokens)
+    arr[arr == b""] = b"0"
+    return arr.astype(float)
+
+
+class NameIndex:
+    def __init__(self, names: np.ndarray):
+        """
+        Vectorized name to id lookup.
+        :param names: Array of node names as bytes, indexed by node id.
+        """
+        self.order = np.argsort(names, kind="stable")
+        self.sorted_names = names[self.order]
+
+    def lookup(self, query: np.ndarray, file_path: str) -> np.ndarray:
+        """
+        Look up the ids of many names at once.
+        :param query: Array of names as bytes.
+        :param file_path: File the names come from, used in error messages.
+        :return: Array of node ids.
+        """
+        if len(query) == 0 or len(self.sorted_names) == 0:
+            if len(query) != 0:
+                raise ValueError(f"Macro '{query[0].decode()}' in {file_path} not found in nodes.")
+            return np.zeros(0, dtype=np.int64)
+        loc = np.searchsorted(self.sorted_names, query)
+        loc = np.minimum(loc, len(self.sorted_names) - 1)
+        missing = self.sorted_names[loc] != query
+        if missing.any():
+            name = query[np.argmax(missing)].decode()
+            raise ValueError(f"Macro '{name}' in {file_path} not found in nodes.")
+        return self.order[loc].astype(np.int64)
+
+
+def read_nodes(file_path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parse the .nodes file into arrays.
+    :param file_path: Path to the .nodes file.
+    :return: Tuple of node names (bytes), (N, 2) dimensions and (N,) fixed flags.
+    """
+    if not file_path.endswith(".nodes"):
+        raise ValueError(f"Invalid file type: {file_path}. Expected a .nodes file.")
+
+    with _no_gc(), _Buffer(file_path) as data:
+        records = _NODE_RE.findall(data)
+        names, widths, heights, move_types = _columns(records, 4)
+
+    if not records:
+        return np.zeros(0, dtype="S1"), np.zeros((0, 2), dtype=float), np.zeros(0, dtype=bool)
+
+    names = np.array(names)
+    dim = np.stack([_to_float(widths), _to_float(heights)], axis=1)
+    fixed = np.char.startswith(np.char.lower(np.array(move_types)), b"terminal")
+    return names, dim, fixed
+
+
+def read_pl(file_path: str, index: NameIndex, num_nodes: int, pos: np.ndarray = None,
+            rotation: np.ndarray = None, flip: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parse the .pl file into arrays.
+    :param file_path: Path to the .pl file.
+    :param index: Name index of the nodes.
+    :param num_nodes: Number of nodes.
+    :param pos: (N, 2) positions to update in place, nodes missing from the file keep theirs.
+    :param rotation: (N,) rotations to update in place.
+    :param flip: (N,) mirror flags to update in place.
+    :return: Tuple of (N, 2) positions, (N,) rotations in degrees and (N,) mirror flags.
+    """
+    if not file_path.endswith(".pl"):
+        raise ValueError(f"Invalid file type: {file_path}. Expected a .pl file.")
+
+    with _no_gc(), _Buffer(file_path) as data:
+        records = _PL_RE.findall(data)
+        names, xs, ys, orients = _columns(records, 4)
+
+    if pos is None:
+        pos = np.zeros((num_nodes, 2), dtype=float)
+    if rotation is None:
+        rotation = np.zeros(num_nodes, dtype=float)
+    if flip is None:
+        flip = np.zeros(num_nodes, dtype=bool)
+    if not records:
+        return pos, rotation, flip
+
+    ids = index.lookup(np.array(names), file_path)
+    pos[ids, 0] = _to_float(xs)
+    pos[ids, 1] = _to_float(ys)
+
+    # Orientations are either Bookshelf names or rotations in degrees
+    orient_rotation = np.zeros(len(orients), dtype=float)
+    orient_flip = np.zeros(len(orients), dtype=bool)
+    unique, inverse = np.unique(np.array(orients), return_inverse=True)
+    for i, orient in enumerate(unique):
+        orient = orient.decode()
+        if orient in ORIENTATIONS:
+            orient_rotation[inverse == i], orient_flip[inverse == i] = ORIENTATIONS[orient]
+        elif re.fullmatch(_NUMBER.decode(), orient):
+            orient_rotation[inverse == i] = float(orient) % 360.0
+    rotation[ids] = orient_rotation
+    flip[ids] = orient_flip
+    return pos, rotation, flip
+
+
+def split_nets(file_path: str, num_chunks: int) -> list[tuple[int, int]]:
+    """
+    Split a .nets file into byte ranges that each start at a NetDegree record, so that every net
+    and its pins fall in one range. The first range also holds the header.
+    :param file_path: Path to the .nets file.
+    :param num_chunks: Number of ranges to aim for, fewer are returned for small files.
+    :return: (start, stop) byte offsets of every range, in file order.
+    """
+    size = os.path.getsize(file_path)
+    num_chunks = max(1, min(num_chunks, size // _MIN_CHUNK_BYTES))
+    if num_chunks == 1:
+        return [(0, size)]
+
+    bounds = [0]
+    with _Buffer(file_path) as data:
+        for k in range(1, num_chunks):
+            # The match starts at the beginning of the first NetDegree line after the guess
+            match = _NET_DEGREE_RE.search(data, max(size * k // num_chunks, bounds[-1] + 1))
+            if match is None:
+                break
+            bounds.append(match.start())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_nets_range(task: tuple[str, int, int]) -> tuple[np.ndarray, ...]:
+    """
+    Parse the records of a byte range of a .nets file, without resolving node names.
+    :param task: Tuple of the file path and the start and stop byte offsets of the range.
+    :return: Tuple of (m,) net degrees, (m,) net names (bytes, empty when unnamed), (p,) pin node
+             names (bytes), (p,) pin types and (p, 2) pin offsets.
+    """
+    file_path, start, stop = task
+    with _no_gc(), _Buffer(file_path) as data:
+        net_records = _NET_DEGREE_RE.findall(data, start, stop)
+        degrees, net_names = _columns(net_records, 2)
+        pin_records = _PIN_RE.findall(data, start, stop)
+        names, types, xs, ys = _columns(pin_records, 4)
+        del net_records, pin_records
+
+    degrees = np.array(degrees).astype(np.int64) if degrees else np.zeros(0, dtype=np.int64)
+    pin_type = _PIN_TYPE_CODES[np.frombuffer(b"".join(types), dtype=np.uint8)]
+    pin_offset = np.stack([_to_float(xs), _to_float(ys)], axis=1)
+    return degrees, np.array(net_names, dtype=bytes), np.array(names, dtype=bytes), pin_type, pin_offset
+
+
+def _merge_nets(parts: list[tuple[np.ndarray, ...]], index: NameIndex,
+                file_path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Concatenate the parsed ranges of a .nets file in file order and resolve the pin node names."""
+    degrees, net_names, names, pin_type, pin_offset = (np.concatenate(column) for column in zip(*parts))
+    if len(degrees):
+        # Unnamed nets are named by their global net id, with a leading '#' no Bookshelf name can start with
+        net_names = np.array([name if name else f"#net{i}".encode() for i, name in enumerate(net_names.tolist())])
+    else:
+        net_names = np.zeros(0, dtype="S1")
+
+    net_ptr = np.zeros(len(degrees) + 1, dtype=np.int64)
+    np.cumsum(degrees, out=net_ptr[1:])
+    num_pins = len(names)
+    if net_ptr[-1] != num_pins:
+        raise ValueError(f"Net degrees in {file_path} sum to {net_ptr[-1]} pins, but {num_pins} pins were found.")
+
+    if num_pins == 0:
+        return (np.zeros(0, dtype=np.int64), np.zeros((0, 2), dtype=float), np.zeros(0, dtype=np.int8),
+                net_names, net_ptr)
+
+    pin_macro = index.lookup(names, file_path)
+    return pin_macro, pin_offset, pin_type, net_names, net_ptr
+
+
+def read_nets(file_path: str, index: NameIndex,
+              processes: int = 1) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parse the .nets file into arrays.
+    :param file_path: Path to the .nets file.
+    :param index: Name index of the nodes.
+    :param processes: Number of worker processes parsing ranges of the file, see split_nets. The
+                      result is identical to a serial parse.
+    :return: Tuple of (P,) pin macro ids, (P, 2) pin offsets, (P,) pin types,
+             (M,) net names (bytes) and (M + 1,) CSR net-to-pin offsets.
+    """
+    if not file_path.endswith(".nets"):
+        raise ValueError(f"Invalid file type: {file_path}. Expected a .nets file.")
+
+    tasks = [(file_path, start, stop) for start, stop in split_nets(file_path, processes)]
+    if len(tasks) == 1:
+        return _merge_nets([_parse_nets_range(tasks[0])], index, file_path)
+    with multiprocessing.get_context().Pool(len(tasks)) as pool:
+        parts = pool.map(_parse_nets_range, tasks)
+    return _merge_nets(parts, index, file_path)
+
+
+def read_wts(file_path: str, net_names: np.ndarray) -> np.ndarray:
+    """
+    Parse the net weights of a .wts file. Entries naming no net, such as node weights, are ignored.
+    :param file_path: Path to the .wts file.
+    :param net_names: (M,) names of the nets.
+    :return: (M,) weight of every net, 1 for the nets missing from the file.
+    """
+    if not file_path.endswith(".wts"):
+        raise ValueError(f"Invalid file type: {file_path}. Expected a .wts file.")
+
+    with _no_gc(), _Buffer(file_path) as data:
+        records = _WTS_RE.findall(data)
+        names, weights = _columns(records, 2)
+
+    net_weight = np.ones(len(net_names), dtype=float)
+    if not records or len(net_names) == 0:
+        return net_weight
+    net_names = np.asarray(net_names).astype(bytes)
+    order = np.argsort(net_names, kind="stable")
+    sorted_names = net_names[order]
+    names = np.array(names)
+    loc = np.minimum(np.searchsorted(sorted_names, names), len(sorted_names) - 1)
+    found = sorted_names[loc] == names
+    net_weight[order[loc[found]]] = _to_float(weights)[found]
+    return net_weight
+
+
+def load_design(node_file: str, pl_file: str, net_file: str, processes: int = 1) -> PlacementDB:
+    """
+    Parse a Bookshelf design straight into a PlacementDB.
+    :param node_file: Path to the .nodes file.
+    :param pl_file: Path to the .pl file.
+    :param net_file: Path to the .nets file.
+    :param processes: Number of worker processes parsing the .nets file, see read_nets. The .nodes
+                      and .pl files are parsed meanwhile.
+    :return: PlacementDB holding the design.
+    """
+    if not net_file.endswith(".nets"):
+        raise ValueError(f"Invalid file type: {net_file}. Expected a .nets file.")
+
+    tasks = [(net_file, start, stop) for start, stop in split_nets(net_file, processes)]
+    with multiprocessing.get_context().Pool(len(tasks)) if len(tasks) > 1 else nullcontext() as pool:
+        # Start the .nets workers first so that they run while this process parses the nodes
+        result = pool.map_async(_parse_nets_range, tasks) if pool is not None else None
+        names, dim, fixed = read_nodes(node_file)
+        index = NameIndex(names)
+        pos, rotation, flip = read_pl(pl_file, index, len(names))
+        parts = result.get() if result is not None else [_parse_nets_range(tasks[0])]
+    pin_macro, pin_offset, pin_type, net_names, net_ptr = _merge_nets(parts, index, net_file)
+
+    return PlacementDB(
+        names.astype(str), dim, fixed, pos,
+        pin_macro, pin_offset, pin_type,
+        net_names.astype(str), net_ptr, rotation, flip,
+    )
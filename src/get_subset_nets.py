@@ -1,110 +1,203 @@
+import math
 import os
 
-from macro import Macro
-from net import Net
-from parser import parse_nodes, parse_pl, parse_nets
-
-def get_subset_nets(macros: dict[str, Macro], nets: dict[str, Net]):
-    macro_subset = set()
-    net_subset = set()
-    max_nets = 20
-    for i, (net_name, net) in enumerate(nets.items()):
-        if i >= max_nets:
-            break
-
-        net_macros = net.get_in_macro() + net.get_out_macro() + net.get_external_macro()
-        macro_subset.update([macro.name for macro, _ in net_macros])
-        net_subset.add(net_name)
-
-    return macro_subset, net_subset
-
-def generate_nodes_file(macros: list[Macro], file_path: str):
-    with open(file_path, 'w') as f:
-        f.write(f"NumNodes :  {len(macros)}\n")
-        f.write(f"NumTerminals :  {sum(1 for macro in macros if macro.fixed)}\n")
-        for macro in macros:
-            f.write(f"{macro.name} {macro.dim[0]} {macro.dim[1]} ")
-            if macro.fixed:
-                f.write("terminal")
-            f.write("\n")
-
-def generate_pl_file(macros: list[Macro], file_path: str):
-    with open(file_path, 'w') as f:
-        f.write("\n")
-        for macro in macros:
-            f.write(f"{macro.name} {macro.pos[0]} {macro.pos[1]} : N ")
-            if macro.fixed:
-                f.write("/FIXED")
-            f.write("\n")
-
-
-def generate_nets_file(nets: list[Net], file_path: str):
-    with open(file_path, 'w') as f:
-        f.write(f"NumNets :  {len(nets)}\n")
-        f.write(f"NumPins :  {sum(net.get_degree() for net in nets)}\n")
-
-        for net in nets:
-            f.write(f"NetDegree : {net.get_degree()} {net.name}\n")
-            for macro, idx in net.get_in_macro():
-                r = macro.get_port(idx)['r']
-                f.write(f"\t{macro.name} I : {r[0]} {r[1]}\n")
-            for macro, idx in net.get_out_macro():
-                r = macro.get_port(idx)['r']
-                f.write(f"\t{macro.name} O : {r[0]} {r[1]}\n")
-            for macro, idx in net.get_external_macro():
-                r = macro.get_port(idx)['r']
-                f.write(f"\t{macro.name} B : {r[0]} {r[1]}\n")
+import numpy as np
+
+from hpwl import expand_ranges
+from legalizer import Rows
+from placement_db import PlacementDB, PIN_IN, PIN_OUT
+from utils import output_placement
+
+# Bookshelf direction letter of every pin type code
+_PIN_TYPE_NAMES = {PIN_IN: "I", PIN_OUT: "O"}
+
+
+def bfs_order(db: PlacementDB, num_macros: int = 0, num_pins: int = 0, max_degree: int = 64,
+              seed: int = 0) -> np.ndarray:
+    """
+    Order macros by breadth-first expansion over the nets, so that every prefix of the order is a
+    connected subnetlist. The expansion starts from a random movable macro and visits one level of
+    neighbors at a time. Nets larger than max_degree, such as clock and reset nets, do not expand.
+    When the component of the start macro is exhausted, a new random unvisited macro is seeded.
+    :param db: Placement database.
+    :param num_macros: Number of macros to order at least.
+    :param num_pins: Number of pins on the ordered macros to reach at least.
+    :param max_degree: Largest net degree followed by the expansion.
+    :param seed: Seed of the start macros.
+    :return: Macro ids in visiting order, the shortest order reaching both targets or every macro.
+    """
+    rng = np.random.default_rng(seed)
+    pin_ptr = db.macro_pin_ptr
+    macro_pins = db.macro_pins
+    expands = (db.net_degree >= 2) & (db.net_degree <= max_degree)
+    visited = np.zeros(db.num_macros, dtype=bool)
+    net_seen = ~expands
+
+    order = []
+    count = pins_count = 0
+    frontier = np.zeros(0, dtype=np.int64)
+    while (count < num_macros or pins_count < num_pins) and count < db.num_macros:
+        if len(frontier) == 0:
+            # Seed a new component, preferring movable macros
+            candidates = np.flatnonzero(~visited & ~db.fixed)
+            if len(candidates) == 0:
+                candidates = np.flatnonzero(~visited)
+            frontier = candidates[rng.integers(len(candidates))][None]
+        else:
+            # Nets of the frontier that have not been expanded yet
+            pins = macro_pins[expand_ranges(pin_ptr[frontier], pin_ptr[frontier + 1] - pin_ptr[frontier])]
+            nets = np.unique(db.pin_net[pins])
+            nets = nets[~net_seen[nets]]
+            net_seen[nets] = True
+
+            # Their unvisited macros, in order of first appearance
+            macros = db.pin_macro[expand_ranges(db.net_ptr[nets], db.net_degree[nets])]
+            macros, first = np.unique(macros, return_index=True)
+            frontier = macros[np.argsort(first, kind="stable")]
+            frontier = frontier[~visited[frontier]]
+            if len(frontier) == 0:
+                continue
+
+        # Stop within the level once both targets are reached
+        cum_pins = pins_count + np.cumsum(pin_ptr[frontier + 1] - pin_ptr[frontier])
+        size = max(num_macros - count, int(np.searchsorted(cum_pins, num_pins)) + 1)
+        frontier = frontier[:size]
+        visited[frontier] = True
+        order.append(frontier)
+        count += len(frontier)
+        pins_count = int(cum_pins[len(frontier) - 1])
+    return np.concatenate(order) if order else np.zeros(0, dtype=np.int64)
+
+
+def extract_subset(db: PlacementDB, macros: np.ndarray) -> PlacementDB:
+    """
+    Build the subnetlist induced by a set of macros.
+    Pins on other macros are dropped, as are nets left with fewer than two pins. Pin offsets,
+    pin directions, positions and orientations are kept as they are.
+    :param db: Placement database.
+    :param macros: Macro ids of the subset.
+    :return: Placement database of the subset, macros in their original order.
+    """
+    macros = np.sort(np.asarray(macros, dtype=np.int64))
+    remap = np.full(db.num_macros, -1, dtype=np.int64)
+    remap[macros] = np.arange(len(macros))
+
+    pin_kept = remap[db.pin_macro] >= 0
+    kept_degree = np.bincount(db.pin_net[pin_kept], minlength=db.num_nets)
+    nets = np.flatnonzero(kept_degree >= 2)
+    pins = expand_ranges(db.net_ptr[nets], db.net_degree[nets])
+    pins = pins[pin_kept[pins]]
+    net_ptr = np.zeros(len(nets) + 1, dtype=np.int64)
+    np.cumsum(kept_degree[nets], out=net_ptr[1:])
+
+    return PlacementDB(
+        np.asarray(db.names)[macros].tolist(), db.dim[macros], db.fixed[macros], db.pos[macros],
+        remap[db.pin_macro[pins]], db.pin_offset[pins], db.pin_type[pins],
+        np.asarray(db.net_names)[nets].tolist(), net_ptr, db.rotation[macros], db.flip[macros],
+    )
+
+
+def fit_rows(db: PlacementDB, rows: Rows) -> Rows:
+    """
+    Move a subset to the origin and cover it with rows of the original height and site width.
+    The shift is a whole number of rows and sites, so row and site alignment is preserved. The
+    layout is square, as parser.parse_scl reads the layout size from the row length.
+    :param db: Placement database of the subset, positions are updated in place.
+    :param rows: Rows of the original design.
+    :return: Rows of the subset.
+    """
+    height = float(rows.height[0])
+    site = float(rows.site_width[0])
+    rects = db.compute_rects()
+    x0 = rows.x_low[0] + math.floor((rects[:, 0].min() - rows.x_low[0]) / site) * site
+    y0 = rows.y[0] + math.floor((rects[:, 1].min() - rows.y[0]) / height) * height
+    db.pos -= (x0, y0)
+
+    side = max(rects[:, 2].max() - x0, rects[:, 3].max() - y0)
+    num_rows = math.ceil(side / height)
+    num_sites = math.ceil(side / site)
+    return Rows(np.arange(num_rows) * height, np.full(num_rows, height), np.full(num_rows, site),
+                np.zeros(num_rows), np.full(num_rows, num_sites * site))
+
+
+def write_design(db: PlacementDB, rows: Rows, out_dir: str, name: str):
+    """
+    Write a design as Bookshelf .nodes, .nets, .pl and .scl files.
+    :param db: Placement database.
+    :param rows: Rows of the layout.
+    :param out_dir: Directory to write into, created if missing.
+    :param name: Base name of the files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, name)
+    names = list(db.names)
+
+    nodes = [f"UCLA nodes 1.0\n\nNumNodes : {db.num_macros}\nNumTerminals : {int(db.fixed.sum())}\n"]
+    tags = ["\tterminal" if fixed else "" for fixed in db.fixed.tolist()]
+    nodes.extend(f"\t{macro}\t{w:.15g}\t{h:.15g}{tag}\n" for macro, (w, h), tag in zip(names, db.dim.tolist(), tags))
+    with open(path + ".nodes", 'w') as f:
+        f.writelines(nodes)
+
+    pin_lines = [f"\t{names[m]} {_PIN_TYPE_NAMES.get(t, 'B')} : {x:.15g} {y:.15g}\n"
+                 for m, t, (x, y) in zip(db.pin_macro.tolist(), db.pin_type.tolist(), db.pin_offset.tolist())]
+    nets = [f"UCLA nets 1.0\n\nNumNets : {db.num_nets}\nNumPins : {db.num_pins}\n"]
+    net_ptr = db.net_ptr.tolist()
+    for j, net in enumerate(db.net_names):
+        nets.append(f"NetDegree : {net_ptr[j + 1] - net_ptr[j]} {net}\n")
+        nets.extend(pin_lines[net_ptr[j]:net_ptr[j + 1]])
+    with open(path + ".nets", 'w') as f:
+        f.writelines(nets)
+
+    output_placement(db, path + ".pl")
+    rows.to_scl(path + ".scl")
+
 
 if __name__ == "__main__":
-    bench = "/home/peizhi/Documents/2025_Spring_Classes/DFMP/bench/bigblue4"
-    node_file = None
-    pl_file = None
-    net_file = None
-    for file in os.listdir(bench):
-        if file.endswith(".nodes"):
-            node_file = os.path.join(bench, file)
-        elif file.endswith(".pl"):
-            pl_file = os.path.join(bench, file)
-        elif file.endswith(".nets"):
-            net_file = os.path.join(bench, file)
-
-    if not node_file:
-        print(f"No .node file found in {bench}")
-        exit(1)
-    
-    # Parse the nodes from the .node file
-    # print(f"Parsing nodes from {node_file}")
-    macros = parse_nodes(node_file)
-    print(f"Parsed {len(macros)} macros from {node_file}")
-    # print(macros)
-    
-    if not pl_file:
-        print(f"No .pl file found in {bench}, skipping placement.")
-        exit(1)
-    
-    # Parse the placement from the .pl file
-    parse_pl(pl_file, macros)
-    
-    if not net_file:
-        print(f"No .nets file found: {net_file}.")
-        exit(1)
-    
-    # Parse the nets from the .nets file
-    nets = parse_nets(net_file, macros)
-    # print(nets)
-    print(f"Parsed {len(nets)} nets from {net_file}")
-
-    # Get a subset of nets and macros
-    subset_macros, subset_nets = get_subset_nets(macros, nets)
-
-    macro_list = [macros[name] for name in subset_macros]
-    net_list = [nets[name] for name in subset_nets]
-
-    out_dir = "/home/peizhi/Documents/2025_Spring_Classes/DFMP/bench/bigblue4_20"
-    if not os.path.exists(out_dir):
-        os.makedirs(out_dir)
-    basename = os.path.basename(out_dir)
-    generate_nodes_file(macro_list, os.path.join(out_dir, f"{basename}.nodes"))
-    generate_pl_file(macro_list, os.path.join(out_dir, f"{basename}.pl"))
-    generate_nets_file(net_list, os.path.join(out_dir, f"{basename}.nets"))
+    import argparse
+    import time
+
+    from bench_parser import find_design_files, is_lfs_pointer
+    from design_cache import load_design_cached
+
+    arg_parser = argparse.ArgumentParser(description="Extract connected subsets of a benchmark, e.g. a ladder of "
+                                                     "1k, 10k and 100k macros, as Bookshelf designs.")
+    arg_parser.add_argument("benchmark_directory", help="Directory holding the .nodes/.nets/.pl/.scl files")
+    arg_parser.add_argument("output_directory", help="Directory the subsets are written into, one directory each")
+    arg_parser.add_argument("--macros", type=int, nargs="*", default=[],
+                            help="Number of macros of every subset")
+    arg_parser.add_argument("--pins", type=int, nargs="*", default=[],
+                            help="Number of pins on the macros of every subset")
+    arg_parser.add_argument("--max-degree", type=int, default=64, help="Largest net degree followed by the expansion")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Seed of the start macros")
+    args = arg_parser.parse_args()
+    if not args.macros and not args.pins:
+        arg_parser.error("Expected at least one --macros or --pins target.")
+
+    bench = args.benchmark_directory
+    node_file, pl_file, net_file = find_design_files(bench)
+    scl_files = [os.path.join(bench, f) for f in os.listdir(bench) if f.endswith(".scl")]
+    if any(f is None or is_lfs_pointer(f) for f in (node_file, pl_file, net_file)) or not scl_files:
+        print(f"{bench}: design files missing or git-lfs pointers")
+        raise SystemExit(1)
+
+    start = time.perf_counter()
+    db, _ = load_design_cached(node_file, pl_file, net_file, scl_files[0])
+    rows = Rows.from_scl(scl_files[0])
+    print(f"Loaded {db.num_macros} macros and {db.num_nets} nets in {time.perf_counter() - start:.2f} s")
+
+    # One expansion serves every target, each subset is a prefix of the visiting order
+    start = time.perf_counter()
+    order = bfs_order(db, max(args.macros, default=0), max(args.pins, default=0), args.max_degree, args.seed)
+    cum_pins = np.cumsum(np.diff(db.macro_pin_ptr)[order])
+    print(f"Ordered {len(order)} macros in {time.perf_counter() - start:.2f} s")
 
+    basename = os.path.basename(os.path.normpath(bench))
+    targets = [(f"{basename}_{k}", k) for k in args.macros]
+    targets += [(f"{basename}_{k}pins", int(np.searchsorted(cum_pins, k)) + 1) for k in args.pins]
+    for name, size in targets:
+        start = time.perf_counter()
+        subset = extract_subset(db, order[:size])
+        subset_rows = fit_rows(subset, rows)
+        write_design(subset, subset_rows, os.path.join(args.output_directory, name), name)
+        print(f"{name}: {subset.num_macros} macros, {subset.num_nets} nets, {subset.num_pins} pins, "
+              f"{subset_rows.num_rows} rows, written in {time.perf_counter() - start:.2f} s")
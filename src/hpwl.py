@@ -0,0 +1,251 @@
+import numpy as np
+
+from placement_db import PlacementDB
+
+
+def expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Concatenate the index ranges [starts[i], starts[i] + counts[i]) without a Python loop.
+    :param starts: First index of every range.
+    :param counts: Length of every range.
+    :return: Concatenated indices.
+    """
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    range_ptr = np.cumsum(counts) - counts
+    return np.repeat(starts - range_ptr, counts) + np.arange(total, dtype=np.int64)
+
+
+class HPWLEngine:
+    def __init__(self, db: PlacementDB):
+        """
+        Half-perimeter wirelength of every net with cached per-net bounding boxes.
+        Pins are located with PlacementDB.compute_port_loc, as in every other cost term.
+        :param db: Placement database.
+        """
+        self.db = db
+
+        # Only nets with pins have a bounding box
+        self.nets = np.flatnonzero(db.net_degree > 0)
+
+        # Macro to incident net CSR, each net listed once per macro
+        macro_net = np.unique(np.stack([db.pin_macro, db.pin_net], axis=1), axis=0)
+        self.macro_net_ptr = np.zeros(db.num_macros + 1, dtype=np.int64)
+        np.cumsum(np.bincount(macro_net[:, 0], minlength=db.num_macros), out=self.macro_net_ptr[1:])
+        self.macro_nets = np.ascontiguousarray(macro_net[:, 1])
+
+        # Cached state of the last full evaluation
+        self.pos = None
+        self.rotation = None
+        self.flip = None
+        self.bbox = np.zeros((db.num_nets, 4), dtype=float)
+        self.net_hpwl = np.zeros(db.num_nets, dtype=float)
+        self.total = 0.0
+        self._pending = None
+
+    def compute_pin_loc(self, pos: np.ndarray, rotation: np.ndarray, flip: np.ndarray,
+                        pins: np.ndarray = None) -> np.ndarray:
+        """
+        Compute pin locations with macro orientation applied.
+        :param pos: (N, 2) positions of the macros.
+        :param rotation: (N,) rotation in degrees of the macros.
+        :param flip: (N,) mirror flags of the macros.
+        :param pins: Pins to compute, defaults to all pins.
+        :return: (len(pins), 2) pin locations.
+        """
+        return self.db.compute_port_loc(pos, rotation, flip, pins)
+
+    def _net_bbox(self, nets: np.ndarray, pos: np.ndarray, rotation: np.ndarray, flip: np.ndarray) -> np.ndarray:
+        """Compute the bounding boxes of non-empty nets with one segment reduction per coordinate."""
+        db = self.db
+        starts = db.net_ptr[nets]
+        degrees = db.net_degree[nets]
+        pins = expand_ranges(starts, degrees)
+        loc = self.compute_pin_loc(pos, rotation, flip, pins)
+
+        bbox = np.empty((len(nets), 4), dtype=float)
+        if len(nets) == 0:
+            return bbox
+        seg_starts = np.cumsum(degrees) - degrees
+        bbox[:, 0] = np.minimum.reduceat(loc[:, 0], seg_starts)
+        bbox[:, 1] = np.minimum.reduceat(loc[:, 1], seg_starts)
+        bbox[:, 2] = np.maximum.reduceat(loc[:, 0], seg_starts)
+        bbox[:, 3] = np.maximum.reduceat(loc[:, 1], seg_starts)
+        return bbox
+
+    def compute(self, pos: np.ndarray = None, rotation: np.ndarray = None, flip: np.ndarray = None) -> float:
+        """
+        Compute the HPWL of every net from scratch and cache the bounding boxes.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :return: Total HPWL.
+        """
+        if pos is None:
+            pos = self.db.pos
+        if rotation is None:
+            rotation = self.db.rotation
+        if flip is None:
+            flip = self.db.flip
+        self.pos = np.array(pos, dtype=float)
+        self.rotation = np.array(rotation, dtype=float)
+        self.flip = np.array(flip, dtype=bool)
+
+        self.bbox[:] = 0.0
+        self.bbox[self.nets] = self._net_bbox(self.nets, self.pos, self.rotation, self.flip)
+        self.net_hpwl = (self.bbox[:, 2] - self.bbox[:, 0]) + (self.bbox[:, 3] - self.bbox[:, 1])
+        self.total = float(self.net_hpwl.sum())
+        self._pending = None
+        return self.total
+
+    def set_movable(self, macros: np.ndarray):
+        """
+        Split the pins into the pins of the given macros, which move, and the pins of all other
+        macros, which stay where they are in the stored placement. The bounding box of the static
+        pins of every net is computed once, so that compute_movable only locates the moving pins.
+        :param macros: Ids of the macros that move.
+        """
+        db = self.db
+        self.compute()
+        pin_moving = np.zeros(db.num_macros, dtype=bool)
+        pin_moving[macros] = True
+        pin_moving = pin_moving[db.pin_macro]
+
+        # Moving pins grouped by net
+        moving_pins = np.flatnonzero(pin_moving)
+        self.moving_pins = moving_pins[np.argsort(db.pin_net[moving_pins], kind="stable")]
+        self.moving_nets, self.moving_starts = np.unique(db.pin_net[self.moving_pins], return_index=True)
+        self.static_total = self.total - float(self.net_hpwl[self.moving_nets].sum())
+
+        # Bounding box of the static pins of the nets with moving pins, empty when there are none
+        self.anchor_bbox = np.tile([np.inf, np.inf, -np.inf, -np.inf], (len(self.moving_nets), 1))
+        pins = expand_ranges(db.net_ptr[self.moving_nets], db.net_degree[self.moving_nets])
+        pins = pins[~pin_moving[pins]]
+        if len(pins):
+            loc = self.compute_pin_loc(self.pos, self.rotation, self.flip, pins)
+            net = np.searchsorted(self.moving_nets, db.pin_net[pins])
+            np.minimum.at(self.anchor_bbox[:, 0], net, loc[:, 0])
+            np.minimum.at(self.anchor_bbox[:, 1], net, loc[:, 1])
+            np.maximum.at(self.anchor_bbox[:, 2], net, loc[:, 0])
+            np.maximum.at(self.anchor_bbox[:, 3], net, loc[:, 1])
+
+    def compute_movable(self, pos: np.ndarray = None, rotation: np.ndarray = None, flip: np.ndarray = None) -> float:
+        """
+        Compute the total HPWL when only the macros given to set_movable have moved.
+        The cached state is not updated.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :return: Total HPWL.
+        """
+        if len(self.moving_nets) == 0:
+            return self.static_total
+        db = self.db
+        loc = self.compute_pin_loc(db.pos if pos is None else pos, db.rotation if rotation is None else rotation,
+                                   db.flip if flip is None else flip, self.moving_pins)
+        bbox = np.stack([
+            np.minimum(self.anchor_bbox[:, 0], np.minimum.reduceat(loc[:, 0], self.moving_starts)),
+            np.minimum(self.anchor_bbox[:, 1], np.minimum.reduceat(loc[:, 1], self.moving_starts)),
+            np.maximum(self.anchor_bbox[:, 2], np.maximum.reduceat(loc[:, 0], self.moving_starts)),
+            np.maximum(self.anchor_bbox[:, 3], np.maximum.reduceat(loc[:, 1], self.moving_starts)),
+        ], axis=1)
+        return self.static_total + float(np.sum((bbox[:, 2] - bbox[:, 0]) + (bbox[:, 3] - bbox[:, 1])))
+
+    def incident_nets(self, macros: np.ndarray) -> np.ndarray:
+        """Get the nets incident to any of the given macros."""
+        macros = np.atleast_1d(macros)
+        starts = self.macro_net_ptr[macros]
+        nets = self.macro_nets[expand_ranges(starts, self.macro_net_ptr[macros + 1] - starts)]
+        return np.unique(nets)
+
+    def propose(self, macros: np.ndarray, pos: np.ndarray, rotation: np.ndarray, flip: np.ndarray = None) -> float:
+        """
+        Evaluate moving some macros without committing the move.
+        Only the nets incident to the moved macros are recomputed.
+        :param macros: Ids of the moved macros.
+        :param pos: (k, 2) new positions of the moved macros.
+        :param rotation: (k,) new rotations of the moved macros.
+        :param flip: (k,) new mirror flags of the moved macros, defaults to the current flags.
+        :return: Change of the total HPWL.
+        """
+        if self.pos is None:
+            self.compute()
+        macros = np.atleast_1d(macros)
+        if flip is None:
+            flip = self.flip[macros]
+        nets = self.incident_nets(macros)
+
+        old_state = (self.pos[macros].copy(), self.rotation[macros].copy(), self.flip[macros].copy())
+        self.pos[macros] = pos
+        self.rotation[macros] = rotation
+        self.flip[macros] = flip
+        bbox = self._net_bbox(nets, self.pos, self.rotation, self.flip)
+        self.pos[macros], self.rotation[macros], self.flip[macros] = old_state
+
+        hpwl = (bbox[:, 2] - bbox[:, 0]) + (bbox[:, 3] - bbox[:, 1])
+        delta = float(hpwl.sum() - self.net_hpwl[nets].sum())
+        self._pending = (macros, np.array(pos, dtype=float), np.array(rotation, dtype=float),
+                         np.array(flip, dtype=bool), nets, bbox, hpwl, delta)
+        return delta
+
+    def accept(self):
+        """Commit the last proposed move."""
+        if self._pending is None:
+            return
+        macros, pos, rotation, flip, nets, bbox, hpwl, delta = self._pending
+        self.pos[macros] = pos
+        self.rotation[macros] = rotation
+        self.flip[macros] = flip
+        self.bbox[nets] = bbox
+        self.net_hpwl[nets] = hpwl
+        self.total += delta
+        self._pending = None
+
+    def update_macro(self, idx: int, x: float, y: float, rotation: float) -> float:
+        """
+        Move one macro and update the bounding boxes of its incident nets.
+        :return: New total HPWL.
+        """
+        self.propose(np.array([idx]), np.array([[x, y]]), np.array([rotation]))
+        self.accept()
+        return self.total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from fast_parser import NameIndex, read_nodes, read_pl, read_nets
+
+    arg_parser = argparse.ArgumentParser(description="Half-perimeter wirelength of a Bookshelf placement.")
+    arg_parser.add_argument("nodes", help=".nodes file")
+    arg_parser.add_argument("init_pl", help="Initial .pl file with the fixed terminal locations")
+    arg_parser.add_argument("solution_pl", help="Solution .pl file")
+    arg_parser.add_argument("nets", help=".nets file")
+    args = arg_parser.parse_args()
+
+    names, dim, fixed = read_nodes(args.nodes)
+    index = NameIndex(names)
+    print(f"NumNodes: {len(names)} NumTerminals: {int(fixed.sum())}")
+
+    init_pos, init_rotation, init_flip = read_pl(args.init_pl, index, len(names))
+    pos, rotation, flip = read_pl(args.solution_pl, index, len(names),
+                                  init_pos.copy(), init_rotation.copy(), init_flip.copy())
+
+    moved = fixed & np.any(pos != init_pos, axis=1)
+    if moved.any():
+        i = np.argmax(moved)
+        print(f"ERROR: Fixed block ({names[i].decode()}) moved from ({init_pos[i, 0]}, {init_pos[i, 1]}) "
+              f"to ({pos[i, 0]}, {pos[i, 1]})")
+        raise SystemExit(1)
+
+    # scripts/hpwl.pl offsets pins from the center of the macro, whose lower-left corner is the
+    # .pl position, so shift the positions to put PlacementDB pins at the same locations
+    swap = (rotation % 180) != 0
+    pos = pos + np.where(swap[:, None], dim[:, ::-1], dim) / 2.0 + dim / 2.0
+
+    pin_macro, pin_offset, pin_type, net_names, net_ptr = read_nets(args.nets, index)
+    db = PlacementDB(names.astype(str), dim, fixed, pos, pin_macro, pin_offset, pin_type,
+                     net_names.astype(str), net_ptr, rotation, flip)
+    print(f"NumNets: {db.num_nets} NumPins: {db.num_pins}")
+    print(f"Total HPWL: {HPWLEngine(db).compute():.6f}")
@@ -0,0 +1,309 @@
+import bisect
+import math
+import time
+
+import numpy as np
+
+from overlap import overlap_pairs, intersection_area
+from placement_db import PlacementDB
+
+
+class Rows:
+    def __init__(self, y: np.ndarray, height: np.ndarray, site_width: np.ndarray, x_low: np.ndarray,
+                 x_high: np.ndarray):
+        """
+        Placement rows of the layout, sorted from bottom to top.
+        :param y: (R,) bottom coordinate of every row.
+        :param height: (R,) height of every row.
+        :param site_width: (R,) site pitch of every row.
+        :param x_low: (R,) left end of every row.
+        :param x_high: (R,) right end of every row.
+        """
+        order = np.argsort(y, kind="stable")
+        self.y = np.asarray(y, dtype=float)[order]
+        self.height = np.asarray(height, dtype=float)[order]
+        self.site_width = np.asarray(site_width, dtype=float)[order]
+        self.x_low = np.asarray(x_low, dtype=float)[order]
+        self.x_high = np.asarray(x_high, dtype=float)[order]
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.y)
+
+    @classmethod
+    def from_scl(cls, file_path: str) -> "Rows":
+        """
+        Parse the rows of a .scl file.
+        :param file_path: Path to the .scl file.
+        :return: Rows of the layout.
+        """
+        if not file_path.endswith(".scl"):
+            raise ValueError(f"Invalid file type: {file_path}. Expected a .scl file.")
+
+        rows = []
+        row = None
+        with open(file_path, 'r') as file:
+            for line in file:
+                words = line.replace(":", " ").split()
+                if not words or words[0].startswith("#"):
+                    continue
+                if words[0] == "CoreRow":
+                    row = {"Sitespacing": 1.0, "SubrowOrigin": 0.0, "NumSites": 0.0}
+                elif words[0] == "End" and row is not None:
+                    x_low = row["SubrowOrigin"]
+                    rows.append((row["Coordinate"], row["Height"], row["Sitespacing"], x_low,
+                                 x_low + row["NumSites"] * row["Sitespacing"]))
+                    row = None
+                elif row is not None:
+                    # Key and value pairs, SubrowOrigin and NumSites share a line
+                    for key, value in zip(words[::2], words[1::2]):
+                        row[key] = float(value)
+
+        if not rows:
+            raise ValueError(f"No rows found in {file_path}.")
+        return cls(*np.array(rows, dtype=float).T)
+
+    def to_scl(self, file_path: str):
+        """
+        Write the rows as a .scl file.
+        :param file_path: Path to the .scl file.
+        """
+        lines = [f"UCLA scl 1.0\n\nNumRows : {self.num_rows}\n\n"]
+        for y, height, site, x_low, x_high in zip(self.y.tolist(), self.height.tolist(), self.site_width.tolist(),
+                                                  self.x_low.tolist(), self.x_high.tolist()):
+            lines.append(f"CoreRow Horizontal\n"
+                         f"  Coordinate    :   {y:.15g}\n"
+                         f"  Height        :   {height:.15g}\n"
+                         f"  Sitewidth     :   {site:.15g}\n"
+                         f"  Sitespacing   :   {site:.15g}\n"
+                         f"  Siteorient    :   1\n"
+                         f"  Sitesymmetry  :   1\n"
+                         f"  SubrowOrigin  :   {x_low:.15g}\tNumSites  :  {round((x_high - x_low) / site)}\n"
+                         f"End\n")
+        with open(file_path, 'w') as f:
+            f.writelines(lines)
+
+
+class RowIntervals:
+    def __init__(self, num_rows: int):
+        """Occupied x intervals of every row, kept sorted and disjoint for bisection."""
+        self.starts = [[] for _ in range(num_rows)]
+        self.ends = [[] for _ in range(num_rows)]
+
+    def insert(self, row: int, start: float, end: float):
+        """Mark [start, end) as occupied in a row, merging with the intervals it touches."""
+        starts = self.starts[row]
+        ends = self.ends[row]
+        i = bisect.bisect_left(ends, start)
+        j = bisect.bisect_right(starts, end)
+        if i < j:
+            start = min(start, starts[i])
+            end = max(end, ends[j - 1])
+        starts[i:j] = [start]
+        ends[i:j] = [end]
+
+    def conflict(self, row: int, start: float, end: float) -> tuple[float, float]:
+        """
+        Find the occupied intervals of a row overlapping [start, end).
+        :return: Tuple of the first start and the last end of the overlapping intervals, or None.
+        """
+        starts = self.starts[row]
+        ends = self.ends[row]
+        i = bisect.bisect_right(ends, start)
+        j = bisect.bisect_left(starts, end)
+        if i >= j:
+            return None
+        return starts[i], ends[j - 1]
+
+
+def _find_gap(occupied: RowIntervals, rows: range, x: float, width: float, x_low: float, x_high: float,
+              site: float, direction: int, limit: float = math.inf) -> float:
+    """
+    Find the nearest x from x in the given direction where [x, x + width) is free in every row.
+    :param limit: Give up once the gap would be farther than this from x.
+    :return: Site-aligned x, or None when the macro does not fit within the limit or the rows.
+    """
+    snap = math.ceil if direction > 0 else math.floor
+    x_start = x
+    x = x_low + snap((x - x_low) / site - 1e-9 * direction) * site
+    while x_low - 1e-9 <= x and x + width <= x_high + 1e-9 and abs(x - x_start) < limit:
+        moved = False
+        for row in rows:
+            conflict = occupied.conflict(row, x, x + width)
+            if conflict is None:
+                continue
+            # Jump past the blocking intervals and check every row again
+            target = conflict[1] if direction > 0 else conflict[0] - width
+            x = x_low + snap((target - x_low) / site - 1e-9 * direction) * site
+            moved = True
+            break
+        if not moved:
+            return x
+    return None
+
+
+def legalize(db: PlacementDB, rows: Rows, max_rows: int = None, movable: np.ndarray = None) -> float:
+    """
+    Remove the overlaps of the movable macros and align them to rows and sites with small displacement.
+    Macros are placed greedily from the largest, Tetris style, each one at the closest free,
+    site-aligned location to its current one. Candidate rows are searched outwards from the
+    macro's row until the vertical distance alone exceeds the best displacement found, and
+    occupied space is kept as sorted x intervals per row. Fixed macros are obstacles, other nodes
+    outside the movable set, such as standard cells, keep their positions and are left to a
+    standard cell legalizer. Macros are aligned by the bottom edge of their rectangle, see
+    PlacementDB.compute_rects.
+    :param db: Placement database, positions of the movable macros are updated in place.
+    :param rows: Rows of the layout, assumed to share one site grid.
+    :param max_rows: Number of rows searched above and below a macro before giving up, defaults to all rows.
+    :param movable: Ids of the macros to legalize, defaults to every macro that is not fixed, see
+                    PlacementDB.movable_macros.
+    :return: Total displacement (Manhattan distance) of the movable macros.
+    """
+    if rows.num_rows == 0:
+        raise ValueError("Cannot legalize without rows.")
+    rects = db.compute_rects()
+    dim = db.compute_dimensions()
+    occupied = RowIntervals(rows.num_rows)
+
+    # Plain lists, the search below works on one macro at a time
+    row_y = rows.y.tolist()
+    row_top = (rows.y + rows.height).tolist()
+    row_x_low = rows.x_low.tolist()
+    row_x_high = rows.x_high.tolist()
+    num_rows = rows.num_rows
+
+    def spanned_rows(y_low: float, y_high: float) -> range:
+        return range(bisect.bisect_right(row_top, y_low), bisect.bisect_left(row_y, y_high))
+
+    # Fixed macros block every row they cover
+    for i in np.flatnonzero(db.fixed).tolist():
+        x_low, y_low, x_high, y_high = rects[i].tolist()
+        for row in spanned_rows(y_low, y_high):
+            occupied.insert(row, x_low, x_high)
+
+    movable = np.flatnonzero(~db.fixed) if movable is None else np.asarray(movable, dtype=np.int64)
+    order = movable[np.argsort(-(dim[movable, 0] * dim[movable, 1]), kind="stable")]
+    if max_rows is None:
+        max_rows = num_rows
+    site = float(rows.site_width[0])
+
+    displacement = 0.0
+    for i, (width, height), (x, y_low) in zip(order.tolist(), dim[order].tolist(), rects[order, :2].tolist()):
+        start_row = min(bisect.bisect_left(row_y, y_low), num_rows - 1)
+
+        # Walk the rows outwards from the macro's row, nearest first, until they are farther than the best
+        best = None
+        best_cost = math.inf
+        up, down = start_row, start_row - 1
+        for _ in range(min(2 * max_rows + 1, num_rows)):
+            dy_up = abs(row_y[up] - y_low) if up < num_rows else math.inf
+            dy_down = abs(row_y[down] - y_low) if down >= 0 else math.inf
+            if dy_up <= dy_down:
+                row, dy, up = up, dy_up, up + 1
+            else:
+                row, dy, down = down, dy_down, down - 1
+            if dy >= best_cost:
+                break
+
+            # Rows covered by the macro with its bottom on this row
+            span = spanned_rows(row_y[row], row_y[row] + height)
+            if len(span) == 0 or row_top[span.stop - 1] < row_y[row] + height - 1e-9:
+                continue
+            x_low = max(row_x_low[span.start:span.stop])
+            x_high = min(row_x_high[span.start:span.stop])
+            start = min(max(x, x_low), x_high - width)
+            for direction in (1, -1):
+                candidate = _find_gap(occupied, span, start, width, x_low, x_high, site, direction,
+                                      best_cost - dy + abs(start - x))
+                if candidate is not None and abs(candidate - x) + dy < best_cost:
+                    best_cost = abs(candidate - x) + dy
+                    best = (candidate, row, span)
+
+        if best is None:
+            raise ValueError(f"Could not legalize macro '{db.names[i]}' of size {width} x {height}.")
+        new_x, row, span = best
+        for r in span:
+            occupied.insert(r, new_x, new_x + width)
+        db.pos[i] = (new_x, row_y[row] + height)
+        displacement += best_cost
+    return displacement
+
+
+def check_legality(db: PlacementDB, rows: Rows, reference_pos: np.ndarray = None,
+                   movable: np.ndarray = None) -> dict[str, int]:
+    """
+    Check a placement with the error types of scripts/legal2.pl.
+    :param db: Placement database.
+    :param rows: Rows of the layout.
+    :param reference_pos: (N, 2) original positions, fixed macros must not have moved from them.
+    :param movable: Ids of the legalized macros, defaults to every macro that is not fixed. Nodes
+                    that are neither movable nor fixed are not checked, as in legalize.
+    :return: Number of "fixed_moved", "out_of_rows", "misaligned" and "overlapping" errors, the
+             last counting pairs of overlapping macros.
+    """
+    rects = db.compute_rects()
+    is_movable = ~db.fixed
+    if movable is not None:
+        is_movable = np.zeros(db.num_macros, dtype=bool)
+        is_movable[movable] = True
+    errors = {"fixed_moved": 0, "out_of_rows": 0, "misaligned": 0, "overlapping": 0}
+    if reference_pos is not None:
+        errors["fixed_moved"] = int(np.sum(np.any(np.abs(db.pos - reference_pos) > 1e-6, axis=1) & db.fixed))
+
+    # Inside the row area
+    area = (rows.x_low.min(), rows.y.min(), rows.x_high.max(), (rows.y + rows.height).max())
+    outside = ((rects[:, 0] < area[0] - 1e-6) | (rects[:, 1] < area[1] - 1e-6) |
+               (rects[:, 2] > area[2] + 1e-6) | (rects[:, 3] > area[3] + 1e-6))
+    errors["out_of_rows"] = int(np.sum(outside & is_movable))
+
+    # Bottom edge on a row and left edge on a site of that row
+    row = np.clip(np.searchsorted(rows.y, rects[:, 1] - 1e-6), 0, rows.num_rows - 1)
+    on_row = np.abs(rows.y[row] - rects[:, 1]) <= 1e-6
+    sites = (rects[:, 0] - rows.x_low[row]) / rows.site_width[row]
+    on_site = np.abs(sites - np.round(sites)) <= 1e-6
+    errors["misaligned"] = int(np.sum(~(on_row & on_site) & is_movable))
+
+    # Overlapping pairs of legalized macros, or of a legalized and a fixed macro
+    checked = np.flatnonzero(is_movable | db.fixed)
+    for i, j in overlap_pairs(rects[checked]):
+        i, j = checked[i], checked[j]
+        area = intersection_area(rects[i], rects[j])
+        width = np.minimum(rects[i, 2], rects[j, 2]) - np.maximum(rects[i, 0], rects[j, 0])
+        height = np.minimum(rects[i, 3], rects[j, 3]) - np.maximum(rects[i, 1], rects[j, 1])
+        errors["overlapping"] += int(np.sum((area > 0) & (width > 1e-6) & (height > 1e-6) &
+                                            (is_movable[i] | is_movable[j])))
+    return errors
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from bench_parser import find_design_files, is_lfs_pointer
+    from design_cache import load_design_cached
+
+    arg_parser = argparse.ArgumentParser(description="Legalize the placement of benchmarks and check the result.")
+    arg_parser.add_argument("benches", nargs="+", help="Benchmark directories")
+    arg_parser.add_argument("--placement", default=None,
+                            help="Placement file name inside each benchmark directory, defaults to the design's .pl")
+    args = arg_parser.parse_args()
+
+    for bench in args.benches:
+        node_file, pl_file, net_file = find_design_files(bench)
+        scl_files = [os.path.join(bench, f) for f in os.listdir(bench) if f.endswith(".scl")]
+        if any(f is None or is_lfs_pointer(f) for f in (node_file, pl_file, net_file)) or not scl_files:
+            print(f"{bench}: design files missing or git-lfs pointers, skipped")
+            continue
+        db, _ = load_design_cached(node_file, pl_file, net_file, scl_files[0])
+        if args.placement is not None:
+            from fast_parser import load_design
+            db = load_design(node_file, os.path.join(bench, args.placement), net_file)
+        rows = Rows.from_scl(scl_files[0])
+        reference_pos = db.pos.copy()
+
+        print(f"{bench}: {db.num_macros} macros, {rows.num_rows} rows, before: {check_legality(db, rows)}")
+        start = time.perf_counter()
+        displacement = legalize(db, rows)
+        elapsed = time.perf_counter() - start
+        print(f"  legalized in {elapsed:.2f} s, displacement {displacement:.6g}, "
+              f"after: {check_legality(db, rows, reference_pos)}")
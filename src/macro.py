@@ -1,77 +1,127 @@
 import numpy as np
 
+# Number of Bookshelf orientations: 4 rotations, each optionally mirrored
+NUM_ORIENTATIONS = 8
+
+
+def orientation_index(rotation, flip):
+    """
+    Get the orientation table index of rotations that are multiples of 90 degrees.
+    Indices 0-3 are N/W/S/E and 4-7 their mirrored FN/FE/FS/FW counterparts.
+    """
+    return (np.rint(np.asarray(rotation, dtype=float) / 90.0).astype(np.int64) % 4) + 4 * np.asarray(flip, dtype=np.int64)
+
+
+def orientation_offsets(offsets: np.ndarray) -> np.ndarray:
+    """
+    Precompute pin offsets in every orientation.
+    Rotations by multiples of 90 degrees only swap and negate coordinates, so the table is exact.
+    :param offsets: (k, 2) pin offsets of the unrotated macro.
+    :return: (k, 8, 2) offsets, indexed by pin and orientation_index.
+    """
+    x, y = offsets[:, 0], offsets[:, 1]
+    table = np.empty((len(offsets), NUM_ORIENTATIONS, 2), dtype=float)
+    for mirrored in (0, 1):
+        mx = -x if mirrored else x
+        table[:, 4 * mirrored + 0] = np.stack([mx, y], axis=-1)
+        table[:, 4 * mirrored + 1] = np.stack([-y, mx], axis=-1)
+        table[:, 4 * mirrored + 2] = np.stack([-mx, -y], axis=-1)
+        table[:, 4 * mirrored + 3] = np.stack([y, -mx], axis=-1)
+    return table
+
+
+# Legacy port type letter of every pin direction code (PIN_IN, PIN_OUT, PIN_EXTERNAL)
+PORT_TYPES = ("I", "O", "E")
+
+
 class Macro:
-    def __init__(self, name: str, width: float, height: float, rotation: float = 0.0, fixed: bool = False):
+    __slots__ = ("db", "idx")
+
+    def __init__(self, db, idx: int):
         """
-        Initialize a Macro object.
-        :param name: Name of the macro.
-        :param width: Width of the macro.
-        :param height: Height of the macro.
-        :param rotation: Rotation in degrees of the macro (default is "0").
-        :param fixed: Whether the macro is fixed (default is False).
+        View of one macro of a placement database.
+        Attributes and ports are read from and written to the shared arrays of the database, so a
+        macro holds no per-pin state. Ports are numbered in the order the .nets file lists the
+        pins of the macro, and the port dicts are built on access.
+        :param db: PlacementDB holding the macro.
+        :param idx: Macro id in the database.
         """
-        self.name = name
-        self.dim = np.array([width, height], dtype=float)
-        self.rotation = rotation
-        self.fixed = fixed
+        self.db = db
+        self.idx = idx
+
+    @property
+    def name(self) -> str:
+        return str(self.db.names[self.idx])
+
+    @property
+    def dim(self) -> np.ndarray:
+        return self.db.dim[self.idx]
+
+    @property
+    def com(self) -> np.ndarray:
+        return self.db.com[self.idx]
+
+    @property
+    def pos(self) -> np.ndarray:
+        """Position of the macro in the layout - top-left corner."""
+        return self.db.pos[self.idx]
 
-        # Position of the macro in the layout - top-left corner
-        self.pos = np.array([0.0, 0.0], dtype=float)
-        self.com = self.dim / 2.0
+    @property
+    def rotation(self) -> float:
+        return float(self.db.rotation[self.idx])
 
-        # Ports ports
-        self.port_idx = 0
-        self.in_ports: dict[int:dict] = {} 
-        self.out_ports: dict[int:dict] = {}
-        self.external_ports: dict[int:dict] = {} 
-        self.pos2idx: dict[tuple[float, float]:int] = {}
+    @property
+    def fixed(self) -> bool:
+        return bool(self.db.fixed[self.idx])
 
+    @property
+    def flip(self) -> bool:
+        return bool(self.db.flip[self.idx])
+
+    @property
+    def port_idx(self) -> int:
+        """Number of ports of the macro."""
+        return int(self.db.macro_pin_ptr[self.idx + 1] - self.db.macro_pin_ptr[self.idx])
+
+    def _pins(self) -> np.ndarray:
+        """Pin ids of the ports, indexed by port index."""
+        ptr = self.db.macro_pin_ptr
+        return self.db.macro_pins[ptr[self.idx]:ptr[self.idx + 1]]
+
+    def _ports(self, port_type: str) -> dict[int, dict]:
+        """Build the port dicts of one port type, keyed by port index."""
+        return {idx: self.get_port(idx) for idx, pin in enumerate(self._pins().tolist())
+                if PORT_TYPES[self.db.pin_type[pin]] == port_type}
+
+    @property
+    def in_ports(self) -> dict[int, dict]:
+        return self._ports("I")
+
+    @property
+    def out_ports(self) -> dict[int, dict]:
+        return self._ports("O")
+
+    @property
+    def external_ports(self) -> dict[int, dict]:
+        return self._ports("E")
+
+    @property
+    def pos2idx(self) -> dict[tuple[float, float], int]:
+        return {tuple(r): idx for idx, r in enumerate(self.db.pin_offset[self._pins()].tolist())}
 
     def set_position(self, x: float, y: float):
         """Set the position of the macro in the layout."""
-        self.pos = np.array([x, y], dtype=float)
+        self.db.pos[self.idx] = (x, y)
 
 
     def set_rotation(self, rotation: float):
         """Set the rotation of the macro."""
-        self.rotation = rotation
+        self.db.rotation[self.idx] = float(rotation)
 
 
-    def _add_port(self, ports: dict, net_name: str, x_loc: float, y_loc: float, port_type: str):
-        r = np.array([x_loc, y_loc], dtype=float)
-        port_dict = {
-            "net": net_name,
-            "r": r,
-            "type": port_type
-        }
-        ports[self.port_idx] = port_dict
-        self.pos2idx[(x_loc, y_loc)] = self.port_idx
-        self.port_idx += 1
-        return self.port_idx - 1
-
-    
-    def add_in_port(self, net_name: str, x_loc: float, y_loc: float):
-        """Add an input port to the macro."""
-        if net_name in self.in_ports:
-            raise ValueError(f"Input port for net '{net_name}' already exists.")
-        
-        return self._add_port(self.in_ports, net_name, x_loc, y_loc, "I")
-
-
-    def add_out_port(self, net_name: str, x_loc: float, y_loc: float):
-        """Add an output port to the macro."""
-        if net_name in self.out_ports:
-            raise ValueError(f"Output port for net '{net_name}' already exists.")
-        
-        return self._add_port(self.out_ports, net_name, x_loc, y_loc, "O")
-    
-
-    def add_external_port(self, net_name: str, x_loc: float, y_loc: float):
-        """Add an external port to the macro."""
-        if net_name in self.external_ports:
-            raise ValueError(f"External port for net '{net_name}' already exists.")
-        
-        return self._add_port(self.external_ports, net_name, x_loc, y_loc, "E")
+    def set_flip(self, flip: bool):
+        """Set whether the macro is mirrored."""
+        self.db.flip[self.idx] = flip
 
 
     def get_position(self) -> np.ndarray:
@@ -91,29 +141,31 @@ class Macro:
             return np.array([self.dim[1], self.dim[0]], dtype=float)
     
 
-    def get_in_ports(self) -> dict[tuple[float, float], str]:
+    def get_in_ports(self) -> dict[int, dict]:
         """Get the input ports of the macro."""
         return self.in_ports
     
-    def get_out_ports(self) -> dict[tuple[float, float], str]:
+    def get_out_ports(self) -> dict[int, dict]:
         """Get the output ports of the macro."""
         return self.out_ports
     
 
-    def get_external_ports(self) -> dict[tuple[float, float], str]:
+    def get_external_ports(self) -> dict[int, dict]:
         """Get the external ports of the macro."""
         return self.external_ports
     
 
-    def get_port(self, idx: int):
-        if idx in self.in_ports:
-            return self.in_ports[idx]
-        elif idx in self.out_ports:
-            return self.out_ports[idx]
-        elif idx in self.external_ports:
-            return self.external_ports[idx]
-        else:
+    def _pin(self, idx: int) -> int:
+        """Get the pin id of a port index."""
+        if not 0 <= idx < self.port_idx:
             raise ValueError(f"Port index {idx} does not exist in macro '{self.name}'.")
+        return int(self.db.macro_pins[self.db.macro_pin_ptr[self.idx] + idx])
+
+    def get_port(self, idx: int):
+        db = self.db
+        pin = self._pin(idx)
+        return {"net": str(db.net_names[db.pin_net[pin]]), "r": db.pin_offset[pin].copy(),
+                "type": PORT_TYPES[db.pin_type[pin]]}
     
     def get_port_type(self, idx: int) -> str:
         """
@@ -121,21 +173,34 @@ class Macro:
         :param idx: Index of the port.
         :return: Type of the port as a string.
         """
-        if idx in self.in_ports:
-            return "I"
-        elif idx in self.out_ports:
-            return "O"
-        elif idx in self.external_ports:
-            return "E"
-        else:
-            raise ValueError(f"Port index {idx} does not exist in macro '{self.name}'.")
+        return PORT_TYPES[self.db.pin_type[self._pin(idx)]]
 
-    def get_port_with_pos(self, pos: tuple[float, float]):
-        if pos in self.pos2idx:
-            idx = self.pos2idx[pos]
-            return self.get_port(idx)
-        else:
+    def _port_with_pos(self, pos: tuple[float, float]) -> int:
+        """Get the index of the last port at an offset."""
+        offsets = self.db.pin_offset[self._pins()]
+        match = np.flatnonzero((offsets[:, 0] == pos[0]) & (offsets[:, 1] == pos[1]))
+        if len(match) == 0:
             raise ValueError(f"Position {pos} does not exist in macro '{self.name}'.")
+        return int(match[-1])
+
+    def get_port_with_pos(self, pos: tuple[float, float]):
+        return self.get_port(self._port_with_pos(pos))
+
+
+    def get_port_r_table(self) -> np.ndarray:
+        """
+        Get the offsets of every port in each orientation.
+        :return: (k, 8, 2) offsets indexed by port index and orientation index.
+        """
+        return self.db.pin_offset_table[self._pins()]
+
+
+    def _orientation_index(self):
+        """Get the orientation table index of the macro, or None if it is not rotated by a multiple of 90 degrees."""
+        rotation = self.rotation
+        if rotation % 90 != 0:
+            return None
+        return int(orientation_index(rotation, self.flip))
 
 
     def compute_port_r(self, idx: int) -> np.ndarray:
@@ -144,19 +209,22 @@ class Macro:
         :param idx: Index of the port.
         :return: Torque r vector of the port in the macro
         """
-        if idx not in self.in_ports and idx not in self.out_ports and idx not in self.external_ports:
-            raise ValueError(f"Port index {idx} does not exist in macro '{self.name}'.")
+        pin = self._pin(idx)
 
-        port = self.get_port(idx)
-        r_vec = port["r"]
+        # Rotations by multiples of 90 degrees are a lookup in the offset table of the database
+        orient = self._orientation_index()
+        if orient is not None:
+            return self.db.pin_offset_table[pin, orient]
+
+        r_vec = self.db.pin_offset[pin]
+        if self.flip:
+            r_vec = np.array([-r_vec[0], r_vec[1]], dtype=float)
 
         # Apply rotation if the macro is rotated
-        if self.rotation != 0:
-            angle_rad = np.radians(self.rotation)
-            rotation_matrix = np.array([[np.cos(angle_rad), -np.sin(angle_rad)],
-                                        [np.sin(angle_rad), np.cos(angle_rad)]])
-            r_vec = rotation_matrix @ r_vec
-        return r_vec
+        angle_rad = np.radians(self.rotation)
+        rotation_matrix = np.array([[np.cos(angle_rad), -np.sin(angle_rad)],
+                                    [np.sin(angle_rad), np.cos(angle_rad)]])
+        return rotation_matrix @ r_vec
     
     
     def compute_port_r_with_pos(self, pos: tuple[float, float]) -> np.ndarray:
@@ -165,11 +233,7 @@ class Macro:
         :param pos: Position of the port.
         :return: Torque r vector of the port in the macro
         """
-        idx = self.pos2idx.get(pos)
-        if idx is None:
-            raise ValueError(f"Position {pos} does not exist in macro '{self.name}'.")
-        
-        return self.compute_port_r(idx)
+        return self.compute_port_r(self._port_with_pos(pos))
     
 
     def compute_port_loc(self, idx: int) -> np.ndarray:
@@ -178,9 +242,6 @@ class Macro:
         :param idx: Index of the port.
         :return: Location vector of the port in the layout
         """
-        if idx not in self.in_ports and idx not in self.out_ports and idx not in self.external_ports:
-            raise ValueError(f"Port index {idx} does not exist in macro '{self.name}'.")
-
         r_vec = self.compute_port_r(idx)
         return self.pos - self.com + r_vec
     
@@ -190,8 +251,24 @@ class Macro:
         :param pos: Position of the port.
         :return: Location vector of the port in the layout
         """
-        idx = self.pos2idx.get(pos)
-        if idx is None:
-            raise ValueError(f"Position {pos} does not exist in macro '{self.name}'.")
+        return self.compute_port_loc(self._port_with_pos(pos))
 
-        return self.compute_port_loc(idx)
\ No newline at end of file
+
+    def compute_port_locs(self, idxs: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the locations of many ports in the layout coordinate system at once.
+        :param idxs: Indices of the ports, defaults to all ports.
+        :return: (k, 2) location vectors of the ports in the layout
+        """
+        if idxs is None:
+            idxs = np.arange(self.port_idx)
+        idxs = np.asarray(idxs, dtype=np.int64)
+        if np.any((idxs < 0) | (idxs >= self.port_idx)):
+            raise ValueError(f"Port index out of range in macro '{self.name}'.")
+
+        orient = self._orientation_index()
+        if orient is not None:
+            r_vec = self.db.pin_offset_table[self._pins()[idxs], orient]
+        else:
+            r_vec = np.array([self.compute_port_r(int(idx)) for idx in idxs], dtype=float).reshape(-1, 2)
+        return self.pos - self.com + r_vec
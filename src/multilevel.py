@@ -0,0 +1,324 @@
+import time
+
+import numpy as np
+import scipy.sparse
+
+from annealer import MoveAnnealer, TemperatureSchedule
+from hpwl import expand_ranges
+from net_model import NetModel
+from placement_db import PlacementDB
+from sa_engine import SAEngine
+from telemetry import Telemetry
+
+# Clusters are rigid, so coarse levels only shift and swap them
+CLUSTER_MOVE_PROBS = {"shift": 0.8, "swap": 0.2, "rotate": 0.0, "flip": 0.0}
+
+
+def _movable_mask(db: PlacementDB, movable: np.ndarray = None) -> np.ndarray:
+    """Flag the movable macros, every macro that is not fixed by default."""
+    if movable is None:
+        return ~db.fixed
+    is_movable = np.zeros(db.num_macros, dtype=bool)
+    is_movable[movable] = True
+    return is_movable
+
+
+def connectivity(db: PlacementDB, max_degree: int = 16, movable: np.ndarray = None) -> scipy.sparse.csr_matrix:
+    """
+    Build the clique-model connectivity between movable macros.
+    Every net of degree d contributes 1 / (d - 1) to each pair of its macros, nets larger than
+    max_degree are ignored.
+    :param db: Placement database.
+    :param max_degree: Largest net degree considered.
+    :param movable: Ids of the movable macros, defaults to every macro that is not fixed.
+    :return: (N, N) symmetric connection weights.
+    """
+    n = db.num_macros
+    nets = np.flatnonzero((db.net_degree >= 2) & (db.net_degree <= max_degree))
+    degrees = db.net_degree[nets]
+    pins = expand_ranges(db.net_ptr[nets], degrees)
+
+    # Pair every pin with every pin of its net
+    pin_degree = np.repeat(degrees, degrees)
+    src = np.repeat(pins, pin_degree)
+    dst = expand_ranges(np.repeat(db.net_ptr[nets], degrees), pin_degree)
+    weight = np.repeat(1.0 / (pin_degree - 1), pin_degree)
+
+    is_movable = _movable_mask(db, movable)
+    u = db.pin_macro[src]
+    v = db.pin_macro[dst]
+    keep = (u != v) & is_movable[u] & is_movable[v]
+    return scipy.sparse.csr_matrix((weight[keep], (u[keep], v[keep])), shape=(n, n))
+
+
+def match(db: PlacementDB, adjacency: scipy.sparse.csr_matrix, max_area: float, rounds: int = 3) -> np.ndarray:
+    """
+    Pair macros by mutual heavy-edge matching.
+    Each round, every unmatched macro picks the neighbor with the highest connection weight per
+    combined area, and macros that pick each other are paired.
+    :param db: Placement database.
+    :param adjacency: Connection weights from connectivity().
+    :param max_area: Largest area of a pair.
+    :param rounds: Number of matching rounds.
+    :return: (N,) partner of every macro, -1 if unmatched.
+    """
+    n = db.num_macros
+    area = db.dim[:, 0] * db.dim[:, 1]
+    partner = np.full(n, -1, dtype=np.int64)
+    coo = adjacency.tocoo()
+    for _ in range(rounds):
+        free = partner < 0
+        area_sum = area[coo.row] + area[coo.col]
+        keep = free[coo.row] & free[coo.col] & (area_sum <= max_area)
+        if not keep.any():
+            break
+        score = scipy.sparse.csr_matrix((coo.data[keep] / np.maximum(area_sum[keep], 1e-12),
+                                         (coo.row[keep], coo.col[keep])), shape=(n, n))
+        best = np.asarray(score.argmax(axis=1)).ravel()
+        valid = score.max(axis=1).toarray().ravel() > 0
+        ids = np.arange(n)
+        mutual = valid & valid[best] & (best[best] == ids) & (ids < best)
+        if not mutual.any():
+            break
+        partner[ids[mutual]] = best[mutual]
+        partner[best[mutual]] = ids[mutual]
+    return partner
+
+
+def coarsen(db: PlacementDB, max_degree: int = 16, max_area: float = np.inf,
+            movable: np.ndarray = None) -> tuple[PlacementDB, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge matched pairs of macros into rigid clusters.
+    A cluster abuts its two macros side by side or stacked, whichever is closer to square, so
+    uncoarsening places the macros exactly without overlap. Pin offsets are carried over so that
+    pins keep their location, and nets inside a single cluster are dropped. Macros outside the
+    movable set stay single-macro clusters at their positions.
+    :param db: Placement database of the fine level.
+    :param max_degree: Largest net degree used for clustering.
+    :param max_area: Largest area of a cluster.
+    :param movable: Ids of the movable macros, defaults to every macro that is not fixed.
+    :return: Tuple of the coarse placement database, the (N,) cluster of every fine macro, the
+             (N, 2) offset of every fine macro's position from its cluster's position and the fine
+             net of every coarse net.
+    """
+    n = db.num_macros
+    partner = match(db, connectivity(db, max_degree, movable), max_area)
+
+    # Clusters are numbered by their lowest member
+    leader = np.where(partner >= 0, np.minimum(np.arange(n), partner), np.arange(n))
+    leaders, cluster = np.unique(leader, return_inverse=True)
+    num_clusters = len(leaders)
+
+    dim = db.compute_dimensions()
+    pairs = np.flatnonzero((partner >= 0) & (np.arange(n) < partner))
+    first, second = pairs, partner[pairs]
+
+    # Abut the pairs along the side that keeps the cluster closest to square
+    cluster_dim = dim[leaders].copy()
+    slot = np.zeros((n, 2), dtype=float)
+    width_h = dim[first, 0] + dim[second, 0]
+    height_h = np.maximum(dim[first, 1], dim[second, 1])
+    width_v = np.maximum(dim[first, 0], dim[second, 0])
+    height_v = dim[first, 1] + dim[second, 1]
+    aspect_h = np.maximum(width_h, height_h) / np.maximum(np.minimum(width_h, height_h), 1e-12)
+    aspect_v = np.maximum(width_v, height_v) / np.maximum(np.minimum(width_v, height_v), 1e-12)
+    horizontal = aspect_h <= aspect_v
+    pair_cluster = cluster[first]
+    cluster_dim[pair_cluster, 0] = np.where(horizontal, width_h, width_v)
+    cluster_dim[pair_cluster, 1] = np.where(horizontal, height_h, height_v)
+    slot[second, 0] = np.where(horizontal, dim[first, 0], 0.0)
+    slot[second, 1] = np.where(horizontal, 0.0, -dim[first, 1])
+
+    # Place every cluster at the area-weighted center of its macros
+    area = dim[:, 0] * dim[:, 1]
+    center = db.pos + np.stack([dim[:, 0], -dim[:, 1]], axis=1) / 2.0
+    weight = np.maximum(area, 1e-12)
+    cluster_weight = np.bincount(cluster, weights=weight, minlength=num_clusters)
+    cluster_center = np.stack([np.bincount(cluster, weights=weight * center[:, k], minlength=num_clusters)
+                               for k in range(2)], axis=1) / cluster_weight[:, None]
+    cluster_pos = cluster_center + np.stack([-cluster_dim[:, 0], cluster_dim[:, 1]], axis=1) / 2.0
+    fixed = db.fixed[leaders]
+    static = ~_movable_mask(db, movable)[leaders]
+    cluster_pos[static] = db.pos[leaders[static]]
+
+    # Keep the nets spanning several clusters, with pin offsets relative to the cluster
+    pin_cluster = cluster[db.pin_macro]
+    nets = np.flatnonzero(db.net_degree > 0)
+    starts = db.net_ptr[nets]
+    spans = np.minimum.reduceat(pin_cluster, starts) != np.maximum.reduceat(pin_cluster, starts) \
+        if len(nets) else np.zeros(0, dtype=bool)
+    nets = nets[spans]
+    pins = expand_ranges(db.net_ptr[nets], db.net_degree[nets])
+    net_ptr = np.zeros(len(nets) + 1, dtype=np.int64)
+    np.cumsum(db.net_degree[nets], out=net_ptr[1:])
+
+    pin_macro = db.pin_macro[pins]
+    pin_offset = (slot[pin_macro] - db.com[pin_macro] + db.compute_port_r(pins=pins) +
+                  cluster_dim[cluster[pin_macro]] / 2.0)
+
+    names = np.asarray(db.names)[leaders]
+    net_names = np.asarray(db.net_names)[nets]
+    coarse = PlacementDB(names, cluster_dim, fixed, cluster_pos, cluster[pin_macro], pin_offset,
+                         db.pin_type[pins], net_names, net_ptr)
+    return coarse, cluster, slot, nets
+
+
+def coarsen_net_model(net_model: NetModel, coarse: PlacementDB, nets: np.ndarray) -> NetModel:
+    """
+    Model the nets of a coarse level like the nets of its fine level.
+    Coarse nets keep all pins of their fine nets, so the degree thresholds select the same nets.
+    :param net_model: Net model of the fine level.
+    :param coarse: Placement database of the coarse level.
+    :param nets: Fine net of every coarse net, from coarsen().
+    :return: Net model of the coarse level.
+    """
+    return NetModel(coarse, net_model.clique_degree, net_model.prune_degree, net_model.net_weight[nets])
+
+
+def uncoarsen(fine: PlacementDB, coarse: PlacementDB, cluster: np.ndarray, slot: np.ndarray,
+              movable: np.ndarray = None):
+    """Place the movable macros of the fine level at their slots in the coarse clusters."""
+    movable = _movable_mask(fine, movable)
+    fine.pos[movable] = coarse.pos[cluster[movable]] + slot[movable]
+
+
+def multilevel_place(db: PlacementDB, x_range: tuple[float, float], y_range: tuple[float, float],
+                     coarsest_size: int = 1000, max_degree: int = 16, method: str = "moves",
+                     schedule: TemperatureSchedule = None, refine_temps: int = 20, refine_moves: int = 20,
+                     refine_budget: int = 50000, seed: int = None, init: str = None,
+                     overlap_model: str = "pairwise", telemetry: Telemetry = None, net_model: NetModel = None,
+                     movable: np.ndarray = None) -> PlacementDB:
+    """
+    Place a design by coarsening it into clusters, annealing the coarsest level and refining each level.
+    :param db: Placement database, updated in place.
+    :param x_range: Horizontal extent of the layout.
+    :param y_range: Vertical extent of the layout.
+    :param coarsest_size: Stop coarsening at this many clusters.
+    :param max_degree: Largest net degree used for clustering.
+    :param method: Optimizer of the coarsest level, see SAEngine.run. Clusters are rigid and keep their
+                   orientation, so a design that is coarsened must use "moves", which does not rotate them.
+    :param schedule: Temperature schedule of the coarsest level.
+    :param refine_temps: Number of temperatures of each refinement.
+    :param refine_moves: Moves per macro of each refinement.
+    :param refine_budget: Largest number of moves of each refinement, which bounds the refinement time of
+                          large designs.
+    :param seed: Random seed.
+    :param init: Initial placement of the coarsest level, see SAEngine.run.
+    :param overlap_model: Overlap term, see MoveAnnealer.
+    :param telemetry: Progress trace shared by all levels.
+    :param net_model: Dataflow edges of the nets and their weights, reproduced on every coarse level,
+                      defaults to every (output pin, input pin) pair of a net on different macros.
+    :param movable: Ids of the macros to place, defaults to every macro that is not fixed, see
+                    PlacementDB.movable_macros. The other macros keep their positions on every level.
+    :return: The placement database.
+    """
+    layout_area = (x_range[1] - x_range[0]) * (y_range[1] - y_range[0])
+
+    # Coarsen until the design is small enough or stops shrinking
+    levels = []
+    current = db
+    current_model = NetModel(db) if net_model is None else net_model
+    current_movable = movable
+    num_movable = np.count_nonzero(_movable_mask(db, movable))
+    while num_movable > coarsest_size:
+        start = time.perf_counter()
+        coarse, cluster, slot, nets = coarsen(current, max_degree, 0.05 * layout_area, current_movable)
+        # Macros outside the movable set stay single-macro clusters, so movable clusters only hold movable macros
+        coarse_movable = None if movable is None else np.unique(cluster[current_movable])
+        coarse_num_movable = np.count_nonzero(_movable_mask(coarse, coarse_movable))
+        if coarse_num_movable > 0.95 * num_movable:
+            break
+        levels.append((current, current_model, current_movable, coarse, cluster, slot))
+        current = coarse
+        current_model = coarsen_net_model(current_model, coarse, nets)
+        current_movable = coarse_movable
+        num_movable = coarse_num_movable
+        print(f"Level {len(levels)}: {coarse.num_macros} clusters, {coarse.num_nets} nets, "
+              f"{coarse.num_pins} pins in {time.perf_counter() - start:.2f} s")
+
+    if levels and method != "moves":
+        raise ValueError(f"Invalid method '{method}' for a coarsened design. Expected 'moves', which keeps the "
+                         f"orientation of the clusters.")
+
+    # Anneal the coarsest level
+    start = time.perf_counter()
+    engine = SAEngine(current, x_range, y_range, overlap_model=overlap_model, telemetry=telemetry,
+                      movable=current_movable, net_model=current_model)
+    engine.run(method, schedule, seed, move_probs=CLUSTER_MOVE_PROBS if levels else None, init=init)
+    engine.update_macro_positions()
+    print(f"Placed {current.num_macros} macros at level {len(levels)} in {time.perf_counter() - start:.2f} s")
+
+    # Uncoarsen and refine with short, local annealing runs
+    rng = np.random.default_rng(seed)
+    for depth in range(len(levels) - 1, -1, -1):
+        start = time.perf_counter()
+        fine, fine_model, fine_movable, coarse, cluster, slot = levels[depth]
+        uncoarsen(fine, coarse, cluster, slot, fine_movable)
+
+        annealer = MoveAnnealer(fine, x_range, y_range, move_probs=CLUSTER_MOVE_PROBS if depth else None,
+                                seed=int(rng.integers(1 << 31)), overlap_model=overlap_model,
+                                telemetry=engine.telemetry, movable=fine_movable, net_model=fine_model)
+        refine_schedule = TemperatureSchedule(
+            t_start=annealer.estimate_t_start(accept_prob=0.3, window=0.02),
+            num_temps=refine_temps,
+            moves_per_temp=max(100, min(refine_moves * len(annealer.movable), refine_budget) // refine_temps),
+            window=0.02,
+        )
+        annealer.run(refine_schedule)
+        fine.pos = annealer.best_pos
+        fine.rotation[:] = annealer.best_rotation
+        fine.flip[:] = annealer.best_flip
+        print(f"Refined {fine.num_macros} macros at level {depth}, cost {annealer.best_cost} "
+              f"in {time.perf_counter() - start:.2f} s")
+    return db
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from bench_parser import find_design_files, is_lfs_pointer
+    from design_cache import load_design_cached
+    from dfg import DataFlowGraph
+    from hpwl import HPWLEngine
+    from overlap import compute_overflow, compute_overlap
+
+    arg_parser = argparse.ArgumentParser(description="Multilevel placement runtime and QoR across benchmarks.")
+    arg_parser.add_argument("benches", nargs="+", help="Benchmark directories, smallest first")
+    arg_parser.add_argument("--coarsest-size", type=int, default=1000, help="Number of clusters of the coarsest level")
+    arg_parser.add_argument("--temps", type=int, default=100, help="Number of temperatures of the coarsest level")
+    arg_parser.add_argument("--moves-per-temp", type=int, default=1000,
+                            help="Moves per temperature of the coarsest level")
+    arg_parser.add_argument("--refine-budget", type=int, default=50000,
+                            help="Largest number of moves of the refinement of every level")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    arg_parser.add_argument("--clique-degree", type=int, default=64,
+                            help="Largest net degree modeled as a clique, larger nets are stars, see NetModel")
+    args = arg_parser.parse_args()
+
+    rows = []
+    for bench in args.benches:
+        node_file, pl_file, net_file = find_design_files(bench)
+        scl_files = [os.path.join(bench, f) for f in os.listdir(bench) if f.endswith(".scl")]
+        if any(f is None or is_lfs_pointer(f) for f in (node_file, pl_file, net_file)) or not scl_files:
+            print(f"{bench}: design files missing or git-lfs pointers, skipped")
+            continue
+        db, (x_max, y_max) = load_design_cached(node_file, pl_file, net_file, scl_files[0])
+
+        start = time.perf_counter()
+        net_model = NetModel(db, args.clique_degree)
+        multilevel_place(db, (0.0, x_max), (0.0, y_max), args.coarsest_size,
+                         schedule=TemperatureSchedule(num_temps=args.temps, moves_per_temp=args.moves_per_temp),
+                         refine_budget=args.refine_budget, seed=args.seed, net_model=net_model)
+        runtime = time.perf_counter() - start
+
+        rects = db.compute_rects()
+        rows.append((os.path.basename(os.path.normpath(bench)), db.num_macros, db.num_pins, runtime,
+                     HPWLEngine(db).compute(), DataFlowGraph(db, net_model).longest_path(), compute_overlap(rects),
+                     compute_overflow(rects, (0.0, 0.0, x_max, y_max))))
+
+    print(f"{'bench':<16} {'macros':>9} {'pins':>9} {'time (s)':>9} {'HPWL':>14} {'energy':>14} "
+          f"{'overlap':>12} {'overflow':>12}")
+    for name, macros, pins, runtime, hpwl, energy, overlap, overflow in rows:
+        print(f"{name:<16} {macros:>9} {pins:>9} {runtime:>9.2f} {hpwl:>14.6g} {energy:>14.6g} "
+              f"{overlap:>12.6g} {overflow:>12.6g}")
@@ -0,0 +1,153 @@
+import multiprocessing
+
+import numpy as np
+
+from annealer import TemperatureSchedule
+from net_model import NetModel
+from placement_db import PlacementDB
+from sa_engine import SAEngine
+from shared_design import SharedDesign, attach_design
+from telemetry import Telemetry
+
+# Design and run options of a pool worker process, set once by _init_worker
+_worker = {}
+
+
+def chain_seeds(seed: int, num_chains: int) -> list[int]:
+    """
+    Derive independent, reproducible seeds for every chain from one base seed.
+    :param seed: Base seed.
+    :param num_chains: Number of chains.
+    :return: Seed of every chain.
+    """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(num_chains)]
+
+
+def _init_worker(design: dict, stop_event, options: dict):
+    # The parent process published the design in shared memory, so this only attaches to it
+    db, layout = attach_design(design)
+    _worker.update(
+        db=db,
+        layout=layout,
+        net_model=NetModel(db, options["clique_degree"], options["prune_degree"], options["net_weight"]),
+        initial=(db.pos.copy(), db.rotation.copy(), db.flip.copy()),
+        stop_event=stop_event,
+        options=options,
+    )
+
+
+def _run_chain(args: tuple[int, int]) -> dict:
+    chain, seed = args
+    db = _worker["db"]
+    stop_event = _worker["stop_event"]
+    options = _worker["options"]
+    result = {"chain": chain, "seed": seed, "best_cost": float("inf"), "trajectory": [], "stopped": False}
+    if stop_event.is_set():
+        result["stopped"] = True
+        return result
+
+    # Every chain starts from the design's placement, also when a worker runs several chains
+    pos, rotation, flip = _worker["initial"]
+    db.pos = pos.copy()
+    db.rotation[:] = rotation
+    db.flip[:] = flip
+
+    target_cost = options["target_cost"]
+    trajectory = result["trajectory"]
+
+    def callback(cost):
+        trajectory.append(float(cost))
+        if target_cost is not None and cost <= target_cost:
+            stop_event.set()
+        return stop_event.is_set()
+
+    # Chains only write their own trace, the parent reports their results
+    trace = options["trace"]
+    telemetry = Telemetry(None if trace is None else f"{trace}.chain{chain}", options["trace_every"], quiet=True)
+
+    x_max, y_max = _worker["layout"]
+    engine = SAEngine(db, (0.0, x_max), (0.0, y_max), options["orient_method"], options["orient_flips"],
+                      options["overlap_model"], telemetry, options["movable"], _worker["net_model"])
+    with telemetry:
+        engine.run(options["method"], options["schedule"], seed, callback, init=options["init"])
+    engine.update_macro_positions()
+
+    result.update(
+        best_cost=engine.best_cost,
+        stopped=stop_event.is_set(),
+        pos=db.pos.copy(),
+        rotation=db.rotation.copy(),
+        flip=db.flip.copy(),
+    )
+    return result
+
+
+def run_multistart(db: PlacementDB, layout: tuple[float, float], num_chains: int,
+                   processes: int = None, seed: int = 0, target_cost: float = None,
+                   method: str = "dual_annealing", schedule: TemperatureSchedule = None,
+                   orient_method: str = "newton", orient_flips: bool = False,
+                   init: str = None, overlap_model: str = "pairwise", trace: str = None,
+                   trace_every: int = 1, movable: np.ndarray = None, clique_degree: int = None,
+                   prune_degree: int = None, net_weight: np.ndarray = None) -> tuple[dict, list[dict]]:
+    """
+    Run independent annealing chains in a process pool and keep the best placement.
+    :param db: Placement database, published to the workers and not modified.
+    :param layout: Width and height of the layout.
+    :param num_chains: Number of chains.
+    :param processes: Number of worker processes, defaults to the number of CPUs.
+    :param seed: Base seed the chain seeds are derived from.
+    :param target_cost: Stop every chain once one of them reaches this cost.
+    :param method: Optimizer of every chain, see SAEngine.run.
+    :param schedule: Temperature schedule of the move-based annealer.
+    :param orient_method: Orientation solver, see OrientEngine.
+    :param orient_flips: Whether the discrete orientation search considers mirrored orientations.
+    :param init: Initial placement of every chain, see SAEngine.run.
+    :param overlap_model: Overlap term, see SAEngine.
+    :param trace: JSONL trace file name, every chain writes to this name with a .chain<k> suffix.
+    :param trace_every: Write every trace_every-th record to the traces.
+    :param movable: Ids of the macros every chain optimizes, see SAEngine.
+    :param clique_degree: Largest net degree modeled as a clique, see NetModel.
+    :param prune_degree: Largest net degree kept, see NetModel.
+    :param net_weight: (M,) weight of every net, see NetModel.
+    :return: Tuple of the best chain result and the results of all chains ordered by chain. A result
+             holds the chain, its seed, best cost, cost trajectory, whether it was stopped early, and
+             the pos, rotation and flip arrays of its placement.
+    """
+    if num_chains < 1:
+        raise ValueError(f"Invalid number of chains: {num_chains}. Expected at least 1.")
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, num_chains))
+    options = {
+        "target_cost": target_cost,
+        "method": method,
+        "schedule": schedule,
+        "orient_method": orient_method,
+        "orient_flips": orient_flips,
+        "init": init,
+        "overlap_model": overlap_model,
+        "trace": trace,
+        "trace_every": trace_every,
+        "movable": movable,
+        "clique_degree": clique_degree,
+        "prune_degree": prune_degree,
+        "net_weight": net_weight,
+    }
+
+    ctx = multiprocessing.get_context()
+    stop_event = ctx.Event()
+    seeds = chain_seeds(seed, num_chains)
+    results = []
+    # Publish the loaded design to the workers
+    with SharedDesign(db, layout) as design, \
+            ctx.Pool(processes, initializer=_init_worker, initargs=(design.handle, stop_event, options)) as pool:
+        for result in pool.imap_unordered(_run_chain, list(enumerate(seeds))):
+            print(f"Chain {result['chain']} (seed {result['seed']}) finished with best cost {result['best_cost']}"
+                  f"{' (stopped early)' if result['stopped'] else ''}")
+            results.append(result)
+
+    results.sort(key=lambda result: result["chain"])
+    best = min((result for result in results if "pos" in result), key=lambda result: result["best_cost"])
+    print(f"Best chain: {best['chain']} with cost {best['best_cost']}")
+    return best, results
@@ -1,44 +1,59 @@
-from macro import Macro
+from macro import Macro, PORT_TYPES
 
 class Net:
-    def __init__(self, name: str):
+    __slots__ = ("db", "idx", "macros")
+
+    def __init__(self, db, idx: int, macros: list[Macro]):
         """
-        Initialize a Net object.
-        :param name: Name of the net.
+        View of one net of a placement database.
+        The pins of the net are read from the shared arrays of the database on access.
+        :param db: PlacementDB holding the net.
+        :param idx: Net id in the database.
+        :param macros: Macro views of the database indexed by macro id, shared by every net.
         """
-        self.name = name
-        self.degree = 0
-        self.in_nodes: list[tuple[Macro, int]] = []
-        self.out_nodes: list[tuple[Macro, int]] = []
-        self.external_nodes: list[tuple[Macro, int]] = []
-
-    def add_in_macro(self, macro: Macro, idx: int):
-        """Add an input port to the net."""
-        self.in_nodes.append((macro, idx))
-        self.degree += 1
-    
-    def add_out_macro(self, macro: Macro, idx: int):
-        """Add an output port to the net."""
-        self.out_nodes.append((macro, idx))
-        self.degree += 1
-
-    def add_external_macro(self, macro: Macro, idx: int):
-        """Add an external port to the net."""
-        self.external_nodes.append((macro, idx))
-        self.degree += 1
-    
-    def get_in_macro(self) -> list[Macro]:
+        self.db = db
+        self.idx = idx
+        self.macros = macros
+
+    @property
+    def name(self) -> str:
+        return str(self.db.net_names[self.idx])
+
+    @property
+    def degree(self) -> int:
+        return int(self.db.net_degree[self.idx])
+
+    def _nodes(self, port_type: str) -> list[tuple[Macro, int]]:
+        """Build the (macro, port index) pairs of the pins of one port type, in .nets file order."""
+        db = self.db
+        pins = range(db.net_ptr[self.idx], db.net_ptr[self.idx + 1])
+        return [(self.macros[db.pin_macro[pin]], int(db.pin_port[pin])) for pin in pins
+                if PORT_TYPES[db.pin_type[pin]] == port_type]
+
+    @property
+    def in_nodes(self) -> list[tuple[Macro, int]]:
+        return self._nodes("I")
+
+    @property
+    def out_nodes(self) -> list[tuple[Macro, int]]:
+        return self._nodes("O")
+
+    @property
+    def external_nodes(self) -> list[tuple[Macro, int]]:
+        return self._nodes("E")
+
+    def get_in_macro(self) -> list[tuple[Macro, int]]:
         """Get the input ports of the net."""
         return self.in_nodes
     
-    def get_out_macro(self) -> list[Macro]:
+    def get_out_macro(self) -> list[tuple[Macro, int]]:
         """Get the output ports of the net."""
         return self.out_nodes
     
-    def get_external_macro(self) -> list[Macro]:
+    def get_external_macro(self) -> list[tuple[Macro, int]]:
         """Get the external ports of the net."""
         return self.external_nodes
 
     def get_degree(self) -> int:
         """Get the degree of the net."""
-        return self.degree
\ No newline at end of file
+        return self.degree
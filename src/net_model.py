@@ -0,0 +1,160 @@
+import numpy as np
+
+from hpwl import expand_ranges
+from placement_db import PlacementDB, PIN_IN, PIN_OUT
+
+
+class NetModel:
+    def __init__(self, db: PlacementDB, clique_degree: int = None, prune_degree: int = None,
+                 net_weight: np.ndarray = None):
+        """
+        Dataflow connectivity of the nets, reduced for high-fanout nets.
+        A net of at most clique_degree pins is a clique of (output pin, input pin) edges between
+        different macros. A larger net is a star, whose output pins drive a virtual node at the
+        centroid of its input and output pins, which drives its input pins, so that it has one edge
+        per pin instead of one per pin pair. Nets above prune_degree, such as clock and reset nets,
+        are dropped. Edge ends are terminals: terminal t < P is pin t and terminal P + k is star k.
+        :param db: Placement database.
+        :param clique_degree: Largest net degree modeled as a clique, defaults to modeling every net as a clique.
+        :param prune_degree: Largest net degree kept, defaults to keeping every net.
+        :param net_weight: (M,) weight of every net, such as from a .wts file, defaults to 1.
+        """
+        if clique_degree is not None and clique_degree < 1:
+            raise ValueError(f"Invalid clique degree {clique_degree}. Expected at least 1.")
+        self.db = db
+        self.clique_degree = clique_degree
+        self.prune_degree = prune_degree
+        self.net_weight = np.ones(db.num_nets) if net_weight is None else np.asarray(net_weight, dtype=float)
+        if len(self.net_weight) != db.num_nets:
+            raise ValueError(f"Invalid net weights of {len(self.net_weight)} nets. Expected {db.num_nets}.")
+
+        kept = db.net_degree <= (prune_degree if prune_degree is not None else np.inf)
+        is_clique = db.net_degree <= (clique_degree if clique_degree is not None else np.inf)
+        clique_nets = np.flatnonzero(kept & is_clique)
+        self.star_nets = np.flatnonzero(kept & ~is_clique)
+
+        # Star members are the input and output pins of the star nets, grouped by star
+        pins = expand_ranges(db.net_ptr[self.star_nets], db.net_degree[self.star_nets])
+        self.star_pins = pins[(db.pin_type[pins] == PIN_IN) | (db.pin_type[pins] == PIN_OUT)]
+        self.member_star = np.searchsorted(self.star_nets, db.pin_net[self.star_pins])
+        self.star_ptr = np.zeros(len(self.star_nets) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.member_star, minlength=len(self.star_nets)), out=self.star_ptr[1:])
+
+        # Clique edges, then every star's output edges into its centroid and input edges out of it
+        src, dst = db.dataflow_pairs(clique_nets if len(clique_nets) < db.num_nets else None)
+        star_term = db.num_pins + self.member_star
+        is_out = db.pin_type[self.star_pins] == PIN_OUT
+        self.src = np.concatenate([src, self.star_pins[is_out], star_term[~is_out]])
+        self.dst = np.concatenate([dst, star_term[is_out], self.star_pins[~is_out]])
+        edge_net = np.concatenate([db.pin_net[src], db.pin_net[self.star_pins[is_out]],
+                                   db.pin_net[self.star_pins[~is_out]]])
+        self.weight = self.net_weight[edge_net]
+        self.num_nodes = db.num_macros + self.num_stars
+
+        # Edges by the macros they depend on, built on first use
+        self._node_edge_ptr = None
+        self._node_edges = None
+        self._macro_star_ptr = None
+        self._macro_stars = None
+
+    @staticmethod
+    def _csr(keys: np.ndarray, values: np.ndarray, num_keys: int) -> tuple[np.ndarray, np.ndarray]:
+        """Group values by key as CSR offsets and values."""
+        order = np.argsort(keys, kind="stable")
+        ptr = np.zeros(num_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=num_keys), out=ptr[1:])
+        return ptr, values[order]
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.src)
+
+    @property
+    def num_stars(self) -> int:
+        return len(self.star_nets)
+
+    def terminal_node(self, terminals: np.ndarray) -> np.ndarray:
+        """Map terminals to graph nodes, pins to their macro and star k to node N + k."""
+        num_pins = self.db.num_pins
+        pins = np.minimum(terminals, max(num_pins - 1, 0))
+        return np.where(terminals < num_pins, self.db.pin_macro[pins], self.db.num_macros + terminals - num_pins)
+
+    def node_mask(self, macro_mask: np.ndarray) -> np.ndarray:
+        """Extend a (N,) macro mask to the graph nodes, a star is set when any of its member macros is."""
+        star_mask = np.bincount(self.member_star, weights=macro_mask[self.db.pin_macro[self.star_pins]],
+                                minlength=self.num_stars) > 0
+        return np.concatenate([macro_mask, star_mask])
+
+    def star_centroids(self, member_loc: np.ndarray, stars: np.ndarray = None) -> np.ndarray:
+        """
+        Average the member pin locations of stars.
+        :param member_loc: Locations of the member pins of the stars, grouped by star as in star_pins.
+        :param stars: Stars of the members, defaults to all stars.
+        :return: (len(stars), 2) centroids.
+        """
+        counts = np.diff(self.star_ptr) if stars is None else self.star_ptr[stars + 1] - self.star_ptr[stars]
+        if len(counts) == 0:
+            return np.zeros((0, 2), dtype=float)
+        starts = np.cumsum(counts) - counts
+        return np.add.reduceat(member_loc, starts, axis=0) / counts[:, None]
+
+    def terminal_loc(self, terminals: np.ndarray, pos: np.ndarray = None, rotation: np.ndarray = None,
+                     flip: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the locations of terminals, star centroids from the locations of their members.
+        :param terminals: Terminal ids.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :return: (len(terminals), 2) locations.
+        """
+        num_pins = self.db.num_pins
+        loc = np.empty((len(terminals), 2), dtype=float)
+        is_pin = terminals < num_pins
+        loc[is_pin] = self.db.compute_port_loc(pos, rotation, flip, terminals[is_pin])
+        if not is_pin.all():
+            stars, inverse = np.unique(terminals[~is_pin] - num_pins, return_inverse=True)
+            members = self.star_pins[expand_ranges(self.star_ptr[stars], self.star_ptr[stars + 1] - self.star_ptr[stars])]
+            centroids = self.star_centroids(self.db.compute_port_loc(pos, rotation, flip, members), stars)
+            loc[~is_pin] = centroids[inverse]
+        return loc
+
+    def edge_energy(self, pos: np.ndarray = None, rotation: np.ndarray = None, flip: np.ndarray = None,
+                    edges: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the weighted energy (squared distance) of edges.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :param edges: Edges to compute, defaults to all edges.
+        :return: (E,) edge energies, or one per edge in edges.
+        """
+        if edges is None:
+            edges = np.arange(self.num_edges)
+        loc = self.terminal_loc(np.concatenate([self.src[edges], self.dst[edges]]), pos, rotation, flip)
+        delta = loc[len(edges):] - loc[:len(edges)]
+        return self.weight[edges] * np.sum(delta ** 2, axis=1)
+
+    def _build_dependencies(self):
+        """Group the edges by their end nodes and the stars by their member macros."""
+        edge_ids = np.arange(self.num_edges, dtype=np.int64)
+        nodes = np.concatenate([self.terminal_node(self.src), self.terminal_node(self.dst)])
+        self._node_edge_ptr, self._node_edges = self._csr(nodes, np.concatenate([edge_ids, edge_ids]), self.num_nodes)
+        self._macro_star_ptr, self._macro_stars = self._csr(self.db.pin_macro[self.star_pins], self.member_star,
+                                                            self.db.num_macros)
+
+    def dependent_edges(self, macros: np.ndarray) -> np.ndarray:
+        """
+        Find the edges whose energy changes when some macros move: the edges of their pins and
+        every edge of the stars their pins belong to.
+        :param macros: Macro ids.
+        :return: Sorted edge ids.
+        """
+        if self._node_edges is None:
+            self._build_dependencies()
+        macros = np.atleast_1d(macros)
+        starts = self._macro_star_ptr[macros]
+        stars = self._macro_stars[expand_ranges(starts, self._macro_star_ptr[macros + 1] - starts)]
+        nodes = np.concatenate([macros, self.db.num_macros + stars])
+        starts = self._node_edge_ptr[nodes]
+        return np.unique(self._node_edges[expand_ranges(starts, self._node_edge_ptr[nodes + 1] - starts)])
@@ -1,158 +1,272 @@
 import scipy
 import numpy as np
 import scipy.optimize
-from tqdm import tqdm
+import scipy.sparse
+import scipy.sparse.linalg
 
-from macro import Macro
-from net import Net
+from hpwl import expand_ranges
+from macro import orientation_index
+from net_model import NetModel
+from placement_db import PlacementDB, ORIENTATIONS
 
 class OrientEngine():
-    def __init__(self, macros: dict[str:Macro], nets: dict[str:Net]):
-        self.macros = macros
-        self.nets = nets
-        self.macro2index = {name: i for i, name in enumerate(macros.keys())}
-        self.index2macro = {i: name for i, name in enumerate(macros.keys())}
-
-        self.rot_vec = np.array([0.0 for _ in range(len(macros))])
-        
-    def run(self):
+    def __init__(self, db: PlacementDB, method: str = "newton", max_iter: int = 50, f_tol: float = 1.0,
+                 max_direct: int = 1000, flips: bool = False, passes: int = 3, movable: np.ndarray = None,
+                 net_model: NetModel = None):
+        """
+        Orientation solver balancing the torque dataflow forces apply to every macro.
+        :param db: Placement database.
+        :param method: "newton" for sparse Newton steps with the analytic Jacobian, "broyden2", or
+                       "discrete" to pick among the legal Bookshelf orientations directly.
+        :param max_iter: Maximum number of iterations.
+        :param f_tol: Tolerance on the largest absolute torque.
+        :param max_direct: Largest number of macros for which Newton steps use a sparse LU solve,
+                           larger designs use Jacobi-preconditioned GMRES.
+        :param flips: Whether the discrete method also considers the mirrored orientations.
+        :param passes: Number of coordinate descent passes of the discrete method.
+        :param movable: Ids of the macros to orient, defaults to every macro that is not fixed. Only
+                        their pins feel torque, the other macros keep their orientation.
+        :param net_model: Edges of the nets and their weights, defaults to every (output pin, input pin)
+                          pair of a net on different macros. A pin on a star net is pulled towards the
+                          centroid of the net, which is held constant in the Jacobian.
+        """
+        if method not in ("newton", "broyden2", "discrete"):
+            raise ValueError(f"Invalid method '{method}'. Expected 'newton', 'broyden2' or 'discrete'.")
+        self.db = db
+        self.method = method
+        self.max_iter = max_iter
+        self.f_tol = f_tol
+        self.max_direct = max_direct
+        self.passes = passes
+
+        # Candidate (rotation, flip) pairs of the discrete method
+        self.candidates = [orient for orient in ORIENTATIONS.values() if flips or not orient[1]]
+
+        if movable is None:
+            self.movable = ~db.fixed
+        else:
+            self.movable = np.zeros(db.num_macros, dtype=bool)
+            self.movable[movable] = True
+        self.active = np.flatnonzero(self.movable)
 
-        def f(x):
-            tau_vec = np.zeros(len(self.macros))
+        # Movable macros start unrotated, the others keep their orientation
+        self.rot_vec = np.where(self.movable, 0.0, db.rotation)
+        self.flip_vec = np.array(db.flip, dtype=bool)
 
+        # Every input (output) pin of a movable macro paired with each terminal it has an edge to,
+        # an output (input) pin of another macro or a star centroid. Only these apply force to the pin.
+        net_model = NetModel(db) if net_model is None else net_model
+        self.net_model = net_model
+        pin = np.concatenate([net_model.src, net_model.dst])
+        connected = np.concatenate([net_model.dst, net_model.src])
+        weight = np.concatenate([net_model.weight, net_model.weight])
+        keep = pin < db.num_pins
+        keep[keep] = self.movable[db.pin_macro[pin[keep]]]
+        self.pin = pin[keep]
+        self.weight = weight[keep]
+        self.macro = db.pin_macro[self.pin]
+        connected = connected[keep]
+        self.to_pin = np.flatnonzero(connected < db.num_pins)
+        self.to_star = np.flatnonzero(connected >= db.num_pins)
+        self.connected_pin = connected[self.to_pin]
+        self.connected_macro = db.pin_macro[self.connected_pin]
 
-            # Set the rotation for each macro
-            for idx, m_name in self.index2macro.items():
-                macro: Macro = self.macros[m_name]
+        # Stars of the pairs and the pins their centroids average
+        self.stars, self.star_index = np.unique(connected[self.to_star] - db.num_pins, return_inverse=True)
+        starts = net_model.star_ptr[self.stars]
+        member_pins = net_model.star_pins[expand_ranges(starts, net_model.star_ptr[self.stars + 1] - starts)]
 
-                # Update macro rotation
-                rot_deg = x[idx]
-                macro.set_rotation(rot_deg)
+        # Pins of the pairs, every one rotated once per evaluation
+        self.lever_pins, inverse = np.unique(np.concatenate([self.pin, self.connected_pin, member_pins]),
+                                             return_inverse=True)
+        self.pin_index = inverse[:len(self.pin)]
+        self.connected_index = inverse[len(self.pin):len(self.pin) + len(self.connected_pin)]
+        self.member_index = inverse[len(self.pin) + len(self.connected_pin):]
 
-            # Compute torque balance for each macro
-            # for idx, m_name in tqdm(self.index2macro.items(), desc="Computing torque", total=len(self.index2macro)):
-            for idx, m_name in self.index2macro.items():
+    def _lever(self, x: np.ndarray, flip: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Compute the rotated offset of every pin and the vector g from its macro to the connected terminal.
+        The force on a pin is g - r, and r x (g - r) = r x g.
+        """
+        db = self.db
+        r_vec = db.compute_port_r(x, flip, self.lever_pins)
+        anchor = db.pos - db.com
+        r = r_vec[self.pin_index]
+        g = np.empty_like(r)
+        g[self.to_pin] = (anchor[self.connected_macro] - anchor[self.macro[self.to_pin]] +
+                          r_vec[self.connected_index])
+        if len(self.to_star):
+            member_loc = anchor[db.pin_macro[self.lever_pins[self.member_index]]] + r_vec[self.member_index]
+            centroid = self.net_model.star_centroids(member_loc, self.stars)
+            g[self.to_star] = centroid[self.star_index] - anchor[self.macro[self.to_star]]
+        return r, g
 
-                macro: Macro = self.macros[m_name]
+    def torque(self, x: np.ndarray) -> np.ndarray:
+        """
+        Compute the weighted torque on every macro for the candidate rotations.
+        :param x: (N,) rotations in degrees.
+        :return: (N,) torques.
+        """
+        r, g = self._lever(x)
+        tau = self.weight * (r[:, 0] * g[:, 1] - r[:, 1] * g[:, 0])
+        return np.bincount(self.macro, weights=tau, minlength=self.db.num_macros)
 
-                tau = np.zeros(3)
+    def jacobian(self, x: np.ndarray) -> scipy.sparse.csr_matrix:
+        """
+        Compute the sparse Jacobian of the torques with respect to the rotations in degrees.
+        Rotating a pin offset r by dθ moves it by (-r_y, r_x) dθ, so
+        dτ_m/dθ_m = -Σ r_p · g and dτ_m/dθ_k = Σ r_p · r_q over pins q of macro k, each term
+        weighted by its edge. Star centroids are treated as constant.
+        :param x: (N,) rotations in degrees.
+        :return: (N, N) Jacobian.
+        """
+        n = self.db.num_macros
+        k = np.pi / 180.0
+        r, g = self._lever(x)
+        r_q = self.db.compute_port_r(x, pins=self.connected_pin)
+        diag = -k * self.weight * np.sum(r * g, axis=1)
+        off_diag = k * self.weight[self.to_pin] * np.sum(r[self.to_pin] * r_q, axis=1)
+        rows = np.concatenate([self.macro, self.macro[self.to_pin]])
+        cols = np.concatenate([self.macro, self.connected_macro])
+        return scipy.sparse.csr_matrix((np.concatenate([diag, off_diag]), (rows, cols)), shape=(n, n))
 
-                ports = {}
-                ports.update(macro.get_in_ports())
-                ports.update(macro.get_out_ports())
+    def _newton_step(self, jac: scipy.sparse.csr_matrix, tau: np.ndarray) -> np.ndarray:
+        """
+        Solve jac @ step = -tau, directly for small designs and iteratively for large ones.
+        Only the movable macros are solved for, the rows of the others are zero and their step is 0.
+        """
+        active = self.active
+        n = len(active)
+        # Macros without connections have all-zero rows, regularize them
+        damping = 1e-9 * max(abs(jac).max(), 1.0)
+        jac = jac[active][:, active] + damping * scipy.sparse.identity(n, format="csr")
+        step = np.zeros(self.db.num_macros)
+        if n <= self.max_direct:
+            step[active] = scipy.sparse.linalg.spsolve(jac.tocsc(), -tau[active])
+            return step
 
-                # For each port, iterate over all the ports
-                for port_idx, port in ports.items():
-                    r_vec = macro.compute_port_r(port_idx)
-                    r_vec = np.concatenate([r_vec, [0.0]])  # Add z-component
+        diag = jac.diagonal()
+        diag = np.where(np.abs(diag) > damping, diag, damping)
+        preconditioner = scipy.sparse.linalg.LinearOperator((n, n), matvec=lambda v: v / diag)
+        step[active], _ = scipy.sparse.linalg.gmres(jac, -tau[active], M=preconditioner, rtol=1e-3, maxiter=50)
+        return step
+
+    def _newton(self, x: np.ndarray) -> np.ndarray:
+        """Solve torque(x) = 0 with damped sparse Newton steps and a backtracking line search."""
+        tau = self.torque(x)
+        norm = np.linalg.norm(tau)
+        for _ in range(self.max_iter):
+            if np.max(np.abs(tau), initial=0.0) < self.f_tol:
+                break
+            step = self._newton_step(self.jacobian(x), tau)
+            if not np.all(np.isfinite(step)):
+                break
+
+            # Halve the step until the torque norm decreases
+            alpha = 1.0
+            for _ in range(10):
+                x_new = x + alpha * step
+                tau_new = self.torque(x_new)
+                norm_new = np.linalg.norm(tau_new)
+                if norm_new < norm:
+                    break
+                alpha *= 0.5
+            else:
+                break
+            x, tau, norm = x_new, tau_new, norm_new
+        return x
 
-                    macro_loc = macro.compute_port_loc(port_idx)
-                    net: Net = self.nets[port["net"]]
+    def _discrete(self, x: np.ndarray, flip: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pick the orientation of every movable macro among the candidates by coordinate descent.
+        Each pass scores every candidate of every macro at once by the squared distance from its pins
+        to their connected pins, with the other macros held in place, and moves all macros to their
+        best candidate. The best pass by total squared distance is kept.
+        """
+        db = self.db
+        n = db.num_macros
+        movable = self.movable[self.macro]
+        candidates = orientation_index(*np.array(self.candidates, dtype=float).T)
 
-                    port_type = port["type"]
-                    if port_type == "I":
-                        connected_ports = net.get_out_macro()
-                    elif port_type == "O":
-                        connected_ports = net.get_in_macro()
-                    
-                    # For each port, all nodes in the net applies some force to the port,
-                    # inducing some amount of torque. Only force from other macros is considered.
-                    for connected_macro, connected_port_idx in connected_ports:
-                        if connected_macro.name == macro.name:
-                            continue
+        weight = self.weight[movable]
 
-                        connected_macro_loc = connected_macro.compute_port_loc(connected_port_idx)
-                        f_vec = connected_macro_loc - macro_loc
+        def energy(x, flip):
+            r, g = self._lever(x, flip)
+            return np.sum(self.weight * np.sum((g - r) ** 2, axis=1))
 
-                        f_vec = np.concatenate([f_vec, [0.0]])  # Add z-component
+        best = (energy(x, flip), x, flip)
+        for _ in range(self.passes):
+            r, g = self._lever(x, flip)
+            current = np.bincount(self.macro[movable], weights=weight * np.sum((g - r)[movable] ** 2, axis=1),
+                                  minlength=n)
+            scores = np.empty((len(self.candidates), n))
+            for k, orient in enumerate(candidates):
+                r = db.pin_offset_table[self.pin, orient]
+                scores[k] = np.bincount(self.macro[movable], weights=weight * np.sum((g - r)[movable] ** 2, axis=1),
+                                        minlength=n)
 
-                        tau += np.cross(r_vec, f_vec)
-                        
-                tau_vec[idx] = tau[-1]
+            # Only switch macros whose best candidate beats their current orientation
+            choice = np.argmin(scores, axis=0)
+            rotation = np.array([c[0] for c in self.candidates])[choice]
+            mirrored = np.array([c[1] for c in self.candidates])[choice]
+            improved = (scores[choice, np.arange(n)] < current * (1.0 - 1e-12)) & self.movable
+            x = np.where(improved, rotation, x)
+            flip = np.where(improved, mirrored, flip)
 
-            # print("Torque vector:", tau_vec)
-            return tau_vec
-        
-        
-        # res = scipy.optimize.newton(f, self.rot_vec, full_output=True, tol=10, )
+            e = energy(x, flip)
+            if e < best[0]:
+                best = (e, x, flip)
+        return best[1], best[2]
+
+    def run(self):
+        if self.db.num_macros == 0:
+            return
+        if self.method == "discrete":
+            self.rot_vec, self.flip_vec = self._discrete(self.rot_vec % 360.0, self.flip_vec)
+            return
         try:
-            res = scipy.optimize.broyden2(f, self.rot_vec, iter=200, f_tol=1)
-            # res = scipy.optimize.newton(f, self.rot_vec)
-            # res = scipy.optimize.fsolve(f, self.rot_vec, xtol=1, maxfev=100)
+            if self.method == "newton":
+                res = self._newton(self.rot_vec.copy())
+            else:
+                res = scipy.optimize.broyden2(self.torque, self.rot_vec, iter=200, f_tol=self.f_tol)
             self.rot_vec = res
-            print("Optimization result:", res)
         except Exception as e:
             print(f"Error during optimization: {e}")
     
     def update_macro_rotation(self):
-        for idx, angle in enumerate(self.rot_vec):
-            macro_name = self.index2macro[idx]
-            macro: Macro = self.macros[macro_name]
-
-            angle = angle % 360.0
-            # Find the closest angle in [0, 90, 180, 270]
-            if angle < 45:
-                angle = 0
-            elif angle < 135:
-                angle = 90
-            elif angle < 225:
-                angle = 180
-            elif angle < 315:
-                angle = 270
-            else:
-                angle = 0
-
-            macro.set_rotation(angle)
-            self.rot_vec[idx] = angle
+        # Snap the movable macros to the closest angle in [0, 90, 180, 270]
+        angle = np.floor((self.rot_vec[self.movable] % 360.0 + 45.0) / 90.0) % 4 * 90.0
+        self.db.rotation[self.movable] = angle
+        self.rot_vec[self.movable] = angle
+        if self.method == "discrete":
+            self.db.flip[:] = self.flip_vec
 
 
 
 if __name__ == "__main__":
-    import os
-    from parser import parse_nodes, parse_pl, parse_nets
-
-    # bench = "/home/peizhi/Documents/2025_Spring_Classes/DFMP/test/simple"
-    # bench = "/home/peizhi/Documents/2025_Spring_Classes/DFMP/bench/adaptec1"
-    bench = "/home/peizhi/Documents/2025_Spring_Classes/DFMP/bench/adaptec1_500"
-    node_file = None
-    pl_file = None
-    net_file = None
-    for file in os.listdir(bench):
-        if file.endswith(".nodes"):
-            node_file = os.path.join(bench, file)
-        elif file.endswith(".pl"):
-            pl_file = os.path.join(bench, file)
-        elif file.endswith(".nets"):
-            net_file = os.path.join(bench, file)
-
-    if not node_file:
-        print(f"No .node file found in {bench}")
-        exit(1)
-    
-    # Parse the nodes from the .node file
-    # print(f"Parsing nodes from {node_file}")
-    macros = parse_nodes(node_file)
-    print(f"Parsed {len(macros)} macros from {node_file}")
-    # print(macros)
-    
-    if not pl_file:
-        print(f"No .pl file found in {bench}, skipping placement.")
-        exit(1)
-    
-    # Parse the placement from the .pl file
-    parse_pl(pl_file, macros)
-    
-    if not net_file:
-        print(f"No .nets file found: {net_file}.")
+    import argparse
+
+    from bench_parser import find_design_files
+    from fast_parser import load_design
+
+    arg_parser = argparse.ArgumentParser(description="Orient the macros of a benchmark by balancing dataflow torques.")
+    arg_parser.add_argument("benchmark_directory", help="Directory holding the .nodes/.nets/.pl files")
+    arg_parser.add_argument("--method", choices=["newton", "broyden2", "discrete"], default="newton",
+                            help="Orientation solver: continuous torque balance or discrete orientation search")
+    arg_parser.add_argument("--flips", action="store_true",
+                            help="Let the discrete orientation search also pick mirrored orientations")
+    arg_parser.add_argument("--clique-degree", type=int, default=64,
+                            help="Largest net degree modeled as a clique, larger nets are stars, see NetModel")
+    args = arg_parser.parse_args()
+
+    node_file, pl_file, net_file = find_design_files(args.benchmark_directory)
+    if node_file is None or pl_file is None or net_file is None:
+        print(f"Missing .nodes, .pl or .nets file in {args.benchmark_directory}")
         exit(1)
-    
-    # Parse the nets from the .nets file
-    nets = parse_nets(net_file, macros)
-    # print(nets)
-    print(f"Parsed {len(nets)} nets from {net_file}")
-
-    # Create the orient engine
-    orient_engine = OrientEngine(macros, nets)
-    # Run the orient engine
+    db = load_design(node_file, pl_file, net_file)
+    print(f"Loaded {db.num_macros} macros and {db.num_nets} nets from {args.benchmark_directory}")
+
+    orient_engine = OrientEngine(db, method=args.method, flips=args.flips,
+                                 net_model=NetModel(db, args.clique_degree))
     orient_engine.run()
-    print("Rotation vector:", orient_engine.rot_vec)
\ No newline at end of file
+    print("Rotation vector:", orient_engine.rot_vec)
@@ -0,0 +1,177 @@
+import math
+
+import numpy as np
+
+
+def overlap_pairs(rects: np.ndarray, max_pairs: int = 1 << 22):
+    """
+    Find every pair of rectangles whose x-extents intersect with a sort-and-sweep.
+    Rectangles are sorted by their left edge, and each one is paired with the following
+    rectangles whose left edge is not beyond its right edge.
+    :param rects: (N, 4) array of [x_low, y_low, x_high, y_high].
+    :param max_pairs: Maximum number of candidate pairs generated at once.
+    :return: Generator of (i, j) index arrays of candidate pairs, i != j and each pair once.
+    """
+    n = len(rects)
+    if n < 2:
+        return
+
+    order = np.argsort(rects[:, 0], kind="stable")
+    x_low = rects[order, 0]
+    x_high = rects[order, 2]
+
+    # Sorted rectangles [k + 1, end[k]) start before rectangle k ends
+    end = np.searchsorted(x_low, x_high, side="right")
+    counts = np.maximum(end - np.arange(1, n + 1), 0)
+
+    # Emit the candidate pairs in chunks to bound memory
+    cum = np.cumsum(counts)
+    start = 0
+    while start < n:
+        base = cum[start - 1] if start > 0 else 0
+        stop = int(np.searchsorted(cum, base + max_pairs, side="right"))
+        stop = min(max(stop, start + 1), n)
+        chunk_counts = counts[start:stop]
+        total = int(chunk_counts.sum())
+        if total > 0:
+            first = np.repeat(np.arange(start, stop), chunk_counts)
+            range_ptr = np.cumsum(chunk_counts) - chunk_counts
+            second = first + 1 + (np.arange(total) - np.repeat(range_ptr, chunk_counts))
+            yield order[first], order[second]
+        start = stop
+
+
+def intersection_area(rects_a: np.ndarray, rects_b: np.ndarray) -> np.ndarray:
+    """
+    Compute the intersection areas of pairs of rectangles.
+    :param rects_a: (..., 4) array of [x_low, y_low, x_high, y_high].
+    :param rects_b: (..., 4) array of [x_low, y_low, x_high, y_high].
+    :return: (...) intersection areas, 0 where the rectangles are disjoint.
+    """
+    width = np.minimum(rects_a[..., 2], rects_b[..., 2]) - np.maximum(rects_a[..., 0], rects_b[..., 0])
+    height = np.minimum(rects_a[..., 3], rects_b[..., 3]) - np.maximum(rects_a[..., 1], rects_b[..., 1])
+    return np.where((width >= 0) & (height >= 0), width * height, 0.0)
+
+
+def compute_overlap(rects: np.ndarray) -> float:
+    """
+    Compute the total pairwise overlap area of a set of rectangles.
+    :param rects: (N, 4) array of [x_low, y_low, x_high, y_high].
+    :return: Sum of the intersection areas over all pairs.
+    """
+    overlap = 0.0
+    for i, j in overlap_pairs(rects):
+        overlap += float(np.sum(intersection_area(rects[i], rects[j])))
+    return overlap
+
+
+def compute_overflow(rects: np.ndarray, layout: tuple[float, float, float, float]) -> float:
+    """
+    Compute the total area of the rectangles lying outside the layout.
+    :param rects: (N, 4) array of [x_low, y_low, x_high, y_high].
+    :param layout: Layout rectangle (x_low, y_low, x_high, y_high).
+    :return: Overflow area.
+    """
+    area = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+    inside = intersection_area(rects, np.asarray(layout, dtype=float))
+    return float(np.sum(area - inside))
+
+
+def compute_bbox_area(rects: np.ndarray) -> float:
+    """Compute the area of the bounding box of a set of rectangles."""
+    return float((rects[:, 2].max() - rects[:, 0].min()) * (rects[:, 3].max() - rects[:, 1].min()))
+
+
+class GridIndex:
+    def __init__(self, rects: np.ndarray, cell_size: float, ids: np.ndarray = None):
+        """
+        Uniform grid of rectangles for neighbor queries.
+        :param rects: (N, 4) array of [x_low, y_low, x_high, y_high], indexed by id.
+        :param cell_size: Width and height of a grid cell.
+        :param ids: Ids of the rectangles to insert, defaults to all of them.
+        """
+        self.cell_size = float(cell_size)
+        self.cells: dict[tuple[int, int], set[int]] = {}
+        if ids is None:
+            ids = range(len(rects))
+        for i in ids:
+            self.insert(int(i), rects[i])
+
+    def _cells(self, rect: np.ndarray):
+        size = self.cell_size
+        x0, y0 = math.floor(rect[0] / size), math.floor(rect[1] / size)
+        x1, y1 = math.floor(rect[2] / size), math.floor(rect[3] / size)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield (cx, cy)
+
+    def insert(self, i: int, rect: np.ndarray):
+        for cell in self._cells(rect):
+            self.cells.setdefault(cell, set()).add(i)
+
+    def remove(self, i: int, rect: np.ndarray):
+        for cell in self._cells(rect):
+            members = self.cells.get(cell)
+            if members is not None:
+                members.discard(i)
+                if not members:
+                    del self.cells[cell]
+
+    def move(self, i: int, old_rect: np.ndarray, new_rect: np.ndarray):
+        self.remove(i, old_rect)
+        self.insert(i, new_rect)
+
+    def query(self, rect: np.ndarray) -> np.ndarray:
+        """Get the ids of the rectangles sharing a grid cell with rect."""
+        found = set()
+        for cell in self._cells(rect):
+            members = self.cells.get(cell)
+            if members:
+                found.update(members)
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    arg_parser = argparse.ArgumentParser(description="Compare the sweep overlap engine against the pairwise loop.")
+    arg_parser.add_argument("benches", nargs="+", help="Benchmark directories")
+    arg_parser.add_argument("--max-reference", type=int, default=3000,
+                            help="Skip the O(n^2) reference loop above this many macros")
+    args = arg_parser.parse_args()
+
+    def overlapping_area(rec1, rec2):
+        """Scalar overlap area of two rectangles, the reference of compute_overlap."""
+        x1_overlap = max(rec1[0], rec2[0])
+        y1_overlap = max(rec1[1], rec2[1])
+        x2_overlap = min(rec1[2], rec2[2])
+        y2_overlap = min(rec1[3], rec2[3])
+        if x1_overlap > x2_overlap or y1_overlap > y2_overlap:
+            return 0
+        return (x2_overlap - x1_overlap) * (y2_overlap - y1_overlap)
+
+    from bench_parser import find_design_files, is_lfs_pointer
+    from fast_parser import load_design
+
+    for bench in args.benches:
+        node_file, pl_file, net_file = find_design_files(bench)
+        if any(f is None or is_lfs_pointer(f) for f in (node_file, pl_file, net_file)):
+            print(f"{bench}: design files missing or git-lfs pointers, skipped")
+            continue
+        db = load_design(node_file, pl_file, net_file)
+        rects = db.compute_rects()
+
+        start = time.perf_counter()
+        overlap = compute_overlap(rects)
+        sweep_time = time.perf_counter() - start
+        print(f"{bench}: {db.num_macros} macros, sweep overlap {overlap} in {sweep_time:.4f} s")
+
+        if db.num_macros <= args.max_reference:
+            start = time.perf_counter()
+            reference = 0.0
+            for i in range(len(rects)):
+                for j in range(i + 1, len(rects)):
+                    reference += overlapping_area(rects[i], rects[j])
+            reference_time = time.perf_counter() - start
+            print(f"  pairwise overlap {reference} in {reference_time:.4f} s ({reference_time / sweep_time:.0f}x)")
@@ -0,0 +1,355 @@
+import numpy as np
+
+from macro import Macro, orientation_index, orientation_offsets
+from net import Net
+
+# Pin direction codes used in PlacementDB.pin_type
+PIN_IN = 0
+PIN_OUT = 1
+PIN_EXTERNAL = 2
+
+PORT_TYPE_CODES = {"I": PIN_IN, "O": PIN_OUT, "E": PIN_EXTERNAL, "B": PIN_EXTERNAL}
+
+# Bookshelf orientations as (counter-clockwise rotation in degrees, flipped).
+# Flipped orientations mirror the macro about its vertical axis before rotating.
+ORIENTATIONS = {
+    "N": (0.0, False), "W": (90.0, False), "S": (180.0, False), "E": (270.0, False),
+    "FN": (0.0, True), "FE": (90.0, True), "FS": (180.0, True), "FW": (270.0, True),
+}
+ORIENT_NAMES = {value: name for name, value in ORIENTATIONS.items()}
+
+# Arrays of the netlist, never written after construction, including the derived lookup tables
+NETLIST_ARRAYS = ("names", "dim", "com", "fixed", "pin_macro", "pin_offset", "pin_type", "net_names", "net_ptr",
+                  "net_degree", "pin_net", "macro_pin_ptr", "macro_pins")
+# Arrays of the placement, which every optimizer updates
+PLACEMENT_ARRAYS = ("pos", "rotation", "flip")
+
+
+class PlacementDB:
+    def __init__(self, names: list[str], dim: np.ndarray, fixed: np.ndarray, pos: np.ndarray,
+                 pin_macro: np.ndarray, pin_offset: np.ndarray, pin_type: np.ndarray,
+                 net_names: list[str], net_ptr: np.ndarray, rotation: np.ndarray = None,
+                 flip: np.ndarray = None):
+        """
+        Structure-of-arrays view of a placement design.
+        :param names: Names of the macros, indexed by macro id.
+        :param dim: (N, 2) unrotated width and height of each macro.
+        :param fixed: (N,) whether each macro is fixed.
+        :param pos: (N, 2) position of each macro in the layout.
+        :param pin_macro: (P,) macro id owning each pin.
+        :param pin_offset: (P, 2) offset of each pin in its macro's coordinate system.
+        :param pin_type: (P,) direction code of each pin (PIN_IN, PIN_OUT or PIN_EXTERNAL).
+        :param net_names: Names of the nets, indexed by net id.
+        :param net_ptr: (M + 1,) CSR offsets, pins of net i are net_ptr[i]:net_ptr[i + 1].
+        :param rotation: (N,) rotation in degrees of each macro (default is 0).
+        :param flip: (N,) whether each macro is mirrored about its vertical axis (default is False).
+        """
+        self.names = names
+        self._name2idx = None
+        self.dim = np.ascontiguousarray(dim, dtype=float)
+        self.com = self.dim / 2.0
+        self.fixed = np.ascontiguousarray(fixed, dtype=bool)
+        self.pos = np.ascontiguousarray(pos, dtype=float)
+        if rotation is None:
+            rotation = np.zeros(len(names), dtype=float)
+        self.rotation = np.ascontiguousarray(rotation, dtype=float)
+        if flip is None:
+            flip = np.zeros(len(names), dtype=bool)
+        self.flip = np.ascontiguousarray(flip, dtype=bool)
+
+        self.set_netlist(pin_macro, pin_offset, pin_type, net_names, net_ptr)
+
+    def set_netlist(self, pin_macro: np.ndarray, pin_offset: np.ndarray, pin_type: np.ndarray,
+                    net_names: list[str], net_ptr: np.ndarray):
+        """Replace the pins and nets, see the constructor for the arrays."""
+        self.pin_macro = np.ascontiguousarray(pin_macro, dtype=np.int64)
+        self.pin_offset = np.ascontiguousarray(pin_offset, dtype=float)
+        self.pin_type = np.ascontiguousarray(pin_type, dtype=np.int8)
+
+        self.net_names = net_names
+        self.net_ptr = np.ascontiguousarray(net_ptr, dtype=np.int64)
+        self.net_degree = np.diff(self.net_ptr)
+        self.pin_net = np.repeat(np.arange(len(net_names), dtype=np.int64), self.net_degree)
+
+        # Lookup tables built on first use
+        self._pin_offset_table = None
+        self._macro_pin_ptr = None
+        self._macro_pins = None
+        self._pin_port = None
+
+    @property
+    def name2idx(self) -> dict[str, int]:
+        if self._name2idx is None:
+            self._name2idx = {name: i for i, name in enumerate(self.names)}
+        return self._name2idx
+
+    @property
+    def pin_offset_table(self) -> np.ndarray:
+        """(P, 8, 2) offset of every pin in each orientation, indexed by pin and orientation_index."""
+        if self._pin_offset_table is None:
+            self._pin_offset_table = orientation_offsets(self.pin_offset)
+        return self._pin_offset_table
+
+    @property
+    def macro_pin_ptr(self) -> np.ndarray:
+        """(N + 1,) CSR offsets into macro_pins."""
+        if self._macro_pin_ptr is None:
+            self._macro_pin_ptr = np.zeros(self.num_macros + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.pin_macro, minlength=self.num_macros), out=self._macro_pin_ptr[1:])
+        return self._macro_pin_ptr
+
+    @property
+    def macro_pins(self) -> np.ndarray:
+        """Pins grouped by macro, the pins of macro i are macro_pins[macro_pin_ptr[i]:macro_pin_ptr[i + 1]]."""
+        if self._macro_pins is None:
+            self._macro_pins = np.argsort(self.pin_macro, kind="stable")
+        return self._macro_pins
+
+    @property
+    def pin_port(self) -> np.ndarray:
+        """(P,) index of every pin among the pins of its macro, the port index of Macro."""
+        if self._pin_port is None:
+            self._pin_port = np.empty(self.num_pins, dtype=np.int64)
+            self._pin_port[self.macro_pins] = (np.arange(self.num_pins, dtype=np.int64) -
+                                               np.repeat(self.macro_pin_ptr[:-1], np.diff(self.macro_pin_ptr)))
+        return self._pin_port
+
+    @property
+    def num_macros(self) -> int:
+        return len(self.names)
+
+    @property
+    def num_nets(self) -> int:
+        return len(self.net_names)
+
+    @property
+    def num_pins(self) -> int:
+        return len(self.pin_macro)
+
+    @classmethod
+    def from_objects(cls, macros: dict[str, Macro], nets: dict[str, Net]) -> "PlacementDB":
+        """
+        Build the placement database from the output of parser.py.
+        :param macros: Dictionary of macros with their names as keys.
+        :param nets: Dictionary of nets with their names as keys.
+        :return: PlacementDB holding the same design.
+        """
+        names = list(macros.keys())
+        name2idx = {name: i for i, name in enumerate(names)}
+
+        dim = np.array([macro.dim for macro in macros.values()], dtype=float).reshape(-1, 2)
+        pos = np.array([macro.pos for macro in macros.values()], dtype=float).reshape(-1, 2)
+        fixed = np.array([macro.fixed for macro in macros.values()], dtype=bool)
+        rotation = np.array([float(macro.rotation) for macro in macros.values()], dtype=float)
+        flip = np.array([macro.flip for macro in macros.values()], dtype=bool)
+
+        pin_macro = []
+        pin_offset = []
+        pin_type = []
+        net_ptr = [0]
+        for net in nets.values():
+            for nodes in (net.get_in_macro(), net.get_out_macro(), net.get_external_macro()):
+                for macro, idx in nodes:
+                    port = macro.get_port(idx)
+                    pin_macro.append(name2idx[macro.name])
+                    pin_offset.append(port["r"])
+                    pin_type.append(PORT_TYPE_CODES[port["type"]])
+            net_ptr.append(len(pin_macro))
+
+        return cls(
+            names, dim, fixed, pos,
+            np.array(pin_macro, dtype=np.int64),
+            np.array(pin_offset, dtype=float).reshape(-1, 2),
+            np.array(pin_type, dtype=np.int8),
+            list(nets.keys()),
+            np.array(net_ptr, dtype=np.int64),
+            rotation, flip,
+        )
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """
+        Get the arrays of the database, see NETLIST_ARRAYS and PLACEMENT_ARRAYS.
+        :return: Dictionary of the arrays by attribute name, names as string arrays.
+        """
+        arrays = {name: getattr(self, name) for name in NETLIST_ARRAYS + PLACEMENT_ARRAYS}
+        arrays["names"] = np.asarray(self.names, dtype=str)
+        arrays["net_names"] = np.asarray(self.net_names, dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> "PlacementDB":
+        """
+        Rebuild a placement database from the arrays of to_arrays without copying or recomputing them.
+        :param arrays: Dictionary of the arrays by attribute name.
+        :return: PlacementDB using the given arrays.
+        """
+        db = cls.__new__(cls)
+        for name in NETLIST_ARRAYS + PLACEMENT_ARRAYS:
+            if name not in ("macro_pin_ptr", "macro_pins"):
+                setattr(db, name, arrays[name])
+        db._name2idx = None
+        db._pin_offset_table = None
+        db._macro_pin_ptr = arrays["macro_pin_ptr"]
+        db._macro_pins = arrays["macro_pins"]
+        db._pin_port = None
+        return db
+
+    def to_objects(self) -> tuple[dict[str, Macro], dict[str, Net]]:
+        """
+        Get Macro and Net views of the design, in the format of parser.py.
+        The views read and write the arrays of this database, no per-pin objects are created.
+        :return: Tuple of the dictionaries of macros and of nets with their names as keys.
+        """
+        macros = [Macro(self, i) for i in range(self.num_macros)]
+        nets = [Net(self, j, macros) for j in range(self.num_nets)]
+        return ({str(name): macro for name, macro in zip(self.names, macros)},
+                {str(name): net for name, net in zip(self.net_names, nets)})
+
+    def compute_dimensions(self, rotation: np.ndarray = None, macros: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the dimensions of every macro considering rotation.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param macros: Macros to compute, defaults to all macros.
+        :return: (N, 2) rotated width and height, or one row per macro in macros.
+        """
+        if rotation is None:
+            rotation = self.rotation
+        dim = self.dim
+        if macros is not None:
+            rotation = rotation[macros]
+            dim = dim[macros]
+        swap = (rotation % 180) != 0
+        return np.where(swap[:, None], dim[:, ::-1], dim)
+
+    def compute_rects(self, pos: np.ndarray = None, rotation: np.ndarray = None,
+                      macros: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the rectangle covered by every macro.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param macros: Macros to compute, defaults to all macros.
+        :return: (N, 4) array of [x_low, y_low, x_high, y_high], or one row per macro in macros.
+        """
+        if pos is None:
+            pos = self.pos
+        dim = self.compute_dimensions(rotation, macros)
+        if macros is not None:
+            pos = pos[macros]
+        return np.stack([pos[:, 0], pos[:, 1] - dim[:, 1], pos[:, 0] + dim[:, 0], pos[:, 1]], axis=1)
+
+    def movable_macros(self, row_height: float, macro_rows: float = 1.0) -> np.ndarray:
+        """
+        Find the movable macros, telling them apart from standard cells by their height.
+        :param row_height: Height of a placement row of the .scl file.
+        :param macro_rows: Movable nodes taller than this many rows are macros, shorter ones are standard cells.
+        :return: Ids of the movable macros.
+        """
+        return np.flatnonzero(~self.fixed & (self.dim[:, 1] > macro_rows * row_height))
+
+    def compute_port_r(self, rotation: np.ndarray = None, flip: np.ndarray = None, pins: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the torque r vector of every pin in its macro's coordinate system.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :param pins: Pins to compute, defaults to all pins.
+        :return: (P, 2) rotated pin offsets.
+        """
+        if rotation is None:
+            rotation = self.rotation
+        if flip is None:
+            flip = self.flip
+        # Rotations by multiples of 90 degrees are a lookup in the flattened (P * 8, 2) table
+        if pins is None:
+            if np.all(rotation % 90 == 0):
+                index = np.arange(0, 8 * self.num_pins, 8) + orientation_index(rotation, flip)[self.pin_macro]
+                return np.take(self.pin_offset_table.reshape(-1, 2), index, axis=0)
+            pins = slice(None)
+        pin_macro = self.pin_macro[pins]
+        pin_rotation = rotation[pin_macro]
+        if not isinstance(pins, slice):
+            quarter = pin_rotation / 90.0
+            quarter_int = quarter.astype(np.int64)
+            if np.array_equal(quarter, quarter_int):
+                index = 8 * pins + (quarter_int & 3) + 4 * flip[pin_macro]
+                return np.take(self.pin_offset_table.reshape(-1, 2), index, axis=0)
+
+        r = self.pin_offset[pins]
+        angle_rad = np.radians(pin_rotation)
+        cos = np.cos(angle_rad)
+        sin = np.sin(angle_rad)
+        r_x = np.where(flip[pin_macro], -r[:, 0], r[:, 0])
+        return np.stack([cos * r_x - sin * r[:, 1], sin * r_x + cos * r[:, 1]], axis=1)
+
+    def compute_port_loc(self, pos: np.ndarray = None, rotation: np.ndarray = None, flip: np.ndarray = None,
+                         pins: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the location of every pin in the layout coordinate system.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :param pins: Pins to compute, defaults to all pins.
+        :return: (P, 2) pin locations.
+        """
+        if pos is None:
+            pos = self.pos
+        pin_macro = self.pin_macro if pins is None else self.pin_macro[pins]
+        return pos[pin_macro] - self.com[pin_macro] + self.compute_port_r(rotation, flip, pins)
+
+    def compute_macro_pin_loc(self, macros: np.ndarray, pos: np.ndarray = None, rotation: np.ndarray = None,
+                              flip: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Compute the locations of all pins of many macros at once.
+        :param macros: Ids of the macros.
+        :param pos: (N, 2) positions, defaults to the stored positions.
+        :param rotation: (N,) rotation in degrees, defaults to the stored rotation.
+        :param flip: (N,) mirror flags, defaults to the stored flags.
+        :return: Tuple of the pins, grouped by macro in the order of macros, and their (k, 2) locations.
+        """
+        macros = np.atleast_1d(macros)
+        starts = self.macro_pin_ptr[macros]
+        counts = self.macro_pin_ptr[macros + 1] - starts
+        range_ptr = np.cumsum(counts) - counts
+        pins = self.macro_pins[np.repeat(starts - range_ptr, counts) + np.arange(int(counts.sum()), dtype=np.int64)]
+        return pins, self.compute_port_loc(pos, rotation, flip, pins)
+
+    def dataflow_pairs(self, nets: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Enumerate every (output pin, input pin) pair of each net whose pins belong to different macros.
+        Pairs are ordered by net, then output pin, then input pin.
+        :param nets: Nets to enumerate, defaults to all nets.
+        :return: Tuple of the (E,) source output pins and (E,) destination input pins.
+        """
+        in_pins = np.flatnonzero(self.pin_type == PIN_IN)
+        out_pins = np.flatnonzero(self.pin_type == PIN_OUT)
+        if nets is not None:
+            selected = np.zeros(self.num_nets, dtype=bool)
+            selected[nets] = True
+            in_pins = in_pins[selected[self.pin_net[in_pins]]]
+            out_pins = out_pins[selected[self.pin_net[out_pins]]]
+
+        # Pins are stored net by net, so the input pins of each net are contiguous
+        in_count = np.bincount(self.pin_net[in_pins], minlength=self.num_nets)
+        in_start = np.cumsum(in_count) - in_count
+
+        counts = in_count[self.pin_net[out_pins]]
+        src = np.repeat(out_pins, counts)
+        range_ptr = np.cumsum(counts) - counts
+        local = np.arange(len(src), dtype=np.int64) - np.repeat(range_ptr, counts)
+        dst = in_pins[np.repeat(in_start[self.pin_net[out_pins]], counts) + local]
+
+        keep = self.pin_macro[src] != self.pin_macro[dst]
+        return src[keep], dst[keep]
+
+    def update_macros(self, macros: dict[str, Macro]):
+        """Write the positions, rotations and flips back to the Macro objects."""
+        for idx, name in enumerate(self.names):
+            macro: Macro = macros[name]
+            macro.set_position(self.pos[idx, 0], self.pos[idx, 1])
+            macro.set_rotation(self.rotation[idx])
+            macro.set_flip(bool(self.flip[idx]))
+        return
+
+
+def orientation_name(rotation: float, flip: bool) -> str:
+    """Get the Bookshelf orientation name of a rotation in degrees and a mirror flag."""
+    return ORIENT_NAMES.get((float(rotation) % 360.0, bool(flip)), f"{rotation:g}")
@@ -0,0 +1,192 @@
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+from annealer import MoveAnnealer, TemperatureSchedule
+from bench_parser import find_design_files, is_lfs_pointer
+from fast_parser import load_design
+from net_model import NetModel
+from orient_engine import OrientEngine
+from parser import parse_scl
+from sa_engine import SAEngine
+from telemetry import Telemetry
+
+# Metrics compared against the baseline, by whether a larger value is a regression
+TIME_METRICS = ("parse_time", "objective_time", "orient_time", "anneal_time", "peak_rss_mb")
+RATE_METRICS = ("moves_per_sec",)
+QOR_METRICS = ("hpwl", "overlap", "energy")
+
+# Differences below these are measurement noise
+TIME_FLOOR = 0.01
+RSS_FLOOR = 16.0
+
+
+def benchmark_design(bench: str, temps: int = 20, moves_per_temp: int = 500, seed: int = 0, repeats: int = 5,
+                     clique_degree: int = 64, prune_degree: int = None) -> dict:
+    """
+    Measure parsing, one objective evaluation, an orientation solve and a fixed-budget anneal of a design.
+    :param bench: Benchmark directory.
+    :param temps: Number of temperatures of the anneal.
+    :param moves_per_temp: Moves per temperature of the anneal.
+    :param seed: Seed of the anneal.
+    :param repeats: Number of objective evaluations, the fastest time of every term is kept.
+    :param clique_degree: Largest net degree modeled as a clique, see NetModel.
+    :param prune_degree: Largest net degree kept, see NetModel.
+    :return: Metrics of the design, or None when its files are missing or git-lfs pointers.
+    """
+    node_file, pl_file, net_file = find_design_files(bench)
+    scl_files = [os.path.join(bench, f) for f in os.listdir(bench) if f.endswith(".scl")]
+    if any(f is None or is_lfs_pointer(f) for f in (node_file, pl_file, net_file)) or not scl_files:
+        return None
+
+    start = time.perf_counter()
+    db = load_design(node_file, pl_file, net_file)
+    x_max, y_max = parse_scl(scl_files[0])
+    parse_time = time.perf_counter() - start
+
+    # The net model of df-macroplacement.py, shared by every optimizer
+    net_model = NetModel(db, clique_degree, prune_degree)
+
+    # One evaluation of the dual annealing objective, term by term
+    engine = SAEngine(db, (0.0, x_max), (0.0, y_max), telemetry=Telemetry(quiet=True), net_model=net_model)
+    term_times = {}
+    for name in ("area", "hpwl", "energy", "overlap", "overflow"):
+        compute = getattr(engine, f"_compute_{name}")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            compute()
+            term_times[name] = min(term_times.get(name, float("inf")), time.perf_counter() - start)
+    objective_time = sum(term_times.values())
+
+    start = time.perf_counter()
+    orient_engine = OrientEngine(db, net_model=net_model)
+    orient_engine.run()
+    orient_time = time.perf_counter() - start
+
+    # Fixed-budget anneal from the design's placement
+    annealer = MoveAnnealer(db, (0.0, x_max), (0.0, y_max), seed=seed, net_model=net_model)
+    schedule = TemperatureSchedule(num_temps=temps, moves_per_temp=moves_per_temp)
+    start = time.perf_counter()
+    annealer.run(schedule)
+    anneal_time = time.perf_counter() - start
+    num_moves = sum(step["accepted"] + step["rejected"] for step in annealer.history)
+
+    db.pos = annealer.best_pos
+    db.rotation[:] = annealer.best_rotation
+    db.flip[:] = annealer.best_flip
+    return {
+        "macros": db.num_macros,
+        "nets": db.num_nets,
+        "pins": db.num_pins,
+        "parse_time": parse_time,
+        "objective_time": objective_time,
+        "objective_term_times": term_times,
+        "evaluations_per_sec": 1.0 / objective_time if objective_time > 0 else float("inf"),
+        "orient_time": orient_time,
+        "anneal_time": anneal_time,
+        "moves_per_sec": num_moves / anneal_time if anneal_time > 0 else float("inf"),
+        "hpwl": engine._compute_hpwl(),
+        "overlap": engine._compute_overlap(),
+        "energy": engine._compute_energy(),
+        # Kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+
+def compare(results: dict, baseline: dict, time_tolerance: float = 0.25, qor_tolerance: float = 0.02) -> list[str]:
+    """
+    Compare benchmark results against a baseline.
+    :param results: Metrics by benchmark name.
+    :param baseline: Baseline metrics by benchmark name.
+    :param time_tolerance: Allowed relative slowdown of times, memory and rates.
+    :param qor_tolerance: Allowed relative increase of HPWL, overlap and energy.
+    :return: Description of every regression.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in TIME_METRICS:
+            floor = RSS_FLOOR if key == "peak_rss_mb" else TIME_FLOOR
+            if metrics[key] > base[key] * (1.0 + time_tolerance) and metrics[key] - base[key] > floor:
+                regressions.append(f"{name}: {key} {metrics[key]:.4g} > baseline {base[key]:.4g}")
+        for key in RATE_METRICS:
+            if metrics[key] * (1.0 + time_tolerance) < base[key]:
+                regressions.append(f"{name}: {key} {metrics[key]:.4g} < baseline {base[key]:.4g}")
+        for key in QOR_METRICS:
+            if metrics[key] > base[key] * (1.0 + qor_tolerance) + 1e-9:
+                regressions.append(f"{name}: {key} {metrics[key]:.6g} > baseline {base[key]:.6g}")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    arg_parser = argparse.ArgumentParser(description="Benchmark speed and placement quality over the bench ladder "
+                                                     "and check them against a JSON baseline.")
+    arg_parser.add_argument("benches", nargs="*", help="Benchmark directories (default: every directory in bench/)")
+    bench_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench")
+    arg_parser.add_argument("--baseline", default=os.path.join(bench_root, "qor_baseline.json"),
+                            help="Baseline file the results are checked against")
+    arg_parser.add_argument("--update", action="store_true", help="Store the results as the new baseline")
+    arg_parser.add_argument("--temps", type=int, default=20, help="Number of temperatures of the anneal")
+    arg_parser.add_argument("--moves-per-temp", type=int, default=500, help="Moves per temperature of the anneal")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Seed of the anneal")
+    arg_parser.add_argument("--clique-degree", type=int, default=64,
+                            help="Largest net degree modeled as a clique, larger nets are stars, see NetModel")
+    arg_parser.add_argument("--prune-degree", type=int, default=None,
+                            help="Ignore the dataflow of nets above this degree")
+    arg_parser.add_argument("--time-tolerance", type=float, default=0.25,
+                            help="Allowed relative slowdown of times, memory and rates")
+    arg_parser.add_argument("--qor-tolerance", type=float, default=0.02,
+                            help="Allowed relative increase of HPWL, overlap and energy")
+    args = arg_parser.parse_args()
+
+    benches = args.benches
+    if not benches:
+        benches = sorted(os.path.join(bench_root, d) for d in os.listdir(bench_root)
+                         if os.path.isdir(os.path.join(bench_root, d)))
+
+    # Every design runs in a fresh process so that its peak memory is its own
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for bench in benches:
+        name = os.path.basename(os.path.normpath(bench))
+        with ctx.Pool(1) as pool:
+            metrics = pool.apply(benchmark_design, (bench, args.temps, args.moves_per_temp, args.seed, 5,
+                                                      args.clique_degree, args.prune_degree))
+        if metrics is None:
+            print(f"{name}: design files missing or git-lfs pointers, skipped")
+            continue
+        results[name] = metrics
+        print(f"{name}: {metrics['macros']} macros, parse {metrics['parse_time']:.3f} s, "
+              f"objective {metrics['objective_time']:.4f} s, orient {metrics['orient_time']:.3f} s, "
+              f"anneal {metrics['anneal_time']:.2f} s ({metrics['moves_per_sec']:.0f} moves/s), "
+              f"peak RSS {metrics['peak_rss_mb']:.0f} MB, HPWL {metrics['hpwl']:.6g}, "
+              f"overlap {metrics['overlap']:.6g}, energy {metrics['energy']:.6g}")
+
+    if args.update:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline of {len(results)} designs written to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update to create it")
+        sys.exit(0)
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_tolerance, args.qor_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions in {len(results)} designs")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,223 @@
+import time
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+from hpwl import expand_ranges
+from placement_db import PlacementDB
+
+
+def _spread(coord: np.ndarray, size: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Spread coordinates over [low, high] by cumulative area, keeping their order."""
+    order = np.argsort(coord, kind="stable")
+    weight = np.maximum(size[order], 1e-12)
+    rank = (np.cumsum(weight) - weight / 2.0) / weight.sum()
+    spread = np.empty_like(coord)
+    spread[order] = low + rank * (high - low)
+    return spread
+
+
+def quadratic_place(db: PlacementDB, x_range: tuple[float, float], y_range: tuple[float, float],
+                    star_degree: int = 8, anchor_weight: float = 1e-3, spread: float = 0.5,
+                    rtol: float = 1e-6, max_iter: int = 1000, movable: np.ndarray = None) -> np.ndarray:
+    """
+    Place the movable macros by minimizing the quadratic wirelength with fixed macros as anchors.
+    Nets up to star_degree pins use the clique model with weight 1 / (d - 1) per pin pair, larger
+    nets a star through a free center node with weight d / (d - 1), so the Laplacian grows linearly
+    with the number of pins. Both coordinates are solved with Jacobi-preconditioned conjugate gradient.
+    :param db: Placement database, not modified.
+    :param x_range: Horizontal extent of the layout.
+    :param y_range: Vertical extent of the layout.
+    :param star_degree: Largest net degree modeled as a clique.
+    :param anchor_weight: Weight, relative to the mean connection weight, pulling every movable macro
+                          towards the layout center so the system stays well posed without fixed macros.
+    :param spread: Blend between the quadratic solution (0) and its order-preserving spreading over the
+                   layout by macro area (1), which counters the clumping of quadratic placement.
+    :param rtol: Relative residual tolerance of conjugate gradient.
+    :param max_iter: Iteration limit of conjugate gradient.
+    :param movable: Ids of the macros to place, defaults to every macro that is not fixed, see
+                    PlacementDB.movable_macros. The other macros are anchors like the fixed ones.
+    :return: (N, 2) positions, macros outside the movable set keep their positions.
+    """
+    min_x, max_x = x_range
+    min_y, max_y = y_range
+    n = db.num_macros
+    movable = np.flatnonzero(~db.fixed) if movable is None else np.asarray(movable, dtype=np.int64)
+    if len(movable) == 0:
+        return db.pos.copy()
+
+    # Unknowns are the pin anchors pos - com of the movable macros followed by the star centers
+    var = np.full(n, -1, dtype=np.int64)
+    var[movable] = np.arange(len(movable))
+    pin_var = var[db.pin_macro]
+    anchor = db.pos - db.com
+    r = db.compute_port_r()
+
+    # Clique nets: every pin pair of the net once
+    degree = db.net_degree
+    clique = np.flatnonzero((degree >= 2) & (degree <= star_degree))
+    clique_degree = degree[clique]
+    pins = expand_ranges(db.net_ptr[clique], clique_degree)
+    pin_degree = np.repeat(clique_degree, clique_degree)
+    src = np.repeat(pins, pin_degree)
+    dst = expand_ranges(np.repeat(db.net_ptr[clique], clique_degree), pin_degree)
+    keep = src < dst
+    src, dst = src[keep], dst[keep]
+    clique_weight = 1.0 / (np.repeat(pin_degree, pin_degree)[keep] - 1)
+
+    # Star nets: every pin to its net's center node
+    star = np.flatnonzero(degree > star_degree)
+    star_pins = expand_ranges(db.net_ptr[star], degree[star])
+    star_var = len(movable) + np.repeat(np.arange(len(star)), degree[star])
+    star_weight = np.repeat(degree[star] / (degree[star] - 1.0), degree[star])
+    num_vars = len(movable) + len(star)
+
+    # An endpoint is a variable with a pin offset, or a constant location on a fixed macro. Star
+    # centers are always variables, so their constant location is never used
+    u = np.concatenate([pin_var[src], pin_var[star_pins]])
+    v = np.concatenate([pin_var[dst], star_var])
+    offset_u = np.concatenate([r[src], r[star_pins]])
+    offset_v = np.concatenate([r[dst], np.zeros((len(star_pins), 2))])
+    const_u = np.concatenate([anchor[db.pin_macro[src]], anchor[db.pin_macro[star_pins]]]) + offset_u
+    const_v = np.concatenate([anchor[db.pin_macro[dst]], np.zeros((len(star_pins), 2))]) + offset_v
+    weight = np.concatenate([clique_weight, star_weight])
+    same_macro = np.concatenate([db.pin_macro[src] == db.pin_macro[dst], np.zeros(len(star_pins), dtype=bool)])
+
+    rhs = np.zeros((num_vars, 2))
+    both = (u >= 0) & (v >= 0) & ~same_macro
+    only_u = (u >= 0) & (v < 0)
+    only_v = (u < 0) & (v >= 0)
+
+    # w (a_u + o_u - a_v - o_v)^2 between two unknowns
+    rows = [u[both], v[both], u[both], v[both]]
+    cols = [u[both], v[both], v[both], u[both]]
+    vals = [weight[both], weight[both], -weight[both], -weight[both]]
+    diff = weight[both, None] * (offset_u[both] - offset_v[both])
+    for k in range(2):
+        rhs[:, k] -= np.bincount(u[both], weights=diff[:, k], minlength=num_vars)
+        rhs[:, k] += np.bincount(v[both], weights=diff[:, k], minlength=num_vars)
+
+    # w (a_u + o_u - c_v)^2 between an unknown and a fixed pin
+    for var_side, offset, const, mask in ((u, offset_u, const_v, only_u), (v, offset_v, const_u, only_v)):
+        rows.append(var_side[mask])
+        cols.append(var_side[mask])
+        vals.append(weight[mask])
+        pull = weight[mask, None] * (const[mask] - offset[mask])
+        for k in range(2):
+            rhs[:, k] += np.bincount(var_side[mask], weights=pull[:, k], minlength=num_vars)
+
+    # Weak pull of the movable macros towards the layout center
+    dim = db.compute_dimensions()
+    center = np.array([(min_x + max_x) / 2.0, (min_y + max_y) / 2.0])
+    target = center + np.stack([-dim[movable, 0], dim[movable, 1]], axis=1) / 2.0 - db.com[movable]
+    mean_weight = weight.mean() if len(weight) else 1.0
+    pull = np.full(len(movable), anchor_weight * mean_weight)
+    rows.append(np.arange(len(movable)))
+    cols.append(np.arange(len(movable)))
+    vals.append(pull)
+    rhs[:len(movable)] += pull[:, None] * target
+
+    laplacian = scipy.sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                        shape=(num_vars, num_vars))
+    diag = laplacian.diagonal()
+    diag = np.where(diag > 0, diag, 1.0)
+    preconditioner = scipy.sparse.linalg.LinearOperator((num_vars, num_vars), matvec=lambda x: x / diag)
+
+    solution = np.empty((num_vars, 2))
+    x0 = np.zeros(num_vars)
+    for k in range(2):
+        x0[:len(movable)] = anchor[movable, k]
+        x0[len(movable):] = center[k]
+        solution[:, k], info = scipy.sparse.linalg.cg(laplacian, rhs[:, k], x0=x0, rtol=rtol, maxiter=max_iter,
+                                                      M=preconditioner)
+        if info < 0:
+            raise ValueError(f"Conjugate gradient failed on coordinate {k} with code {info}.")
+
+    pos = db.pos.copy()
+    pos[movable] = solution[:len(movable)] + db.com[movable]
+
+    # Blend towards an order-preserving spreading over the layout
+    if spread > 0:
+        width, height = dim[movable, 0], dim[movable, 1]
+        area = width * height
+        spread_x = _spread(pos[movable, 0] + width / 2.0, area, min_x, max_x) - width / 2.0
+        spread_y = _spread(pos[movable, 1] - height / 2.0, area, min_y, max_y) + height / 2.0
+        pos[movable, 0] = (1.0 - spread) * pos[movable, 0] + spread * spread_x
+        pos[movable, 1] = (1.0 - spread) * pos[movable, 1] + spread * spread_y
+
+    # Keep the macros inside the layout where they fit
+    pos[movable, 0] = np.clip(pos[movable, 0], min_x, np.maximum(min_x, max_x - dim[movable, 0]))
+    pos[movable, 1] = np.clip(pos[movable, 1], np.minimum(max_y, min_y + dim[movable, 1]), max_y)
+    return pos
+
+
+def random_place(db: PlacementDB, x_range: tuple[float, float], y_range: tuple[float, float],
+                 rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Place the movable macros uniformly at random inside the layout.
+    :return: (N, 2) positions, fixed macros keep their positions.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    movable = ~db.fixed
+    pos = db.pos.copy()
+    low = np.array([x_range[0], y_range[0]])
+    high = np.array([x_range[1], y_range[1]])
+    pos[movable] = low + (high - low) * rng.random((int(movable.sum()), 2))
+    return pos
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from annealer import MoveAnnealer, TemperatureSchedule
+    from bench_parser import find_design_files, is_lfs_pointer
+    from design_cache import load_design_cached
+
+    arg_parser = argparse.ArgumentParser(description="Time to a target cost of the annealer from random and "
+                                                     "quadratic initial placements.")
+    arg_parser.add_argument("benches", nargs="+", help="Benchmark directories")
+    arg_parser.add_argument("--temps", type=int, default=50, help="Number of temperatures")
+    arg_parser.add_argument("--moves-per-temp", type=int, default=1000, help="Moves attempted per temperature")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = arg_parser.parse_args()
+
+    for bench in args.benches:
+        node_file, pl_file, net_file = find_design_files(bench)
+        scl_files = [os.path.join(bench, f) for f in os.listdir(bench) if f.endswith(".scl")]
+        if any(f is None or is_lfs_pointer(f) for f in (node_file, pl_file, net_file)) or not scl_files:
+            print(f"{bench}: design files missing or git-lfs pointers, skipped")
+            continue
+        db, (x_max, y_max) = load_design_cached(node_file, pl_file, net_file, scl_files[0])
+        x_range, y_range = (0.0, x_max), (0.0, y_max)
+
+        start = time.perf_counter()
+        quadratic_pos = quadratic_place(db, x_range, y_range)
+        place_time = time.perf_counter() - start
+        initial = {
+            "random": (random_place(db, x_range, y_range, np.random.default_rng(args.seed)), 0.0),
+            "quadratic": (quadratic_pos, place_time),
+        }
+
+        # Anneal from both starts and record the best cost after every temperature
+        traces = {}
+        for name, (pos, init_time) in initial.items():
+            db.pos = pos.copy()
+            annealer = MoveAnnealer(db, x_range, y_range, seed=args.seed)
+            initial_cost = annealer.cost
+            schedule = TemperatureSchedule(num_temps=args.temps, moves_per_temp=args.moves_per_temp)
+            trace = []
+            start = time.perf_counter()
+            annealer.run(schedule, callback=lambda cost: trace.append((init_time + time.perf_counter() - start, cost)))
+            traces[name] = (initial_cost, trace)
+
+        # The target is the final cost of the random start
+        target = traces["random"][1][-1][1]
+        print(f"{bench}: {db.num_macros} macros, quadratic placement in {place_time:.2f} s, target cost {target:.6g}")
+        for name, (initial_cost, trace) in traces.items():
+            reached = next((t for t, cost in trace if cost <= target), None)
+            reached = "not reached" if reached is None else f"{reached:.2f} s"
+            print(f"  {name:<10} initial cost {initial_cost:.6g}, final cost {trace[-1][1]:.6g}, "
+                  f"target {reached}, total {trace[-1][0]:.2f} s")
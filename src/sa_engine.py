@@ -1,141 +1,203 @@
 import scipy
-import networkx as nx
 import numpy as np
 
-from macro import Macro
-from net import Net
+from annealer import MoveAnnealer, TemperatureSchedule
+from checkpoint import Checkpointer
+from density import compute_density_energy, compute_density_overflow
+from dfg import DataFlowGraph
+from hpwl import HPWLEngine
+from net_model import NetModel
 from orient_engine import OrientEngine
-
-def overlappingArea(rec1, rec2):
-    x1_overlap = max(rec1[0], rec2[0])
-    y1_overlap = max(rec1[1], rec2[1])
-    x2_overlap = min(rec1[2], rec2[2])
-    y2_overlap = min(rec1[3], rec2[3])
-
-    if x1_overlap > x2_overlap or y1_overlap > y2_overlap:
-        return 0  # No overlap
-
-    overlap_width = x2_overlap - x1_overlap
-    overlap_height = y2_overlap - y1_overlap
-
-    return overlap_width * overlap_height
+from overlap import compute_bbox_area, compute_overflow, compute_overlap
+from placement_db import PlacementDB
+from quadratic import quadratic_place, random_place
+from telemetry import Telemetry
 
 class SAEngine:
-    def __init__(self, macros: dict[str:Macro], nets: dict[str:Net], x_range: tuple[float, float], y_range: tuple[float, float]):
-        self.macros = macros
-        self.nets = nets
-        self.macro2index = {name: i for i, name in enumerate(macros.keys())}
-        self.index2macro = {i: name for i, name in enumerate(macros.keys())}
+    def __init__(self, db: PlacementDB, x_range: tuple[float, float], y_range: tuple[float, float],
+                 orient_method: str = "newton", orient_flips: bool = False, overlap_model: str = "pairwise",
+                 telemetry: Telemetry = None, movable: np.ndarray = None, net_model: NetModel = None):
+        """
+        Macro placement optimizer.
+        :param db: Placement database.
+        :param x_range: Horizontal extent of the layout.
+        :param y_range: Vertical extent of the layout.
+        :param orient_method: Orientation solver, see OrientEngine.
+        :param orient_flips: Whether the discrete orientation search considers mirrored orientations.
+        :param overlap_model: Overlap term, "pairwise" for the overlap area between macros, "density"
+                              for the bin overflow of the macro area, or "potential" for the
+                              electrostatic energy of the bin density (dual annealing only).
+        :param telemetry: Progress trace of the optimizer, defaults to periodic summaries without a trace file.
+        :param movable: Ids of the macros to optimize, defaults to every macro that is not fixed, see
+                        PlacementDB.movable_macros. Fixed macros are static anchors and obstacles. The
+                        remaining movable nodes, such as standard cells, keep their positions and are
+                        ignored by the area, overlap and overflow terms, their pins still count.
+        :param net_model: Dataflow edges of the nets and their weights shared by the dataflow graph,
+                          the orientation solver and the move-based annealer, defaults to every
+                          (output pin, input pin) pair of a net on different macros.
+        """
+        if overlap_model not in ("pairwise", "density", "potential"):
+            raise ValueError(f"Invalid overlap model '{overlap_model}'. Expected 'pairwise', 'density' or 'potential'.")
+        self.db = db
+        self.overlap_model = overlap_model
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
 
         self.min_x, self.max_x = x_range
         self.min_y, self.max_y = y_range
 
-        self.orient_engine: OrientEngine = OrientEngine(macros, nets)
-
-        self.pos_vec = [0.0] * len(macros) * 2  # x and y positions for each macro
-
-    def _initialize_locations(self):
-        # Randomly initialize the positions of macros within the specified bounds
-        for i in range(0, len(self.macros), 2):
-            x_pos = self.min_x + (self.max_x - self.min_x) * np.random.rand()
-            y_pos = self.min_y + (self.max_y - self.min_y) * np.random.rand()
-            self.pos_vec[i] = x_pos
-            self.pos_vec[i + 1] = y_pos
-        return
+        self.movable = np.flatnonzero(~db.fixed) if movable is None else np.asarray(movable, dtype=np.int64)
+        self.is_movable = np.zeros(db.num_macros, dtype=bool)
+        self.is_movable[self.movable] = True
+
+        self.net_model: NetModel = NetModel(db) if net_model is None else net_model
+        self.orient_engine: OrientEngine = OrientEngine(db, method=orient_method, flips=orient_flips,
+                                                        movable=self.movable, net_model=self.net_model)
+        self.hpwl_engine: HPWLEngine = HPWLEngine(db)
+        self.dfg: DataFlowGraph = DataFlowGraph(db, self.net_model)
+
+        # Terms of the objects that never move, computed once
+        self.fixed_rects = db.compute_rects(macros=np.flatnonzero(db.fixed))
+        self.hpwl_engine.set_movable(self.movable)
+        self.active_edges = self.dfg.incident_edges(self.movable)
+        self.edge_energy = self.dfg.compute_energy()
+
+        self.pos_vec = [0.0] * db.num_macros * 2  # x and y positions for each macro
+        self.best_cost = float("inf")
+
+    def _initialize_locations(self, init: str = "random", seed: int = None):
+        """
+        Set the starting positions of the movable macros, fixed macros keep their positions.
+        :param init: "random" for uniform positions in the layout, "quadratic" for the analytical
+                     quadratic placement, or "current" to start from the stored positions.
+        :param seed: Random seed of the random initial placement.
+        """
+        x_range = (self.min_x, self.max_x)
+        y_range = (self.min_y, self.max_y)
+        if init == "random":
+            pos = random_place(self.db, x_range, y_range, np.random.default_rng(seed))
+        elif init == "quadratic":
+            pos = quadratic_place(self.db, x_range, y_range, movable=self.movable)
+        elif init == "current":
+            pos = self.db.pos
+        else:
+            raise ValueError(f"Invalid initial placement '{init}'. Expected 'random', 'quadratic' or 'current'.")
+        # Nodes outside the movable set keep their positions
+        pos = np.where(self.is_movable[:, None], pos, self.db.pos)
+        self.db.pos = np.array(pos, dtype=float)
+        self.pos_vec = self.db.pos.reshape(-1).copy()
     
+    def _rects(self) -> np.ndarray:
+        """Rectangles of the fixed and the movable macros, the objects the area and overlap terms see."""
+        return np.concatenate([self.fixed_rects, self.db.compute_rects(macros=self.movable)])
+
     def _compute_area(self) -> float:
-        min_x = min(macro.pos[0] for macro in self.macros.values())
-        max_x = max(macro.pos[0] + macro.compute_dimensions()[0] for macro in self.macros.values())
-        min_y = min(macro.pos[1] - macro.compute_dimensions()[1] for macro in self.macros.values())
-        max_y = max(macro.pos[1] for macro in self.macros.values())
-        area = (max_x - min_x) * (max_y - min_y)
-        return area
+        return compute_bbox_area(self._rects())
 
     def _compute_hpwl(self) -> float:
-        return 0.0
-
-    def _construct_dfg(self) -> nx.DiGraph:
-        g = nx.DiGraph()
-
-        # Add nodes for each macro
-        for macro_name in self.macros.keys():
-            g.add_node(macro_name)
-
-        for net in self.nets.values():            
-            in_macros = net.get_in_macro()
-            out_macros = net.get_out_macro()
-
-            for out_macro, out_idx in out_macros:
-                for in_macro, in_idx in in_macros:
-                    if out_macro.name == in_macro.name:
-                        continue
-                    
-                    # Compute the energy based on distance
-                    out_pos = out_macro.compute_port_loc(out_idx)
-                    in_pos = in_macro.compute_port_loc(in_idx)
-                    distance = np.linalg.norm(in_pos - out_pos)
-                    energy = distance ** 2
-
-                    # Add directed edge with energy as weight
-                    g.add_edge(out_macro.name, in_macro.name, energy=energy)
-
-
-        return g
+        """Compute the HPWL, locating only the pins of movable macros."""
+        return self.hpwl_engine.compute_movable()
 
+    def _compute_energy(self) -> float:
+        """Compute the energy of the longest path of the dataflow graph, recomputing only the edges of movable macros."""
+        self.edge_energy[self.active_edges] = self.dfg.compute_energy(edges=self.active_edges)
+        return self.dfg.longest_path(energy=self.edge_energy)
 
     def _compute_overlap(self) -> float:
-        """Compute the total overlap area between macros."""
-        overlap = 0.0
-        macros = list(self.macros.values())
-        for i in range(len(macros)):
-            for j in range(i + 1, len(macros)):
-                m1 = macros[i]
-                m2 = macros[j]
+        """Compute the overlap term of the selected overlap model."""
+        rects = self._rects()
+        layout = (self.min_x, self.min_y, self.max_x, self.max_y)
+        if self.overlap_model == "density":
+            return compute_density_overflow(rects, layout)
+        if self.overlap_model == "potential":
+            return compute_density_energy(rects, layout)
+        return compute_overlap(rects)
+
+    def _compute_overflow(self) -> float:
+        """Compute the overflow area, which is the area of the bounding box minus the area of the layout."""
+        layout = (self.min_x, self.min_y, self.max_x, self.max_y)
+        return compute_overflow(self._rects(), layout)
+
+    def _run_moves(self, schedule: TemperatureSchedule = None, seed: int = None, callback=None, move_probs=None,
+                   checkpoint: Checkpointer = None, resume: dict = None):
+        """Anneal with incremental shift/swap/rotate/flip moves from the current placement or a resumed state."""
+        annealer = MoveAnnealer(self.db, (self.min_x, self.max_x), (self.min_y, self.max_y),
+                                move_probs=move_probs, seed=seed, overlap_model=self.overlap_model,
+                                telemetry=self.telemetry, movable=self.movable, net_model=self.net_model)
+        if resume is not None:
+            annealer.load_state(resume)
+            print(f"Resuming at temperature step {annealer.step} with best cost {annealer.best_cost}.")
+
+        def save():
+            checkpoint.save(dict(annealer.state_dict(), method="moves"), self.db)
+
+        step_callback = callback
+        if checkpoint is not None:
+            # Checkpoint between temperature steps, where the state is consistent
+            def step_callback(cost):
+                if checkpoint.due():
+                    save()
+                return callback is not None and callback(cost)
+
+        best_cost = annealer.run(schedule, step_callback)
+        if checkpoint is not None:
+            save()
+        self.best_cost = best_cost
+        print(f"Best cost: {best_cost}, " + ", ".join(f"{k.upper()}: {v}" for k, v in annealer.best_terms.items()))
+
+        self.pos_vec = annealer.best_pos.reshape(-1)
+        self.db.rotation[:] = annealer.best_rotation
+        self.db.flip[:] = annealer.best_flip
+        return self.pos_vec
 
-                m1_pos = m1.get_position()
-                m1_dim = m1.compute_dimensions()
-                m2_pos = m2.get_position()
-                m2_dim = m2.compute_dimensions()
+    def run(self, method: str = "dual_annealing", schedule: TemperatureSchedule = None, seed: int = None,
+            callback=None, move_probs: dict[str, float] = None, init: str = None, checkpoint: Checkpointer = None,
+            resume: dict = None):
+        """
+        Optimize the macro positions.
+        :param method: "dual_annealing" to minimize the full objective with scipy, or "moves" for
+                       the move-based annealer with incremental cost updates.
+        :param schedule: Temperature schedule of the move-based annealer.
+        :param seed: Random seed of the optimizer.
+        :param callback: Called with the best cost whenever it is reported, returning True stops the run.
+        :param move_probs: Move probabilities of the move-based annealer, see MoveAnnealer.
+        :param init: Initial placement, see _initialize_locations. Defaults to "random" for dual
+                     annealing and to "current" for the move-based annealer.
+        :param checkpoint: Periodically saves the optimizer state and the best placement, see checkpoint.Checkpointer.
+        :param resume: State of a checkpoint of the same method to continue from, see checkpoint.load_checkpoint.
+                       The move-based annealer continues exactly where it stopped. Dual annealing restarts
+                       from the best placement of the checkpoint, as scipy does not expose its internal state.
+        :return: Flattened optimized positions.
+        """
+        if method not in ("dual_annealing", "moves"):
+            raise ValueError(f"Invalid method '{method}'. Expected 'dual_annealing' or 'moves'.")
+        if resume is not None and str(resume["method"]) != method:
+            raise ValueError(f"Invalid checkpoint of method '{resume['method']}'. Expected '{method}'.")
 
-                rect1 = [m1_pos[0], m1_pos[1] - m1_dim[1], m1_pos[0] + m1_dim[0], m1_pos[1]]
-                rect2 = [m2_pos[0], m2_pos[1] - m2_dim[1], m2_pos[0] + m2_dim[0], m2_pos[1]]
+        # Initialize positions of macros
+        if init is None:
+            init = "current" if method == "moves" else "random"
+        if resume is not None and method == "dual_annealing":
+            self.db.pos = np.array(resume["best_pos"], dtype=float)
+            self.db.rotation[:] = resume["best_rotation"]
+            self.db.flip[:] = resume["best_flip"]
+            init = "current"
+        self._initialize_locations(init, seed)
+
+        if method == "moves":
+            print("Running move-based simulated annealing.")
+            return self._run_moves(schedule, seed, callback, move_probs, checkpoint, resume)
+        print("Running simulated annealing.")
 
-                overlap += overlappingArea(rect1, rect2)
+        # Best evaluated placement, kept for the checkpoints
+        best = {"best_cost": float(resume["best_cost"]) if resume is not None else float("inf")}
 
-        return overlap
+        def save():
+            if "best_pos" in best:
+                checkpoint.save(dict(best, method="dual_annealing"), self.db)
 
-    def _compute_overflow(self) -> float:
-        """Compute the overflow area, which is the area of the bounding box minus the area of the layout."""
-        overflow = 0.0
-        # l1 = [self.min_x, self.min_y]
-        # r1 = [self.max_x, self.max_y]
-        rect1 = [self.min_x, self.min_y, self.max_x, self.max_y]
-
-        for macro in self.macros.values():
-            m_pos = macro.get_position()
-            m_dim = macro.compute_dimensions()
-
-            rect2 = [m_pos[0], m_pos[1] - m_dim[1], m_pos[0] + m_dim[0], m_pos[1]]            
-            
-            overlap = overlappingArea(rect1, rect2)
-            # print(f"Macro {macro.name} overlap area: {overlap}, total area: {m_dim[0] * m_dim[1]}")
-            overflow += m_dim[0] * m_dim[1] - overlap
-            
-        return overflow
-
-    def run(self):
-        print("Running simulated annealing.")
-        
-        # Initialize positions of macros
-        self._initialize_locations()
-        
         def obj_f(x):
-            # Place the macros at the specified positions
-            for idx, m_name in self.index2macro.items():
-                macro: Macro = self.macros[m_name]
-                x_pos = x[idx * 2]
-                y_pos = x[idx * 2 + 1]
-                macro.set_position(x_pos, y_pos)
+            # Place the movable macros at the specified positions
+            self.db.pos[self.movable] = x.reshape(-1, 2)
 
             # Use the rotation engine to rotate the macros based on torque
             self.orient_engine.run()
@@ -147,11 +209,8 @@ class SAEngine:
             # Compute HPWL 
             HPWL = self._compute_hpwl()
 
-            # Construct the weighted dataflow graph with Energy E α d^2
-            dfg: nx.DiGraph = self._construct_dfg()
-            # Compute longest path 
-            path = nx.dag_longest_path(dfg, weight='energy')
-            ENERGY = sum(dfg[u][v]['energy'] for u, v in zip(path[:-1], path[1:]))
+            # Longest path of the dataflow graph weighted with Energy E α d^2
+            ENERGY = self._compute_energy()
 
             # Compute overlap area
             OVERLAP = self._compute_overlap()
@@ -161,27 +220,44 @@ class SAEngine:
 
             # Compute total weighted cost
             total_cost = AREA + HPWL + ENERGY + 100 * OVERLAP + 100 * OVERFLOW
-            print(f"Current cost: {total_cost}, AREA: {AREA}, HPWL: {HPWL}, ENERGY: {ENERGY}, OVERLAP: {OVERLAP}, OVERFLOW: {OVERFLOW}")
+            self.telemetry.record(total_cost, {"area": AREA, "hpwl": HPWL, "energy": ENERGY, "overlap": OVERLAP,
+                                               "overflow": OVERFLOW})
+
+            if checkpoint is not None:
+                if total_cost < best["best_cost"]:
+                    best.update(best_cost=total_cost, best_pos=self.db.pos.copy(),
+                                best_rotation=self.db.rotation.copy(), best_flip=self.db.flip.copy())
+                if checkpoint.due():
+                    save()
 
             return total_cost
 
+        # Only the movable macros are searched
+        bounds = [(self.min_x, self.max_x), (self.min_y, self.max_y)] * len(self.movable)
+        lower, upper = np.array(bounds).T
+        x0 = self.db.pos[self.movable].reshape(-1)
         res: scipy.optimize.OptimizeResult = scipy.optimize.dual_annealing(
             obj_f, 
-            bounds=[(self.min_x, self.max_x), (self.min_y, self.max_y)] * len(self.macros),
+            bounds=bounds,
+            x0=np.clip(x0, lower, upper),
             maxiter=100,
+            seed=seed,
+            callback=None if callback is None else lambda x, f, context: callback(f),
         )
 
-        self.pos_vec = res.x
-        print("Optimization result:", res)
+        self.db.pos[self.movable] = res.x.reshape(-1, 2)
+        self.pos_vec = self.db.pos.reshape(-1).copy()
+        self.best_cost = float(res.fun)
+        if checkpoint is not None:
+            save()
+        print(f"Optimization result: cost {res.fun} after {res.nfev} evaluations, {res.message[0]}")
+        if not self.telemetry.quiet:
+            self.telemetry.print_summary()
 
         return self.pos_vec
     
 
     def update_macro_positions(self):
         """Update the positions of macros based on the current position vector."""
-        for idx, m_name in self.index2macro.items():
-            macro: Macro = self.macros[m_name]
-            x_pos = self.pos_vec[idx * 2]
-            y_pos = self.pos_vec[idx * 2 + 1]
-            macro.set_position(x_pos, y_pos)
+        self.db.pos = np.array(self.pos_vec, dtype=float).reshape(-1, 2)
         return
\ No newline at end of file
@@ -0,0 +1,68 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from placement_db import NETLIST_ARRAYS, PLACEMENT_ARRAYS, PlacementDB
+
+# Shared memory blocks attached by this process, kept open while their arrays are in use
+_attached: list[shared_memory.SharedMemory] = []
+
+
+class SharedDesign:
+    def __init__(self, db: PlacementDB, layout: tuple[float, float] = (0.0, 0.0)):
+        """
+        Publish the arrays of a design in shared memory, once for every worker process.
+        Workers attach to the blocks by name with attach_design, so they neither parse the design
+        nor receive a pickled copy of it, and the netlist takes no memory per worker. The blocks
+        are removed by close, the publishing process must outlive the workers.
+        :param db: Placement database to publish, its current placement is the starting point of the workers.
+        :param layout: Width and height of the layout.
+        """
+        self.blocks: list[shared_memory.SharedMemory] = []
+        arrays = {}
+        try:
+            for name, arr in db.to_arrays().items():
+                arr = np.ascontiguousarray(arr)
+                # Blocks cannot be empty
+                block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(arr.shape, arr.dtype, buffer=block.buf)[...] = arr
+                arrays[name] = (block.name, arr.shape, arr.dtype.str)
+        except BaseException:
+            self.close()
+            raise
+        self.handle = {"arrays": arrays, "layout": tuple(float(v) for v in layout)}
+
+    def close(self):
+        """Release and remove the shared memory blocks."""
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_design(handle: dict) -> tuple[PlacementDB, tuple[float, float]]:
+    """
+    Attach to a design published by SharedDesign.
+    The netlist arrays are read-only views of the shared blocks. Positions, rotations and flips are
+    private copies, so every worker places independently.
+    :param handle: SharedDesign.handle of the publishing process.
+    :return: Tuple of the placement database and the layout width and height.
+    """
+    arrays = {}
+    for name, (block_name, shape, dtype) in handle["arrays"].items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _attached.append(block)
+        arr = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        if name in PLACEMENT_ARRAYS:
+            arr = arr.copy()
+        else:
+            arr.flags.writeable = False
+        arrays[name] = arr
+    return PlacementDB.from_arrays(arrays), handle["layout"]
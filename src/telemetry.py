@@ -0,0 +1,76 @@
+import json
+import time
+
+
+class Telemetry:
+    def __init__(self, path: str = None, sample_every: int = 1, summary_interval: float = 10.0, quiet: bool = False):
+        """
+        Throttled trace of the optimization progress.
+        Every record counts towards the evaluation rate and the best cost, every sample_every-th
+        record is written as one JSON line, and a one-line summary is printed at most every
+        summary_interval seconds. Without a trace file in quiet mode a record only updates counters.
+        :param path: JSONL trace file, no trace is written when None.
+        :param sample_every: Write every sample_every-th record to the trace.
+        :param summary_interval: Seconds between printed summaries.
+        :param quiet: Do not print summaries.
+        """
+        if sample_every < 1:
+            raise ValueError(f"Invalid sampling rate {sample_every}. Expected at least 1.")
+        self.path = path
+        self.sample_every = sample_every
+        self.summary_interval = summary_interval
+        self.quiet = quiet
+
+        self.file = open(path, 'w') if path is not None else None
+        self.iteration = 0
+        self.evaluations = 0
+        self.best_cost = float("inf")
+        self.start_time = time.perf_counter()
+        self.last_summary = self.start_time
+
+    def record(self, cost: float, terms: dict[str, float] = None, evaluations: int = 1, **fields):
+        """
+        Record the progress of the optimizer.
+        :param cost: Current cost.
+        :param terms: Current cost terms.
+        :param evaluations: Number of cost evaluations since the last record.
+        :param fields: Further values to trace, such as the temperature and accepted or rejected moves.
+        """
+        self.iteration += 1
+        self.evaluations += evaluations
+        if cost < self.best_cost:
+            self.best_cost = cost
+        if self.file is None and self.quiet:
+            return
+
+        now = time.perf_counter()
+        if self.file is not None and self.iteration % self.sample_every == 0:
+            entry = {"iteration": self.iteration, "evaluations": self.evaluations,
+                     "time": round(now - self.start_time, 6), "cost": float(cost), "best_cost": float(self.best_cost)}
+            if terms is not None:
+                entry.update((name, float(value)) for name, value in terms.items())
+            entry.update(fields)
+            self.file.write(json.dumps(entry) + "\n")
+        if not self.quiet and now - self.last_summary >= self.summary_interval:
+            self.last_summary = now
+            self.print_summary()
+
+    def evaluations_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.start_time
+        return self.evaluations / elapsed if elapsed > 0 else 0.0
+
+    def print_summary(self):
+        print(f"{self.evaluations} evaluations in {time.perf_counter() - self.start_time:.1f} s "
+              f"({self.evaluations_per_second():.1f}/s), best cost {self.best_cost}")
+
+    def close(self):
+        """Flush and close the trace file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self) -> "Telemetry":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,12 +1,14 @@
+from placement_db import PlacementDB, orientation_name
 
 
-from macro import Macro
-
-def output_macros(macros: list[Macro], file_path: str):
+def output_placement(db: PlacementDB, file_path: str):
+    """Write the positions and orientations held by the placement database as a .pl file."""
+    fixed = ["/FIXED" if f else "" for f in db.fixed]
+    orients = [orientation_name(rot, flip) for rot, flip in zip(db.rotation.tolist(), db.flip.tolist())]
+    lines = [
+        f"{name} {x} {y} : {orient} {tag}\n"
+        for name, x, y, orient, tag in zip(db.names, db.pos[:, 0].tolist(), db.pos[:, 1].tolist(), orients, fixed)
+    ]
     with open(file_path, 'w') as f:
         f.write("\n")
-        for macro in macros:
-            f.write(f"{macro.name} {macro.pos[0]} {macro.pos[1]} : {macro.rotation} ")
-            if macro.fixed:
-                f.write("/FIXED")
-            f.write("\n")
+        f.writelines(lines)
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from placement_db import PlacementDB, PIN_IN, PIN_OUT  # noqa: E402
+
+
+@pytest.fixture
+def synthetic_design():
+    """Build a random design of macros and multi-pin nets with fixed macros offset from the origin."""
+    def build(num_macros: int = 60, num_fixed: int = 10, num_nets: int = 80, max_degree: int = 20,
+              fixed_offset: float = 0.0, seed: int = 0) -> PlacementDB:
+        rng = np.random.default_rng(seed)
+        dim = rng.uniform(5.0, 40.0, (num_macros, 2))
+        pos = rng.uniform(0.0, 1000.0, (num_macros, 2))
+        fixed = np.zeros(num_macros, dtype=bool)
+        fixed[:num_fixed] = True
+        pos[fixed] += fixed_offset
+
+        degrees = rng.integers(2, max_degree + 1, num_nets)
+        net_ptr = np.zeros(num_nets + 1, dtype=np.int64)
+        np.cumsum(degrees, out=net_ptr[1:])
+        pin_macro = rng.integers(0, num_macros, net_ptr[-1])
+        pin_offset = rng.uniform(-0.5, 0.5, (net_ptr[-1], 2)) * dim[pin_macro]
+        pin_type = np.full(net_ptr[-1], PIN_IN, dtype=np.int8)
+        pin_type[net_ptr[:-1]] = PIN_OUT
+        return PlacementDB(np.array([f"m{i}" for i in range(num_macros)]), dim, fixed, pos, pin_macro,
+                           pin_offset, pin_type, np.array([f"n{j}" for j in range(num_nets)]), net_ptr)
+    return build
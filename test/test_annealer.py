@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from annealer import MoveAnnealer
+
+LAYOUT = ((0.0, 600.0), (0.0, 600.0))
+
+
+@pytest.mark.parametrize("overlap_model", ["pairwise", "density"])
+def test_running_terms_match_a_full_recompute(synthetic_design, overlap_model):
+    # Crowded enough that every term, including the overlap and the overflow, is non-zero
+    db = synthetic_design(num_macros=300, num_fixed=20, num_nets=300)
+    annealer = MoveAnnealer(db, *LAYOUT, seed=1, overlap_model=overlap_model)
+    for _ in range(1000):
+        annealer.propose(*annealer.random_move(0.3))
+        if annealer.rng.random() < 0.5:
+            annealer.accept()
+
+    terms = dict(annealer.terms)
+    recomputed = annealer.compute_terms()
+    assert all(value > 0 for value in recomputed.values())
+    for name, value in recomputed.items():
+        assert terms[name] == pytest.approx(value, rel=1e-9), name
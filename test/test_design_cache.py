@@ -0,0 +1,41 @@
+import os
+import shutil
+
+from design_cache import design_cache_path, evict_caches, load_design_cached
+
+SIMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simple")
+
+
+def _copy_simple(tmp_path):
+    for name in os.listdir(SIMPLE):
+        shutil.copy(os.path.join(SIMPLE, name), tmp_path / name)
+    return [str(tmp_path / f"simple.{ext}") for ext in ("nodes", "pl", "nets", "scl")]
+
+
+def test_caches_of_other_placements_and_writers_survive_a_miss(tmp_path):
+    node_file, pl_file, net_file, scl_file = _copy_simple(tmp_path)
+    other_pl = str(tmp_path / "other.pl")
+    with open(pl_file) as f, open(other_pl, "w") as out:
+        out.write(f.read() + "\n")
+
+    load_design_cached(node_file, pl_file, net_file, scl_file)
+    first = design_cache_path(node_file, pl_file, net_file, scl_file)
+    writing = os.path.join(os.path.dirname(first), ".tmp-writer")
+    os.makedirs(writing)
+    load_design_cached(node_file, other_pl, net_file, scl_file)
+
+    assert os.path.isdir(first)
+    assert os.path.isdir(design_cache_path(node_file, other_pl, net_file, scl_file))
+    assert os.path.isdir(writing)
+
+
+def test_least_recently_used_caches_are_evicted_beyond_the_size_cap(tmp_path):
+    root = tmp_path / "cache"
+    for age, name in enumerate(["new", "old", "keep"]):
+        os.makedirs(root / name)
+        (root / name / "a.npy").write_bytes(b"x" * 100)
+        os.utime(root / name, (1000 - age, 1000 - age))
+    os.makedirs(root / ".tmp-writer")
+
+    evict_caches(str(root), str(root / "keep"), max_bytes=250)
+    assert sorted(os.listdir(root)) == [".tmp-writer", "keep", "new"]
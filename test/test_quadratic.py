@@ -0,0 +1,24 @@
+import numpy as np
+
+from quadratic import quadratic_place
+
+LAYOUT = ((-10000.0, 20000.0), (-10000.0, 20000.0))
+
+
+def test_star_and_clique_models_agree_with_distant_fixed_macros(synthetic_design):
+    db = synthetic_design(fixed_offset=5000.0)
+    # The star of weight d / (d - 1) is the clique of weight 1 / (d - 1) per pair with its center eliminated
+    star = quadratic_place(db, *LAYOUT, star_degree=8, anchor_weight=1e-9, spread=0.0, rtol=1e-12)
+    clique = quadratic_place(db, *LAYOUT, star_degree=100, anchor_weight=1e-9, spread=0.0, rtol=1e-12)
+    movable = ~db.fixed
+    assert np.allclose(star[movable], clique[movable], atol=1e-3)
+    assert star[movable].mean() > 4000.0
+
+
+def test_macros_outside_the_movable_set_keep_their_positions(synthetic_design):
+    db = synthetic_design()
+    movable = np.arange(10, 30)
+    pos = quadratic_place(db, *LAYOUT, movable=movable)
+    others = np.setdiff1d(np.arange(db.num_macros), movable)
+    assert np.array_equal(pos[others], db.pos[others])
+    assert not np.array_equal(pos[movable], db.pos[movable])